@@ -0,0 +1,108 @@
+import os
+import time
+import threading
+from collections import deque
+
+from app.agent.transcript_index import get_transcript_index
+
+
+# Rough budgets in tokens (~4 characters each); the prompt no longer grows with video or chat length
+TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("AGENT_TRANSCRIPT_TOKENS", "600"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("AGENT_HISTORY_TOKENS", "400"))
+HISTORY_MAX_MESSAGES = int(os.getenv("AGENT_HISTORY_MESSAGES", "6"))
+# Neighbouring segments included on each side of a retrieved one
+WINDOW_SEGMENTS = 1
+# With nothing relevant (e.g. "make it yellow") the opening lines still give the model some grounding
+FALLBACK_SEGMENTS = 3
+
+_stats = deque(maxlen=500)
+_stats_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def _format_window(subtitles, first, last):
+    return "\n".join(f"[{s['start']:.1f}-{s['end']:.1f}] {s['text'].strip()}" for s in subtitles[first:last + 1])
+
+
+def build_transcript_context(subtitles, request, session_id=None, budget=TRANSCRIPT_TOKEN_BUDGET):
+    """The transcript windows most relevant to the request within `budget` tokens, in time order; returns (text, segments)."""
+    if not subtitles:
+        return "(no transcript)", 0
+
+    index = get_transcript_index(subtitles, session_id)
+    ranked = index.rank_segments(request, k=max(8, budget // 20))
+    centers = [segment for segment, _ in ranked] or list(range(min(FALLBACK_SEGMENTS, len(subtitles))))
+
+    included = set()
+    used = 0
+    for center in centers:
+        first = max(0, center - WINDOW_SEGMENTS)
+        last = min(len(subtitles) - 1, center + WINDOW_SEGMENTS)
+        new = [i for i in range(first, last + 1) if i not in included]
+        if not new:
+            continue
+        cost = estimate_tokens(_format_window(subtitles, new[0], new[-1]))
+        if used + cost > budget:
+            if included:
+                continue
+            new = [center]
+            cost = estimate_tokens(_format_window(subtitles, center, center))
+        included.update(new)
+        used += cost
+
+    # Contiguous runs in time order, with a marker wherever segments were skipped
+    lines, previous = [], None
+    for i in sorted(included):
+        if previous is not None and i != previous + 1:
+            lines.append("...")
+        lines.append(_format_window(subtitles, i, i))
+        previous = i
+    return "\n".join(lines), len(included)
+
+
+def trim_history(messages, budget=HISTORY_TOKEN_BUDGET, max_messages=HISTORY_MAX_MESSAGES):
+    """Most recent messages that fit the budget, oldest first."""
+    kept, used = [], 0
+    for message in reversed(messages[-max_messages:] if max_messages else []):
+        cost = estimate_tokens(str(message.content))
+        if used + cost > budget:
+            break
+        kept.append(message)
+        used += cost
+    return kept[::-1]
+
+
+def record_prompt(session_id, system_tokens, transcript_tokens, history_tokens, segments, latency):
+    entry = {
+        "session_id": session_id,
+        "system_tokens": system_tokens,
+        "transcript_tokens": transcript_tokens,
+        "history_tokens": history_tokens,
+        "segments": segments,
+        "latency": round(latency, 3),
+        "at": time.time(),
+    }
+    with _stats_lock:
+        _stats.append(entry)
+    print(f"🧮 Prompt ~{system_tokens + history_tokens} tokens ({transcript_tokens} transcript, {history_tokens} history), LLM {latency:.2f}s")
+
+
+def prompt_stats():
+    """Prompt size and LLM latency over the recent calls."""
+    with _stats_lock:
+        entries = list(_stats)
+    if not entries:
+        return {"calls": 0}
+    totals = [e["system_tokens"] + e["history_tokens"] for e in entries]
+    latencies = sorted(e["latency"] for e in entries)
+    return {
+        "calls": len(entries),
+        "avg_prompt_tokens": round(sum(totals) / len(totals), 1),
+        "max_prompt_tokens": max(totals),
+        "avg_latency": round(sum(latencies) / len(latencies), 3),
+        "p95_latency": latencies[int(0.95 * (len(latencies) - 1))],
+        "last": entries[-1],
+    }
@@ -1,16 +1,22 @@
 import os
 import json
 import re
-import difflib
+import time
 import urllib.parse
 from typing import TypedDict, List, Annotated
 from dotenv import load_dotenv
 
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import SystemMessage, HumanMessage, BaseMessage
+from langchain_core.messages import SystemMessage, HumanMessage, BaseMessage, AIMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
 
+from app.agent.transcript_index import find_phrase_candidates
+from app.agent.context_builder import build_transcript_context, trim_history, record_prompt, estimate_tokens
+from app.services.timeline import get_timeline, new_layer_id, layer_end, layer_between
+from app.services.metrics import span
+
 load_dotenv()
 api_key = os.getenv("GOOGLE_API_KEY")
 if not api_key:
@@ -18,12 +24,14 @@ if not api_key:
 
 class AgentState(TypedDict):
     messages: Annotated[List[BaseMessage], add_messages]
+    session_id: str
     subtitles: List[dict] 
     hud_items: List[dict] 
     visuals: List[dict]
     camera_moves: List[dict]
     text_layers: List[dict] 
     pending_operation: str
+    action_log: List[dict]
     style: dict         
 
 llm = ChatGoogleGenerativeAI(
@@ -32,73 +40,46 @@ llm = ChatGoogleGenerativeAI(
     google_api_key=api_key
 )
 
-def find_timestamp_for_phrase(subtitles, phrase):
-    """
-    Finds precise start time using linear interpolation.
-    If phrase is halfway through text, start time is halfway through segment.
-    """
+def find_timestamp_for_phrase(subtitles, phrase, session_id=None):
+    """(start, end) of a phrase from the word timings; overlays stay at least 3 seconds."""
     if not phrase: return 0, 5
     
-    phrase = phrase.lower().strip()
-    best_ratio = 0.0
-    best_match = (0, 5)
-    
-    for sub in subtitles:
-        text = sub['text'].lower()
-        
-        match_index = -1
-        if phrase in text:
-            match_index = text.find(phrase)
-            score = 1.0
-        else:
-            matcher = difflib.SequenceMatcher(None, phrase, text)
-            score = matcher.ratio()
-            if score > 0.6:
-                match_index = 0 
-        
-        if score > 0.6:
-            segment_duration = sub['end'] - sub['start']
-            
-            progress = match_index / len(text) if len(text) > 0 else 0
-            
-            precise_start = sub['start'] + (segment_duration * progress)
-            
-            precise_end = precise_start + 3.0 
-            
-            if score > best_ratio:
-                best_ratio = score
-                best_match = (precise_start, precise_end)
-
-    if best_ratio > 0.6:
-        print(f"✅ PRECISE MATCH: '{phrase}' at {best_match[0]:.2f}s")
-        return best_match
+    with span("phrase_match") as details:
+        candidates = find_phrase_candidates(subtitles, phrase, k=1, session_id=session_id)
+        details["found"] = bool(candidates)
+    if candidates:
+        best = candidates[0]
+        print(f"✅ PRECISE MATCH: '{phrase}' at {best['start']:.2f}s (score {best['score']})")
+        return best["start"], max(best["end"], best["start"] + 3.0)
         
     return 0, 5
 
-def editor_agent(state: AgentState):
+def editor_agent(state: AgentState, config: RunnableConfig = None):
+    # Streaming callers pass on_token / on_actions through the run config
+    hooks = (config or {}).get("configurable", {})
+    on_token, on_actions = hooks.get("on_token"), hooks.get("on_actions")
     messages = state["messages"]
     last_user_msg = messages[-1].content
-    current_cam = state.get("camera_moves", [])
     
     current_style = json.dumps(state["style"])
-    sample_subs = json.dumps(state["subtitles"][:3]) 
-    current_visuals = state.get("visuals", [])
-    current_hud = state.get("hud_items", [])
-    current_text_layers = state.get("text_layers", [])
-    subs_text_only = [s['text'] for s in state["subtitles"]]
-    subs_context = json.dumps(subs_text_only[:50])
+    # Only the transcript windows relevant to this request, within a fixed token budget
+    transcript_context, n_segments = build_transcript_context(state["subtitles"], last_user_msg, state.get("session_id"))
+    history = trim_history(messages[:-1])
     system_prompt = f"""
     You are an expert Video Editor AI and AI Video Director. You manage subtitles and styling.
 
     
     CURRENT STATE:
     Style: {current_style}
-    Sample Subs: {sample_subs}... (truncated)
-    TRANSCRIPT SNIPPET: {subs_context}
+    RELEVANT TRANSCRIPT ([start-end] seconds, "..." marks skipped parts):
+    {transcript_context}
     USER REQUEST: "{last_user_msg}"
     
     INSTRUCTIONS:
     Analyze the request and output valid JSON ONLY.
+    The request may ask for several edits at once ("zoom in on X, add a HUD on Y and make captions yellow").
+    Then output {{ "actions": [ ... ] }} with one object per edit, in the order asked, each shaped like
+    the scenario outputs below. A single edit may be output as the bare object.
 
      SCENARIO 1: Text Behind Person (Depth Effect).
     - User wants huge text behind them.
@@ -155,142 +136,231 @@ def editor_agent(state: AgentState):
     Output: {{ "action": "chat", "response": "Your reply here." }}
     """
 
-    ai_msg = llm.invoke([SystemMessage(content=system_prompt)]+ messages)
+    prompt_messages = [SystemMessage(content=system_prompt)] + history + [messages[-1]]
+    started = time.perf_counter()
+    with span("llm_invoke", streamed=bool(on_token)):
+        if on_token:
+            content = ""
+            for chunk in llm.stream(prompt_messages):
+                if isinstance(chunk.content, str) and chunk.content:
+                    on_token(chunk.content)
+                    content += chunk.content
+            ai_msg = AIMessage(content=content)
+        else:
+            ai_msg = llm.invoke(prompt_messages)
+    record_prompt(
+        state.get("session_id"), estimate_tokens(system_prompt), estimate_tokens(transcript_context),
+        sum(estimate_tokens(str(m.content)) for m in history), n_segments, time.perf_counter() - started
+    )
     
     raw_content = ai_msg.content
     
     print(f"🤖 RAW AI OUTPUT: {raw_content}") 
     try:
-    
-        clean_content = raw_content.replace("```json", "").replace("```", "").strip()
-        
-
-        match = re.search(r"\{.*\}", clean_content, re.DOTALL)
-        if match:
-            clean_content = match.group(0)
-            
-        decision = json.loads(clean_content)
-        print(f"PARSED JSON: {decision}")
-
-        if decision.get("action") == "auto_cut":
-            return {
-                "messages": [BaseMessage(content="✂️ Slicing out the silence... creating a new video version.", type="ai")],
-                "pending_operation": "auto_cut"
-            }
-
-        if decision.get("action") == "text_behind":
-            text_content = decision.get("text_content", "TEXT")
-            trigger = decision.get("trigger_phrase", "")
-            props = decision.get("text_props", {})
-            start, end = find_timestamp_for_phrase(state["subtitles"], trigger)
-            
-            if start == 0: start = 0; end = 5.0
-
-            new_layer = {
-                "id": str(len(current_text_layers) + 1),
-                "start": start,
-                "end": end,
-                "text": text_content,
-                "props": props 
-            }
-            
-            return {
-                "messages": [BaseMessage(content=f"Added Depth Text '{text_content}' at {start:.1f}s", type="ai")],
-                "text_layers": current_text_layers + [new_layer]
-            }
-
-        elif decision.get("action") == "camera":
-            trigger = decision.get("trigger_phrase", "")
-            start, end = find_timestamp_for_phrase(state["subtitles"], trigger)
-            
-            if start == 0: start = 0; end = 3.0
-
-            new_move = {
-                "id": str(len(current_cam) + 1),
-                "start": start,
-                "end": end,
-                "type": decision.get("type", "zoom-in"),
-                "intensity": decision.get("intensity", 1.4)
-            }
-            
-            return {
-                "messages": [BaseMessage(content=f"Added Camera Move: {new_move['type']} at {start:.1f}s", type="ai")],
-                "camera_moves": current_cam + [new_move]
-            }
-
-        elif decision.get("action") == "hud":
-            trigger = decision.get("trigger_phrase", "")
-            start, end = find_timestamp_for_phrase(state["subtitles"], trigger)
-     
-            if start == 0: 
-                start = current_hud[-1]["end"] + 1 if current_hud else 0
-                end = start + 4.0
-
-            new_hud = {
-                "id": str(len(current_hud) + 1),
-                "start": start,
-                "end": end,
-                "title": decision.get("title", "Info"),
-                "content": decision.get("content", ""),
-                "type": decision.get("type", "info")
-            }
-            
-            return {
-                "messages": [BaseMessage(content=f"Added HUD Card: '{new_hud['title']}' at {start:.1f}s", type="ai")],
-                "hud_items": current_hud + [new_hud] 
-            }
-
-
-        elif decision.get("action") == "visual":
-            keyword = decision.get("keyword", "abstract")
-            trigger = decision.get("trigger_phrase", "")
-            img_style = decision.get("img_style", "")
-            props = decision.get("visual_props", {})
-            
-            start, end = find_timestamp_for_phrase(state["subtitles"], trigger)
-            print(f"🚀 FINAL VISUAL TIME: Start={start}, End={end}")
-            if start == 0 and len(current_visuals) > 0:
-                last_end = current_visuals[-1]["end"]
-                start = last_end
-                end = start + 5
-             
-            full_prompt = f"{keyword}, {img_style}" 
-            safe_prompt = urllib.parse.quote(keyword)
-            
-            image_url = f"https://image.pollinations.ai/prompt/{safe_prompt}?width=800&height=600&nologo=true"
-            
-            new_visual = {
-                "id": str(len(current_visuals) + 1),
-                "start": start,
-                "end": end,
-                "keyword": keyword,
-                "url": image_url,
-                "props": props 
-            }
-            
-            return {
-                "messages": [BaseMessage(content=f"Generated image: {full_prompt}", type="ai")],
-                "visuals": current_visuals + [new_visual] 
-            }
-
-        elif decision.get("action") == "style":
-            updated_style = {**state["style"], **decision["new_style"]}
-            return {
-                "messages": [BaseMessage(f"Updated style to: {decision['new_style']}", type="ai")],
-                "style": updated_style
-            }
-            
-        elif decision.get("action") == "chat":
-            return {"messages": [BaseMessage(content=decision["response"], type="ai")]}
-            
+        with span("llm_parse") as details:
+            actions = parse_actions(raw_content)
+            details["actions"] = len(actions)
+        print(f"PARSED ACTIONS: {actions}")
+        if on_actions:
+            on_actions(actions)
     except Exception as e:
         print(f"PARSE ERROR: {e}")
         return {"messages": [BaseMessage(content="I tried to process that, but I got confused. Please try again.", type="ai")]}
 
-    return {"messages": [ai_msg]}
+    if not actions:
+        return {"messages": [ai_msg]}
+    return apply_actions(state, actions)
 
 
-   
+def parse_actions(raw_content):
+    """The model's reply as an ordered list of action dicts (a plan, a bare action or a list)."""
+    clean_content = raw_content.replace("```json", "").replace("```", "").strip()
+
+    match = re.search(r"[\{\[].*[\}\]]", clean_content, re.DOTALL)
+    if match:
+        clean_content = match.group(0)
+
+    decision = json.loads(clean_content)
+    if isinstance(decision, dict) and isinstance(decision.get("actions"), list):
+        decision = decision["actions"]
+    if isinstance(decision, dict):
+        decision = [decision]
+    return [d for d in decision if isinstance(d, dict)]
+
+
+def handle_text_behind(decision, working, session_id):
+    text_content = decision.get("text_content", "TEXT")
+    trigger = decision.get("trigger_phrase", "")
+    props = decision.get("text_props", {})
+    start, end = find_timestamp_for_phrase(working["subtitles"], trigger, session_id)
+    
+    if start == 0: start = 0; end = 5.0
+
+    layers = working["text_layers"]
+    layers.append({
+        "id": new_layer_id(),
+        "start": start,
+        "end": end,
+        "text": text_content,
+        "props": props 
+    })
+    return f"Added Depth Text '{text_content}' at {start:.1f}s"
+
+
+def handle_camera(decision, working, session_id):
+    trigger = decision.get("trigger_phrase", "")
+    start, end = find_timestamp_for_phrase(working["subtitles"], trigger, session_id)
+    
+    if start == 0: start = 0; end = 3.0
+
+    moves = working["camera_moves"]
+    # Only one camera transform plays at a time, so say when the new move collides with one
+    clashes = layer_between(working["trees"]["camera_moves"], moves, start, end)
+    clashes = [m for m in clashes if m["end"] > start and m["start"] < end]
+    new_move = {
+        "id": new_layer_id(),
+        "start": start,
+        "end": end,
+        "type": decision.get("type", "zoom-in"),
+        "intensity": decision.get("intensity", 1.4)
+    }
+    moves.append(new_move)
+    if clashes:
+        return f"Added Camera Move: {new_move['type']} at {start:.1f}s (overlaps {len(clashes)} existing move(s) from {clashes[0]['start']:.1f}s)"
+    return f"Added Camera Move: {new_move['type']} at {start:.1f}s"
+
+
+def handle_hud(decision, working, session_id):
+    trigger = decision.get("trigger_phrase", "")
+    start, end = find_timestamp_for_phrase(working["subtitles"], trigger, session_id)
+    current_hud = working["hud_items"]
+ 
+    if start == 0: 
+        start = layer_end(working["trees"]["hud_items"], current_hud) + 1 if current_hud else 0
+        end = start + 4.0
+
+    new_hud = {
+        "id": new_layer_id(),
+        "start": start,
+        "end": end,
+        "title": decision.get("title", "Info"),
+        "content": decision.get("content", ""),
+        "type": decision.get("type", "info")
+    }
+    current_hud.append(new_hud)
+    return f"Added HUD Card: '{new_hud['title']}' at {start:.1f}s"
+
+
+def handle_visual(decision, working, session_id):
+    keyword = decision.get("keyword", "abstract")
+    trigger = decision.get("trigger_phrase", "")
+    img_style = decision.get("img_style", "")
+    props = decision.get("visual_props", {})
+    current_visuals = working["visuals"]
+    
+    start, end = find_timestamp_for_phrase(working["subtitles"], trigger, session_id)
+    print(f"🚀 FINAL VISUAL TIME: Start={start}, End={end}")
+    if start == 0 and len(current_visuals) > 0:
+        start = layer_end(working["trees"]["visuals"], current_visuals)
+        end = start + 5
+     
+    full_prompt = f"{keyword}, {img_style}" 
+    safe_prompt = urllib.parse.quote(keyword)
+    
+    image_url = f"https://image.pollinations.ai/prompt/{safe_prompt}?width=800&height=600&nologo=true"
+    
+    current_visuals.append({
+        "id": new_layer_id(),
+        "start": start,
+        "end": end,
+        "keyword": keyword,
+        "url": image_url,
+        "props": props 
+    })
+    return f"Generated image: {full_prompt}"
+
+
+def handle_style(decision, working, session_id):
+    working["style"] = {**working["style"], **decision["new_style"]}
+    return f"Updated style to: {decision['new_style']}"
+
+
+def handle_chat(decision, working, session_id):
+    return decision["response"]
+
+
+def handle_auto_cut(decision, working, session_id):
+    # Rendering (or recording the edit list) happens in the API layer after the batch is applied
+    working["pending_operation"] = "auto_cut"
+    return "✂️ Slicing out the silence... creating a new video version."
+
+
+# action -> (handler, state keys it edits)
+ACTION_HANDLERS = {
+    "text_behind": (handle_text_behind, ["text_layers"]),
+    "camera": (handle_camera, ["camera_moves"]),
+    "hud": (handle_hud, ["hud_items"]),
+    "visual": (handle_visual, ["visuals"]),
+    "style": (handle_style, ["style"]),
+    "chat": (handle_chat, []),
+    "auto_cut": (handle_auto_cut, []),
+}
+
+
+def validate_action(decision):
+    """Why an action can't be applied, or None when it can."""
+    action = decision.get("action")
+    if action not in ACTION_HANDLERS:
+        return f"unknown action '{action}'"
+    if action == "style" and not isinstance(decision.get("new_style"), dict):
+        return "style needs a 'new_style' object"
+    if action == "chat" and not isinstance(decision.get("response"), str):
+        return "chat needs a 'response'"
+    if action == "camera" and not isinstance(decision.get("intensity", 1.4), (int, float)):
+        return "camera intensity must be a number"
+    for key in ("text_props", "visual_props"):
+        if key in decision and not isinstance(decision[key], dict):
+            return f"'{key}' must be an object"
+    return None
+
+
+def apply_actions(state, actions):
+    """Applies an ordered list of actions to one working copy of the state, as a single update."""
+    working = {
+        "subtitles": state["subtitles"],
+        "style": dict(state["style"]),
+        **{key: list(state.get(key, [])) for key in ("text_layers", "camera_moves", "hud_items", "visuals")},
+        # The session's cached trees cover the items above; handlers only append to the copies
+        "trees": dict(get_timeline(state.get("session_id"), state).trees),
+    }
+    changed = set()
+    log = []
+
+    for decision in actions:
+        problem = validate_action(decision)
+        if problem:
+            print(f"⚠️ Skipping action: {problem}")
+            log.append({"action": decision.get("action"), "ok": False, "message": f"Skipped: {problem}"})
+            continue
+        handler, keys = ACTION_HANDLERS[decision["action"]]
+        try:
+            message = handler(decision, working, state.get("session_id"))
+        except Exception as e:
+            print(f"ACTION ERROR ({decision['action']}): {e}")
+            log.append({"action": decision["action"], "ok": False, "message": f"Couldn't apply {decision['action']}."})
+            continue
+        log.append({"action": decision["action"], "ok": True, "message": message})
+        changed.update(keys)
+
+    result = {
+        "messages": [BaseMessage(content="\n".join(entry["message"] for entry in log), type="ai")],
+        "action_log": log,
+        **{key: working[key] for key in changed}
+    }
+    if working.get("pending_operation"):
+        result["pending_operation"] = working["pending_operation"]
+    return result
+
 
 builder = StateGraph(AgentState)
 builder.add_node("editor", editor_agent)
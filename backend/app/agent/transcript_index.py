@@ -0,0 +1,198 @@
+import re
+import math
+import difflib
+import threading
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict
+
+from app.services.metrics import count_lookup
+
+
+TOKEN_PATTERN = re.compile(r"[\w']+")
+INDEX_CACHE_SIZE = 64
+# BM25 parameters for ranking whole segments against a free-text request
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Request words that never point at a place in the transcript
+STOPWORDS = frozenset(
+    "a an the and or but of to in on at for with from by as is are was were be been it its this that "
+    "i me my we you your he she they them so do does did can could would should will just when where "
+    "what say says said talk talks about make add show put please".split()
+)
+
+
+def normalize_tokens(text):
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t.strip("'") for t in TOKEN_PATTERN.findall(text) if t.strip("'")]
+
+
+def tokenize_segment(sub):
+    """[(token, start, end)] for one segment, from word timings or spread over the text when there are none."""
+    entries = []
+    words = sub.get("words") or []
+    if words:
+        for w in words:
+            for token in normalize_tokens(w["word"]):
+                entries.append((token, w["start"], w["end"]))
+        return entries
+
+    text = sub["text"]
+    duration = sub["end"] - sub["start"]
+    for match in TOKEN_PATTERN.finditer(text):
+        tokens = normalize_tokens(match.group(0))
+        if not tokens:
+            continue
+        start = sub["start"] + duration * (match.start() / len(text))
+        end = sub["start"] + duration * (match.end() / len(text))
+        for token in tokens:
+            entries.append((token, start, end))
+    return entries
+
+
+class TranscriptIndex:
+    """Per-word token arrays plus an inverted index; a subtitle change only re-tokenizes changed segments."""
+
+    def __init__(self):
+        self.source = None
+        self.tokens = []
+        self.starts = []
+        self.ends = []
+        self.segment_of = []
+        self.postings = {}
+        self.segment_lengths = []
+        self._segment_tokens = {}
+
+    def build(self, subtitles):
+        reuse = self._segment_tokens
+        self._segment_tokens = {}
+        tokens, starts, ends, segment_of = [], [], [], []
+        postings = defaultdict(list)
+
+        for i, sub in enumerate(subtitles):
+            key = (sub["start"], sub["end"], sub["text"], len(sub.get("words") or []))
+            entries = reuse.get(key)
+            if entries is None:
+                entries = tokenize_segment(sub)
+            self._segment_tokens[key] = entries
+
+            for token, start, end in entries:
+                postings[token].append(len(tokens))
+                tokens.append(token)
+                starts.append(start)
+                ends.append(end)
+                segment_of.append(i)
+
+        self.tokens, self.starts, self.ends, self.segment_of = tokens, starts, ends, segment_of
+        self.postings = dict(postings)
+        self.segment_lengths = [0] * len(subtitles)
+        for i in segment_of:
+            self.segment_lengths[i] += 1
+        self.source = subtitles
+        return self
+
+    def _match(self, position, length, score):
+        last = position + length - 1
+        return {
+            "start": self.starts[position],
+            "end": self.ends[last],
+            "score": round(score, 3),
+            "text": " ".join(self.tokens[position : last + 1]),
+            "segment": self.segment_of[position],
+        }
+
+    def find_exact(self, query_tokens):
+        """All positions where the token sequence occurs, via the rarest query token."""
+        if not query_tokens or any(t not in self.postings for t in query_tokens):
+            return []
+        pivot = min(range(len(query_tokens)), key=lambda j: len(self.postings[query_tokens[j]]))
+        n = len(query_tokens)
+        hits = []
+        for position in self.postings[query_tokens[pivot]]:
+            start = position - pivot
+            if start >= 0 and self.tokens[start : start + n] == query_tokens:
+                hits.append(start)
+        return hits
+
+    def search(self, phrase, k=5, min_score=0.6):
+        """Top-k word-aligned matches for a phrase, best first (exact matches score 1.0)."""
+        query = normalize_tokens(phrase or "")
+        if not query or not self.tokens:
+            return []
+
+        exact = self.find_exact(query)
+        if exact:
+            return [self._match(p, len(query), 1.0) for p in exact[:k]]
+
+        # Vote for window starts: every query token (or a close spelling of it) found
+        # at position p suggests the phrase starts at p - j
+        votes = Counter()
+        spellings = {}
+        for j, token in enumerate(query):
+            if token not in spellings:
+                spellings[token] = [token] if token in self.postings else difflib.get_close_matches(token, self.postings.keys(), n=3, cutoff=0.75)
+            for candidate in spellings[token]:
+                for position in self.postings[candidate]:
+                    votes[max(0, position - j)] += 1
+
+        query_text = " ".join(query)
+        n = len(query)
+        scored = {}
+        for start, _ in votes.most_common(max(20, k * 4)):
+            for length in (n - 1, n, n + 1):
+                if length < 1 or start + length > len(self.tokens):
+                    continue
+                window = " ".join(self.tokens[start : start + length])
+                score = difflib.SequenceMatcher(None, query_text, window).ratio()
+                if score > scored.get(start, (0, 0))[0]:
+                    scored[start] = (score, length)
+
+        ranked = sorted(scored.items(), key=lambda item: -item[1][0])
+        return [self._match(start, length, score) for start, (score, length) in ranked[:k] if score >= min_score]
+
+    def rank_segments(self, text, k=8):
+        """BM25 over subtitle segments for a free-text request: [(segment, score)] best first."""
+        n_segments = len(self.segment_lengths)
+        if not n_segments:
+            return []
+        average_length = max(1.0, len(self.tokens) / n_segments)
+
+        scores = Counter()
+        for token in set(normalize_tokens(text or "")) - STOPWORDS:
+            spellings = [token] if token in self.postings else difflib.get_close_matches(token, self.postings.keys(), n=2, cutoff=0.8)
+            for candidate in spellings:
+                term_counts = Counter(self.segment_of[p] for p in self.postings[candidate])
+                # Words in most segments ("the", "and") say nothing about where the user means
+                if n_segments >= 4 and len(term_counts) > n_segments / 2:
+                    continue
+                idf = math.log(1 + (n_segments - len(term_counts) + 0.5) / (len(term_counts) + 0.5))
+                for segment, tf in term_counts.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.segment_lengths[segment] / average_length)
+                    scores[segment] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores.most_common(k)
+
+
+_INDEXES = OrderedDict()
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_transcript_index(subtitles, key=None):
+    """The index for a transcript, kept per session and rebuilt incrementally when the subtitles change."""
+    key = key or id(subtitles)
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        count_lookup("transcript_index", index is not None and index.source is subtitles)
+        if index is None:
+            index = TranscriptIndex()
+            _INDEXES[key] = index
+            while len(_INDEXES) > INDEX_CACHE_SIZE:
+                _INDEXES.popitem(last=False)
+        _INDEXES.move_to_end(key)
+        if index.source is not subtitles:
+            index.build(subtitles)
+        return index
+
+
+def find_phrase_candidates(subtitles, phrase, k=5, session_id=None):
+    """Top-k word-aligned matches for a phrase from the session's transcript index."""
+    return get_transcript_index(subtitles, session_id).search(phrase, k=k)
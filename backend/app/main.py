@@ -1,19 +1,38 @@
 import os
+import json
 import uuid
+import asyncio
 import time
-import shutil
 import urllib.parse
-import json
+import threading
 from pathlib import Path
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import Response, StreamingResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
 
-from app.schemas import ChatRequest
-from app.services.transcriber import transcribe_video
-from app.services.video_utils import burn_subtitles, remove_silence_and_fillers
-from app.agent.graph import graph
+from app.schemas import ChatRequest, RenditionExportRequest, BatchExportRequest
+from app.services.transcriber import transcribe_video, mode_options
+from app.services.model_pool import DEFAULT_MODEL
+from app.services.jobs import submit_job, get_job, cancel_job
+from app.services.ffmpeg_scheduler import SCHEDULER, LANES, use_lane
+from app.services.video_utils import burn_subtitles, remove_silence_and_fillers, plan_cuts
+from app.services.timeline_remap import remap_subtitles, remap_layers, intersect_ranges, complement_ranges
+from app.services.session_store import SessionStore
+from app.services.media_cache import store_upload, TranscriptCache
+from app.services.export_renderer import render_export
+from app.services.renditions import render_renditions, DEFAULT_RENDITIONS
+from app.services.waveform import build_peaks, peaks_path_for, PeakPyramid
+from app.services.preview_proxy import build_proxy, proxy_path_for
+from app.services.media_server import serve_media
+from app.services.state_versions import StateHistory, VersionConflict, snapshot
+from app.services.timeline import get_timeline, TIMELINE_LAYERS
+from app.services.storage import ArtifactRegistry
+from app.services.audio_cache import AUDIO_CACHE_DIR, observe_pcm
+from app.services.engines import require_engine, warm_engines, engine_status, is_ready, WARM_ENGINES
+from app.services.metrics import RequestMetrics, render_metrics, span, set_session, bind_session, STAGE_SECONDS
+from app.agent.transcript_index import find_phrase_candidates
+from app.agent.context_builder import prompt_stats
 
 app = FastAPI()
 
@@ -24,189 +43,725 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetrics)
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 TEMP_DIR = BASE_DIR / "temp"
 PROCESSED_DIR = BASE_DIR / "processed"
 SESSIONS_FILE = BASE_DIR / "sessions.json"
+SESSIONS_DB = BASE_DIR / "sessions.db"
+CACHE_DIR = BASE_DIR / "cache"
+# Cached transcripts are only reused under the same transcription mode
+TRANSCRIBE_OPTIONS = {"word_timestamps": True, **mode_options()}
+# Re-run Whisper on the cut video instead of remapping the existing transcript
+RETRANSCRIBE_AFTER_CUT = os.getenv("RETRANSCRIBE_AFTER_CUT", "false").lower() == "true"
+# "edl": auto-cut only records keep-ranges and export renders them; "render": re-encode on every cut
+AUTO_CUT_MODE = os.getenv("AUTO_CUT_MODE", "edl").lower()
+# "chunked": cached, parallel per-chunk export; "single": one burn_subtitles pass
+EXPORT_ENGINE = os.getenv("EXPORT_ENGINE", "chunked").lower()
+# Chat turns kept per session; the agent itself only sees a token-budgeted tail of them
+MAX_STORED_MESSAGES = 100
+# Sessions one /export/batch call may queue
+MAX_BATCH_EXPORT = int(os.getenv("MAX_BATCH_EXPORT", "200"))
+LAYER_KEYS = ["visuals", "text_layers", "camera_moves", "hud_items", "bg_layers"]
 
 TEMP_DIR.mkdir(exist_ok=True)
 PROCESSED_DIR.mkdir(exist_ok=True)
 
-app.mount("/static", StaticFiles(directory=str(TEMP_DIR)), name="static")
+@app.api_route("/static/{filename}", methods=["GET", "HEAD"])
+async def serve_static(filename: str, request: Request):
+    """Uploads, preview proxies and legacy cut renders, with Range/ETag support for seeking."""
+    file_path = TEMP_DIR / Path(urllib.parse.unquote(filename)).name
+    if not file_path.is_file():
+        raise HTTPException(404, "File not found")
+    STORAGE.touch(file_path)
+    return serve_media(request, file_path)
 
-def load_sessions():
-    """Loads session history from JSON file on startup."""
-    if SESSIONS_FILE.exists():
-        try:
-            with open(SESSIONS_FILE, "r") as f:
-                print("📂 Loaded previous sessions from disk.")
-                return json.load(f)
-        except Exception as e:
-            print(f"⚠️ Failed to load sessions: {e}")
-    return {}
+def preview_url(file_path):
+    """The preview proxy once it exists, the original upload until then."""
+    proxy_path = proxy_path_for(file_path)
+    name = proxy_path.name if proxy_path.exists() else Path(file_path).name
+    return f"http://127.0.0.1:8000/static/{urllib.parse.quote(name)}"
+
+def run_proxy_build(job, file_path):
+    STORAGE.register(build_proxy(file_path, progress_callback=job.update), "proxy")
+    return {"video_url": preview_url(file_path)}
+
+@app.on_event("startup")
+def warm_up_engines():
+    """Loads the engines in the background so the server answers right away (/readyz says when they are warm)."""
+    threading.Thread(target=warm_engines, name="engine-warmup", daemon=True).start()
+
+@app.on_event("startup")
+def start_storage_sweep():
+    STORAGE.start()
+
+def session_files(session_id, state):
+    """(the current video, rebuildable files used while the session is active: undo videos, proxies, peaks, current exports)."""
+    current = {state.get("video_path")} - {None}
+    videos = current | HISTORY.referenced(session_id, "video_path")
+    derived = {proxy_path_for(video) for video in videos} | {peaks_path_for(video) for video in videos}
+    # An export of an older version was superseded by the edits since; it can go like any other render
+    exports = STORAGE.session_paths(session_id, "export") if EXPORTED_VERSIONS.get(session_id) == state.get("version") else set()
+    return current, videos | derived | exports
+
+def refresh_refs(session_id, exported_version=None):
+    """Re-pins a session's files after it gained one outside an edit (an export of `exported_version`)."""
+    if exported_version is not None:
+        EXPORTED_VERSIONS[session_id] = exported_version
+    state = SESSIONS.get(session_id)
+    if state is not None:
+        STORAGE.set_refs(session_id, *session_files(session_id, state))
 
-def save_sessions():
-    """Saves current session state to JSON file."""
+def save_session(session_id, state):
+    """Persists one session (its own row only) and keeps it hot in the cache."""
     try:
-        with open(SESSIONS_FILE, "w") as f:
-            json.dump(SESSIONS, f, indent=4)
+        with span("session_persist", version=state.get("version")):
+            SESSIONS.put(session_id, state)
+            STORAGE.set_refs(session_id, *session_files(session_id, state))
     except Exception as e:
-        print(f"⚠️ Failed to save sessions: {e}")
+        print(f"⚠️ Failed to save session {session_id}: {e}")
 
-SESSIONS = load_sessions()
+def commit_session(session_id, previous, state):
+    """Saves an edit as the session's next version; raises VersionConflict when `previous` is stale."""
+    with HISTORY.lock(session_id):
+        HISTORY.commit(session_id, previous, state)
+        save_session(session_id, state)
+
+def state_response(req, state):
+    """A patch from the client's base_version when possible, else the full state (legacy shape without one)."""
+    if req.base_version is None:
+        return {
+            "version": state.get("version", 0),
+            "updated_style": state["style"],
+            "updated_subtitles": state["subtitles"],
+            "updated_visuals": state.get("visuals", []),
+            "updated_text_layers": state.get("text_layers", []),
+            "updated_bg_layers": state.get("bg_layers", []),
+            "updated_hud": state.get("hud_items", []),
+            "updated_camera": state.get("camera_moves", [])
+        }
+    return {
+        **HISTORY.delta(req.session_id, req.base_version, state),
+        "can_undo": HISTORY.can_undo(req.session_id),
+        "can_redo": HISTORY.can_redo(req.session_id)
+    }
+
+SESSIONS = SessionStore(SESSIONS_DB, legacy_json=SESSIONS_FILE)
+TRANSCRIPTS = TranscriptCache(CACHE_DIR / "transcripts")
+HISTORY = StateHistory()
+# Session -> the version its latest export rendered
+EXPORTED_VERSIONS = {}
+# Uploads are the originals; everything else in these directories can be rebuilt or re-exported
+STORAGE = ArtifactRegistry(SESSIONS_DB, {TEMP_DIR: "upload", PROCESSED_DIR: "export", AUDIO_CACHE_DIR: "pcm"})
+STORAGE.register_metrics()
+
+def track_pcm(media_path, pcm_path, decoded):
+    """Decoded audio is evictable and goes away with the video it was decoded from."""
+    if decoded:
+        STORAGE.register(pcm_path, "pcm", source=media_path)
+    else:
+        STORAGE.touch(pcm_path)
+
+observe_pcm(track_pcm)
 
 def sanitize_filename(name: str) -> str:
     return "".join([c if c.isalnum() or c in "._-" else "_" for c in name])
 
-@app.post("/upload")
-async def upload_video(file: UploadFile = File(...)):
-    session_id = str(uuid.uuid4())
-    clean_name = sanitize_filename(file.filename)
-    file_path = TEMP_DIR / f"{session_id}_{clean_name}"
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    print(f"Transcribing {clean_name}...")
-    subtitles = transcribe_video(str(file_path))
-    
+def create_session(session_id, file_path, original_name, content_hash, subtitles):
     initial_state = {
         "video_path": str(file_path),
+        "original_name": original_name,
+        "content_hash": content_hash,
         "subtitles": subtitles,
         "visuals": [], 
         "hud_items": [],
         "text_layers": [],
         "bg_layers": [],
         "camera_moves": [],
+        "keep_segments": None,
         "style": {"font_color": "white", "font_size": 24, "position": "bottom"},
-        "messages": []
+        "messages": [],
+        "version": 1
     }
     
-    SESSIONS[session_id] = initial_state
-    save_sessions()
+    save_session(session_id, initial_state)
     
     return {
         "session_id": session_id,
-        "video_url": f"http://127.0.0.1:8000/static/{file_path.name}",
+        "video_url": preview_url(file_path),
         "subtitles": subtitles,
         "visuals": [],
         "hud_items": [],
-        "style": initial_state["style"]
+        "skip_ranges": [],
+        "style": initial_state["style"],
+        "version": initial_state["version"]
     }
 
-@app.post("/chat")
-async def chat_agent(req: ChatRequest):
-    global SESSIONS
+def run_upload_transcription(job, session_id, file_path, original_name, content_hash):
+    # Decodes the audio into the PCM cache, which transcription then reuses
+    job.update(0.01, "building waveform")
+    STORAGE.register(build_peaks(str(file_path)), "peaks")
+    job.update(0.05, "transcribing")
+    print(f"Transcribing {original_name}...")
+    require_engine("whisper")
+    subtitles = transcribe_video(str(file_path), progress_callback=lambda p: job.update(0.05 + 0.9 * p))
+    TRANSCRIPTS.put(content_hash, DEFAULT_MODEL, TRANSCRIBE_OPTIONS, subtitles)
+    job.update(0.95, "saving session")
+    return create_session(session_id, file_path, original_name, content_hash, subtitles)
+
+@app.post("/upload")
+async def upload_video(file: UploadFile = File(...)):
+    session_id = str(uuid.uuid4())
+    set_session(session_id)
+    clean_name = sanitize_filename(file.filename)
+    with span("upload_write", file=clean_name):
+        file_path, content_hash = await run_in_threadpool(store_upload, file.file, TEMP_DIR, Path(clean_name).suffix)
+    STORAGE.register(file_path, "upload")
     
-    if req.session_id not in SESSIONS:
-        SESSIONS = load_sessions()
-        if req.session_id not in SESSIONS:
-            raise HTTPException(status_code=404, detail="Session not found")
+    proxy_job_id = None
+    if not proxy_path_for(file_path).exists():
+        proxy_job_id = submit_job("proxy", run_proxy_build, file_path).id
+
+    cached_subtitles = TRANSCRIPTS.get(content_hash, DEFAULT_MODEL, TRANSCRIBE_OPTIONS)
+    if cached_subtitles is not None:
+        print(f"⚡ Transcript cache hit for {clean_name}")
+        threading.Thread(target=build_peaks, args=(str(file_path),), daemon=True).start()
+        session = create_session(session_id, file_path, clean_name, content_hash, cached_subtitles)
+        return {**session, "status": "done", "proxy_job_id": proxy_job_id}
         
-    current_state = SESSIONS[req.session_id]
+    job = submit_job("transcribe", run_upload_transcription, session_id, file_path, clean_name, content_hash)
     
-    from langchain_core.messages import HumanMessage
-    inputs = {
-        **current_state,
-        "messages": [HumanMessage(content=req.prompt)]
+    return {
+        "session_id": session_id,
+        "job_id": job.id,
+        "status": job.status,
+        "video_url": preview_url(file_path),
+        "proxy_job_id": proxy_job_id
     }
+
+def run_auto_cut(job, session_id, retranscribe=False):
+    print("✂️ TRIGGERING MAGIC CUT...")
+    old_path = SESSIONS[session_id]["video_path"]
+    filename = Path(old_path).name
+    new_filename = f"cut_{session_id}_{filename}"
+    new_path = TEMP_DIR / new_filename
+
+    retranscribe = retranscribe or RETRANSCRIBE_AFTER_CUT
+    render_share = 0.6 if retranscribe else 1.0
+    keep_segments = remove_silence_and_fillers(old_path, str(new_path), progress_callback=lambda p, stage=None: job.update(render_share * p, stage))
     
-    result = graph.invoke(inputs)
-    
-    if result.get("pending_operation") == "auto_cut":
-        print("✂️ TRIGGERING MAGIC CUT...")
+    if keep_segments:
+        print("✅ Cut successful. Updating session...")
+        STORAGE.register(new_path, "cut", session_id)
+        subtitles = None
+        if retranscribe:
+            print("🔄 Re-transcribing...")
+            job.update(0.6, "transcribing")
+            require_engine("whisper")
+            subtitles = transcribe_video(str(new_path))
+
+        # Edits committed while the render ran are kept: the cut lands on the latest version
+        with HISTORY.lock(session_id):
+            current_state = SESSIONS[session_id]
+            if current_state["video_path"] != old_path:
+                raise RuntimeError("The video changed while it was being cut; run the auto-cut again")
+            state = {**current_state, "video_path": str(new_path), "keep_segments": None}
+            if retranscribe:
+                state["subtitles"] = subtitles
+                for key in LAYER_KEYS:
+                    state[key] = []
+            else:
+                print("🔄 Remapping subtitles and layers onto the cut timeline...")
+                state["subtitles"] = remap_subtitles(current_state["subtitles"], keep_segments)
+                for key in LAYER_KEYS:
+                    state[key] = remap_layers(current_state.get(key, []), keep_segments)
+            commit_session(session_id, current_state, state)
         
-        old_path = current_state["video_path"]
-        filename = Path(old_path).name
-        new_filename = f"cut_{filename}"
-        new_path = TEMP_DIR / new_filename
+        return {
+            "reply": "I've removed the silence! The video has been shortened and subtitles re-synced.",
+            "version": state["version"],
+            "updated_subtitles": state["subtitles"],
+            "updated_visuals": state["visuals"],
+            "updated_text_layers": state["text_layers"],
+            "updated_bg_layers": state["bg_layers"],
+            "updated_hud": state["hud_items"],
+            "updated_camera": state["camera_moves"],
+            "video_url": f"http://127.0.0.1:8000/static/{new_filename}",
+            "skip_ranges": [],
+            "force_refresh": True 
+        }
+    else:
+         return {
+            "reply": "I tried to remove silence, but I couldn't find any significant pauses to cut.",
+            "updated_style": SESSIONS[session_id]["style"]
+        }
+
+def record_auto_cut(state):
+    """Non-destructive auto-cut: narrows the edit list in `state` in place; nothing is encoded until export."""
+    print("✂️ Planning cut (edit list only)...")
+    with span("plan_cuts"):
+        planned, total_duration = plan_cuts(state["video_path"])
+    previous = [tuple(r) for r in state.get("keep_segments") or [(0.0, total_duration)]]
+    keep_segments = intersect_ranges(previous, planned) if planned else previous
     
-        success = remove_silence_and_fillers(old_path, str(new_path))
-        
-        if success:
-            print("✅ Cut successful. Updating session...")
-            SESSIONS[req.session_id]["video_path"] = str(new_path)
-            print("🔄 Re-transcribing...")
-            new_subs = transcribe_video(str(new_path))
-            SESSIONS[req.session_id]["subtitles"] = new_subs
-            
-            SESSIONS[req.session_id]["visuals"] = []
-            SESSIONS[req.session_id]["text_layers"] = []
-            SESSIONS[req.session_id]["camera_moves"] = []
-            SESSIONS[req.session_id]["hud_items"] = []
-            SESSIONS[req.session_id]["bg_layers"] = []
-            
-            save_sessions()
-            
-            return {
-                "reply": "I've removed the silence! The video has been shortened and subtitles re-synced.",
-                "updated_subtitles": new_subs,
-                "updated_visuals": [],
-                "updated_text_layers": [],
-                "video_url": f"http://127.0.0.1:8000/static/{new_filename}",
-                "force_refresh": True 
-            }
-        else:
-             return {
-                "reply": "I tried to remove silence, but I couldn't find any significant pauses to cut.",
-                "updated_style": current_state["style"]
-            }
-    if "style" in result: SESSIONS[req.session_id]["style"] = result["style"]
-    if "subtitles" in result: SESSIONS[req.session_id]["subtitles"] = result["subtitles"]
-    if "visuals" in result: SESSIONS[req.session_id]["visuals"] = result["visuals"]
-    if "text_layers" in result: SESSIONS[req.session_id]["text_layers"] = result["text_layers"]
-    if "bg_layers" in result: SESSIONS[req.session_id]["bg_layers"] = result["bg_layers"]
-    if "hud_items" in result: SESSIONS[req.session_id]["hud_items"] = result["hud_items"]
-    if "camera_moves" in result: SESSIONS[req.session_id]["camera_moves"] = result["camera_moves"]
+    if keep_segments == previous:
+        return {"reply": "I tried to remove silence, but I couldn't find any significant pauses to cut."}
         
-    save_sessions()
-    final_state = SESSIONS[req.session_id]
+    state["keep_segments"] = [list(r) for r in keep_segments]
+    state["duration"] = total_duration
     
+    removed = total_duration - sum(end - start for start, end in keep_segments)
     return {
-        "reply": result["messages"][-1].content,
-        "updated_style": final_state["style"],
-        "updated_subtitles": final_state["subtitles"],
-        "updated_visuals": final_state.get("visuals", []),
-        "updated_text_layers": final_state.get("text_layers", []),
-        "updated_bg_layers": final_state.get("bg_layers", []),
-        "updated_hud": final_state.get("hud_items", []),
-        "updated_camera": final_state.get("camera_moves", [])
+        "reply": f"I've cut {removed:.1f}s of silence! The preview skips the removed parts and the export will render them out.",
+        "skip_ranges": complement_ranges(keep_segments, total_duration),
+        "updated_keep_segments": state["keep_segments"]
     }
 
-@app.post("/export")
-async def export_video(req: ChatRequest):
-    global SESSIONS
-    session_id = req.session_id
+def append_turn(state, prompt, reply):
+    """Records one chat exchange on the session state (capped at MAX_STORED_MESSAGES)."""
+    messages = state.get("messages", []) + [{"role": "user", "content": prompt}, {"role": "ai", "content": reply}]
+    state["messages"] = messages[-MAX_STORED_MESSAGES:]
+
+def build_agent_inputs(session_id, state, prompt):
+    from langchain_core.messages import HumanMessage, AIMessage
+    history = [
+        HumanMessage(content=m["content"]) if m["role"] == "user" else AIMessage(content=m["content"])
+        for m in state.get("messages", [])
+    ]
+    return {
+        **state,
+        "session_id": session_id,
+        "messages": history + [HumanMessage(content=prompt)]
+    }
+
+def complete_turn(req, current_state, result, on_stage=None):
+    """Applies the agent's result to one copy of the state and saves it once; a render-mode cut returns a job_id."""
+    final_state = dict(current_state)
+    for key in ["style", "subtitles"] + LAYER_KEYS:
+        if key in result: final_state[key] = result[key]
+    reply = result["messages"][-1].content
+    extra = {}
+    render_cut = False
+
+    if result.get("pending_operation") == "auto_cut":
+        if AUTO_CUT_MODE == "edl" and not req.retranscribe:
+            if on_stage:
+                on_stage("detecting silence")
+            cut = record_auto_cut(final_state)
+            other_replies = [e["message"] for e in result.get("action_log", []) if e["action"] != "auto_cut"]
+            reply = "\n".join(other_replies + [cut.pop("reply")])
+            extra = cut
+        else:
+            render_cut = True
+
+    append_turn(final_state, req.prompt, reply)
+    try:
+        commit_session(req.session_id, current_state, final_state)
+    except VersionConflict:
+        # Another edit landed during this turn: apply nothing and send the client the latest state
+        latest = SESSIONS.get(req.session_id)
+        raise HTTPException(409, {"message": "The session changed while this turn ran; nothing was applied.", **state_response(req, latest)})
+
+    if render_cut:
+        # The render job reads the session, so it starts only after this turn's edits are saved
+        job = submit_job("render", run_auto_cut, req.session_id, req.retranscribe)
+        extra = {"job_id": job.id, "status": job.status}
     
-    if session_id not in SESSIONS:
-        SESSIONS = load_sessions()
-        if session_id not in SESSIONS:
-            raise HTTPException(404, "Session not found")
-        
-    state = SESSIONS[session_id]
-    input_path = state.get("video_path")
+    return {"reply": reply, **state_response(req, final_state), **extra}
+
+@app.post("/chat")
+async def chat_agent(req: ChatRequest):
+    set_session(req.session_id)
+    current_state = SESSIONS.get(req.session_id)
+    if current_state is None:
+        raise HTTPException(status_code=404, detail="Session not found")
     
-    if not input_path:
-        raise HTTPException(500, "Video path missing in session")
+    inputs = build_agent_inputs(req.session_id, current_state, req.prompt)
+    result = await run_in_threadpool(lambda: require_engine("llm").invoke(inputs))
+    return await run_in_threadpool(complete_turn, req, current_state, result)
 
-    original_name = Path(input_path).name
-    output_filename = f"burned_{original_name}"
-    output_path = PROCESSED_DIR / output_filename
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    
+@app.post("/chat/stream")
+async def chat_agent_stream(req: ChatRequest):
+    """/chat as server-sent events: `token`, `actions`, `progress`, then `final` (the /chat payload) or `error`."""
+    set_session(req.session_id)
+    current_state = SESSIONS.get(req.session_id)
+    if current_state is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def emit(event, data=None):
+        loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+
+    def run_turn():
+        try:
+            config = {"configurable": {
+                "on_token": lambda text: emit("token", {"text": text}),
+                "on_actions": lambda actions: emit("actions", {"actions": actions})
+            }}
+            result = require_engine("llm").invoke(build_agent_inputs(req.session_id, current_state, req.prompt), config=config)
+            emit("turn", complete_turn(req, current_state, result, on_stage=lambda stage: emit("progress", {"stage": stage, "progress": None})))
+        except HTTPException as e:
+            emit("error", e.detail if isinstance(e.detail, dict) else {"message": e.detail})
+        except Exception as e:
+            print(f"❌ Streaming chat failed: {e}")
+            emit("error", {"message": str(e)})
+
+    async def events():
+        worker = asyncio.ensure_future(run_in_threadpool(run_turn))
+        yield sse_event("progress", {"stage": "thinking", "progress": 0})
+        while True:
+            event, data = await queue.get()
+            if event != "turn":
+                yield sse_event(event, data)
+                if event == "error":
+                    break
+                continue
+
+            job_id = data.get("job_id")
+            if not job_id:
+                yield sse_event("final", data)
+                break
+            # Render-mode auto-cut: relay the job's stages until it settles
+            last = None
+            while True:
+                job = get_job(job_id)
+                status = job.to_dict()
+                if (status["stage"], status["progress"]) != last:
+                    last = (status["stage"], status["progress"])
+                    yield sse_event("progress", {"stage": status["stage"], "progress": status["progress"]})
+                if status["status"] in ("done", "failed", "cancelled"):
+                    break
+                await asyncio.sleep(0.25)
+            if status["status"] == "done":
+                # The turn's patch predates the cut: diff the client's base against the state the job left behind
+                state = await run_in_threadpool(SESSIONS.get, req.session_id)
+                media = {key: value for key, value in job.result.items() if key in ("video_url", "skip_ranges", "force_refresh")}
+                yield sse_event("final", {
+                    "job_id": job_id,
+                    **media,
+                    **state_response(req, state),
+                    "reply": "\n".join(filter(None, [data["reply"], job.result.get("reply")]))
+                })
+            else:
+                yield sse_event("error", {"message": status.get("error") or f"Job {status['status']}"})
+            break
+        await worker
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+def step_history(session_id, base_version, backwards):
+    set_session(session_id)
+    with HISTORY.lock(session_id):
+        current_state = SESSIONS.get(session_id)
+        if current_state is None:
+            raise HTTPException(404, "Session not found")
+        restored = HISTORY.undo(session_id, current_state) if backwards else HISTORY.redo(session_id, current_state)
+        if restored is None:
+            raise HTTPException(409, f"Nothing to {'undo' if backwards else 'redo'}")
+        save_session(session_id, restored)
+
+    response = {
+        **HISTORY.delta(session_id, base_version, restored),
+        "can_undo": HISTORY.can_undo(session_id),
+        "can_redo": HISTORY.can_redo(session_id)
+    }
+    if restored.get("video_path") != current_state.get("video_path"):
+        response["video_url"] = preview_url(restored["video_path"])
+    if restored.get("keep_segments"):
+        response["skip_ranges"] = complement_ranges([tuple(r) for r in restored["keep_segments"]], restored.get("duration", 0.0))
+    else:
+        response["skip_ranges"] = []
+    return response
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Forgets a session and unpins its files; shared uploads stay, renders become evictable."""
+    if session_id not in SESSIONS:
+        raise HTTPException(404, "Session not found")
+    SESSIONS.delete(session_id)
+    HISTORY.forget(session_id)
+    EXPORTED_VERSIONS.pop(session_id, None)
+    STORAGE.release_refs(session_id)
+    return {"deleted": session_id}
+
+@app.post("/sessions/{session_id}/undo")
+async def undo_edit(session_id: str, base_version: int = None):
+    return step_history(session_id, base_version, backwards=True)
+
+@app.post("/sessions/{session_id}/redo")
+async def redo_edit(session_id: str, base_version: int = None):
+    return step_history(session_id, base_version, backwards=False)
+
+def run_export(job, session_id, state, input_path, output_path):
+    """Renders `state`, the session as it was when the export was requested."""
     print(f"🎬 Request to Export: {output_path}")
     
-    success = burn_subtitles(input_path, state["subtitles"], state["style"], str(output_path))
+    args = (input_path, state["subtitles"], state["style"], str(output_path))
+    success = False
+    if EXPORT_ENGINE == "chunked":
+        success = render_export(*args, keep_segments=state.get("keep_segments"), progress_callback=job.update)
+    if not success:
+        success = burn_subtitles(*args, progress_callback=job.update, keep_segments=state.get("keep_segments"))
     
     if not success:
-        raise HTTPException(500, "Video processing failed inside FFmpeg")
+        raise RuntimeError("Video processing failed inside FFmpeg")
+    STORAGE.register(output_path, "export", session_id)
+    refresh_refs(session_id, state.get("version"))
         
-    safe_filename = urllib.parse.quote(output_filename)
+    safe_filename = urllib.parse.quote(output_path.name)
     return {"download_url": f"http://127.0.0.1:8000/download/{safe_filename}"}
 
-@app.get("/download/{filename}")
-async def download_file(filename: str):
+@app.get("/sessions/{session_id}/search")
+async def search_transcript(session_id: str, q: str, k: int = 5):
+    state = SESSIONS.get(session_id)
+    if state is None:
+        raise HTTPException(404, "Session not found")
+    return {"query": q, "matches": find_phrase_candidates(state["subtitles"], q, k=k, session_id=session_id)}
+
+def export_job_args(kind, session_id, state):
+    """(state snapshot, input path, output path, dedup key) of a session's export in a job of `kind`."""
+    input_path = state["video_path"]
+    # Per session: stored uploads are shared by every session created from the same file
+    output_path = PROCESSED_DIR / f"burned_{session_id}{Path(input_path).suffix}"
+    return snapshot(state), input_path, output_path, (kind, "export", session_id, state.get("version"), EXPORT_ENGINE)
+
+def run_batch_export(job, session_id, state, input_path, output_path, lane):
+    with use_lane(lane):
+        return run_export(job, session_id, state, input_path, output_path)
+
+@app.post("/export")
+async def export_video(req: ChatRequest):
+    session_id = req.session_id
+    set_session(session_id)
+    
+    state = SESSIONS.get(session_id)
+    if state is None:
+        raise HTTPException(404, "Session not found")
+    if not state.get("video_path"):
+        raise HTTPException(500, "Video path missing in session")
+
+    export_state, input_path, output_path, key = export_job_args("render", session_id, state)
+    job = submit_job("render", run_export, session_id, export_state, input_path, output_path, dedup_key=key)
+    return {"job_id": job.id, "status": job.status, "eta_seconds": job.eta()}
+
+@app.post("/export/batch")
+async def export_batch(req: BatchExportRequest):
+    """Queues an export per session in the `priority` lane; sessions already queued by a batch share that job."""
+    if req.priority not in LANES:
+        raise HTTPException(400, f"priority must be one of: {', '.join(LANES)}")
+    session_ids = list(dict.fromkeys(req.session_ids))
+    if len(session_ids) > MAX_BATCH_EXPORT:
+        raise HTTPException(400, f"At most {MAX_BATCH_EXPORT} sessions per batch")
+
+    jobs, missing = [], []
+    for session_id in session_ids:
+        state = SESSIONS.get(session_id)
+        if state is None or not state.get("video_path"):
+            missing.append(session_id)
+            continue
+        export_state, input_path, output_path, key = export_job_args("batch", session_id, state)
+        submitted_at = time.time()
+        with bind_session(session_id):
+            job = submit_job(
+                "batch", run_batch_export, session_id, export_state, input_path, output_path, req.priority, dedup_key=key
+            )
+        jobs.append({
+            "session_id": session_id,
+            "job_id": job.id,
+            "status": job.status,
+            "eta_seconds": job.eta(),
+            "deduplicated": job.created_at < submitted_at
+        })
+    return {"jobs": jobs, "missing": missing}
+
+def run_rendition_export(job, session_id, state, input_path, renditions):
+    print(f"🎬 Request to Export {len(renditions)} renditions for {session_id}")
+
+    results, wall = render_renditions(
+        input_path, state["subtitles"], state["style"], str(PROCESSED_DIR), f"burned_{session_id}", renditions,
+        progress_callback=job.update, keep_segments=state.get("keep_segments")
+    )
+    for r in results:
+        STORAGE.register(r["path"], "export", session_id)
+    refresh_refs(session_id, state.get("version"))
+    return {
+        "renditions": [
+            {
+                "name": r["name"],
+                "download_url": f"http://127.0.0.1:8000/download/{urllib.parse.quote(os.path.basename(r['path']))}",
+                "encode_seconds": r["encode_seconds"]
+            }
+            for r in results
+        ],
+        "wall_seconds": wall
+    }
+
+@app.post("/export/renditions")
+async def export_renditions(req: RenditionExportRequest):
+    set_session(req.session_id)
+    state = SESSIONS.get(req.session_id)
+    if state is None:
+        raise HTTPException(404, "Session not found")
+    if not state.get("video_path"):
+        raise HTTPException(500, "Video path missing in session")
+
+    renditions = [spec.dict() for spec in req.renditions] or DEFAULT_RENDITIONS
+    if len({spec["name"] for spec in renditions}) != len(renditions):
+        raise HTTPException(400, "Rendition names must be unique")
+
+    job = submit_job("render", run_rendition_export, req.session_id, snapshot(state), state["video_path"], renditions)
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/waveform/{session_id}")
+async def get_waveform(session_id: str, start: float = 0.0, end: float = None, level: int = None, width: int = 1000, format: str = "json"):
+    """Min/max peaks for one zoom level and time window, with silences and current cuts overlaid."""
+    state = SESSIONS.get(session_id)
+    if state is None:
+        raise HTTPException(404, "Session not found")
+
+    peaks_path = peaks_path_for(state["video_path"])
+    if not os.path.exists(peaks_path):
+        await run_in_threadpool(build_peaks, state["video_path"], peaks_path)
+        STORAGE.register(peaks_path, "peaks")
+    pyramid = PeakPyramid(peaks_path)
+
+    end = pyramid.duration if end is None else min(end, pyramid.duration)
+    if end <= start:
+        raise HTTPException(400, "Empty time window")
+    if level is None:
+        level = pyramid.pick_level(start, end, max(1, width))
+    elif not 0 <= level < len(pyramid.levels):
+        raise HTTPException(400, f"level must be between 0 and {len(pyramid.levels) - 1}")
+
+    peaks, window_start = pyramid.window(level, start, end)
+    silences = pyramid.silences_between(start, end)
+    keep_segments = state.get("keep_segments")
+    cuts = [r for r in complement_ranges(keep_segments, pyramid.duration) if r[1] > start and r[0] < end] if keep_segments else []
+
+    meta = {"level": level, "levels": len(pyramid.levels), "start": window_start, "seconds_per_peak": pyramid.seconds_per_peak(level)}
+    if format == "binary":
+        # Interleaved int8 min/max pairs; overlays are small enough for headers
+        headers = {
+            "X-Peaks-Level": str(level),
+            "X-Peaks-Start": f"{window_start:.6f}",
+            "X-Seconds-Per-Peak": f"{meta['seconds_per_peak']:.6f}",
+            "X-Silences": ";".join(f"{s:.3f},{e:.3f}" for s, e in silences),
+            "X-Cuts": ";".join(f"{s:.3f},{e:.3f}" for s, e in cuts),
+            "Access-Control-Expose-Headers": "X-Peaks-Level, X-Peaks-Start, X-Seconds-Per-Peak, X-Silences, X-Cuts"
+        }
+        return Response(content=peaks.tobytes(), media_type="application/octet-stream", headers=headers)
+
+    return {**meta, "peaks": peaks.tolist(), "silences": silences, "cuts": cuts}
+
+@app.get("/timeline/{session_id}")
+async def get_timeline_window(session_id: str, t: float = None, start: float = None, end: float = None, layers: str = None):
+    """Overlay items at `t` or within [start, end], per layer (`layers` filters), plus conflicts."""
+    state = SESSIONS.get(session_id)
+    if state is None:
+        raise HTTPException(404, "Session not found")
+
+    selected = layers.split(",") if layers else None
+    unknown = [key for key in selected or [] if key not in TIMELINE_LAYERS]
+    if unknown:
+        raise HTTPException(400, f"Unknown layers: {', '.join(unknown)}")
+
+    timeline = get_timeline(session_id, state)
+    if t is not None:
+        start = end = t
+    start = 0.0 if start is None else start
+    end = float("inf") if end is None else end
+    if end < start:
+        raise HTTPException(400, "Empty time window")
+
+    return {
+        "version": timeline.version,
+        "start": start,
+        "end": end if end != float("inf") else None,
+        "layers": timeline.between(start, end, selected),
+        "conflicts": [c for c in timeline.conflicts() if c["end"] >= start and c["start"] <= end]
+    }
+
+@app.get("/jobs")
+async def jobs_status(ids: str):
+    """Status, progress and ETA of several jobs at once (comma-separated ids), e.g. a whole export batch."""
+    jobs = [get_job(job_id) for job_id in ids.split(",") if job_id]
+    return {"jobs": [job.to_dict() for job in jobs if job], "scheduler": SCHEDULER.stats()}
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    if job.status == "failed":
+        raise HTTPException(500, job.error)
+    if job.status != "done":
+        raise HTTPException(409, f"Job is {job.status}")
+    return job.result
+
+@app.post("/jobs/{job_id}/cancel")
+async def job_cancel(job_id: str):
+    job = cancel_job(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return job.to_dict()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {"transcripts": TRANSCRIPTS.stats()}
+
+@app.get("/storage/usage")
+async def storage_usage():
+    """Bytes per artifact kind in the upload and export directories, against the quota."""
+    return STORAGE.usage()
+
+@app.post("/storage/sweep")
+async def storage_sweep():
+    """Runs one sweep step now (register new files, forget deleted ones, evict if over quota)."""
+    await run_in_threadpool(STORAGE.sweep)
+    return STORAGE.usage()
+
+@app.get("/agent/stats")
+async def agent_stats():
+    return prompt_stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Stage and request latency histograms, job queues, in-flight ffmpeg processes and cache hit rates, for Prometheus."""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/metrics/stages")
+async def stage_stats():
+    """The same stage timings as /metrics, summarized as JSON: count, total and mean seconds per stage."""
+    return STAGE_SECONDS.summary()
+
+@app.get("/healthz")
+async def liveness():
+    """Liveness: the process is up and serving. Never waits on a model."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readiness():
+    """Readiness: 200 once every warmed-up engine (WARM_ENGINES) has loaded, 503 until then."""
+    ready = is_ready()
+    body = {"ready": ready, "warm_engines": WARM_ENGINES, "engines": engine_status()}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+@app.api_route("/download/{filename}", methods=["GET", "HEAD"])
+async def download_file(filename: str, request: Request):
     decoded_filename = urllib.parse.unquote(filename)
     file_path = PROCESSED_DIR / decoded_filename
     
@@ -216,4 +771,5 @@ async def download_file(filename: str):
         print(f"❌ File Missing at: {file_path}")
         raise HTTPException(404, f"File not found on server: {decoded_filename}")
         
-    return FileResponse(path=file_path, media_type="video/mp4", filename=decoded_filename)
\ No newline at end of file
+    STORAGE.touch(file_path)
+    return serve_media(request, file_path, filename=decoded_filename)
\ No newline at end of file
@@ -16,6 +16,24 @@ class StyleConfig(BaseModel):
 class ChatRequest(BaseModel):
     session_id: str
     prompt: str
+    retranscribe: bool = False
+    base_version: Optional[int] = None  # last state version the client has; replies come as a patch from it
+
+class RenditionSpec(BaseModel):
+    name: str
+    height: Optional[int] = None
+    aspect: Optional[str] = None  # e.g. "9:16" crops to fill that frame
+    audio_only: bool = False
+    crf: int = 20
+    audio_bitrate: str = "160k"
+
+class RenditionExportRequest(BaseModel):
+    session_id: str
+    renditions: List[RenditionSpec] = []
+
+class BatchExportRequest(BaseModel):
+    session_ids: List[str]
+    priority: str = "batch"  # ffmpeg scheduler lane: "batch" or "interactive"
 
 class VisualAsset(BaseModel):
     start: float
@@ -0,0 +1,120 @@
+import os
+import hashlib
+import threading
+import subprocess
+from pathlib import Path
+
+import numpy as np
+
+from app.services.metrics import span, track_process, count_lookup
+
+
+SAMPLE_RATE = 16000
+AUDIO_CACHE_DIR = Path(os.getenv("AUDIO_CACHE_DIR", Path(__file__).resolve().parents[2] / "cache" / "audio"))
+# Silence detection reads the buffer in blocks so an hour of audio never gets copied at once
+BLOCK_SECONDS = 60
+
+_decode_locks = {}
+_decode_locks_guard = threading.Lock()
+# fn(media_path, pcm_path, decoded) after every lookup, e.g. to account the file in the storage registry
+_observers = []
+
+
+def observe_pcm(fn):
+    _observers.append(fn)
+
+
+def _notify(media_path, pcm_path, decoded):
+    for fn in _observers:
+        try:
+            fn(media_path, pcm_path, decoded)
+        except Exception as e:
+            print(f"⚠️ PCM cache observer failed: {e}")
+
+
+def pcm_path_for(media_path):
+    """Cache location for a media file's decoded audio; changes whenever the file does."""
+    stat = os.stat(media_path)
+    fingerprint = hashlib.sha1(f"{os.path.abspath(media_path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+    return AUDIO_CACHE_DIR / f"{Path(media_path).stem}-{fingerprint}.f32"
+
+
+def decode_audio(media_path):
+    """Decodes a media file once into 16 kHz mono float32 PCM and returns the cached path."""
+    pcm_path = pcm_path_for(media_path)
+    if pcm_path.exists():
+        count_lookup("audio_pcm", True)
+        _notify(media_path, pcm_path, False)
+        return pcm_path
+    count_lookup("audio_pcm", False)
+
+    with _decode_locks_guard:
+        lock = _decode_locks.setdefault(str(pcm_path), threading.Lock())
+
+    with lock:
+        if pcm_path.exists():
+            return pcm_path
+
+        AUDIO_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        part_path = pcm_path.with_suffix(".part")
+        print(f"🔊 Decoding audio for {Path(media_path).name}...")
+        cmd = [
+            "ffmpeg", "-nostdin", "-y", "-i", str(media_path),
+            "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "f32le", str(part_path)
+        ]
+        with span("audio_decode"), track_process(cmd):
+            result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            if part_path.exists():
+                part_path.unlink()
+            raise RuntimeError(f"Failed to decode audio: {result.stderr[-500:]}")
+        os.replace(part_path, pcm_path)
+        _notify(media_path, pcm_path, True)
+
+    with _decode_locks_guard:
+        _decode_locks.pop(str(pcm_path), None)
+    return pcm_path
+
+
+def open_pcm(pcm_path, start=0, end=None):
+    """Read-only memory map over a cached PCM file (or a sample range of it)."""
+    samples = np.memmap(pcm_path, dtype=np.float32, mode="r")
+    return samples[start:end]
+
+
+def load_pcm(media_path):
+    """The media's audio as a memory-mapped float32 array at 16 kHz, decoding it on first use."""
+    pcm_path = decode_audio(media_path)
+    if os.path.getsize(pcm_path) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return open_pcm(pcm_path)
+
+
+def frame_levels_db(samples, window=0.02):
+    """RMS level in dBFS for consecutive `window`-second frames."""
+    frame = int(SAMPLE_RATE * window)
+    n_frames = len(samples) // frame
+    levels = np.empty(n_frames, dtype=np.float32)
+    block = max(1, int(BLOCK_SECONDS / window))
+
+    for first in range(0, n_frames, block):
+        last = min(n_frames, first + block)
+        chunk = np.asarray(samples[first * frame : last * frame]).reshape(last - first, frame)
+        rms = np.sqrt(np.mean(np.square(chunk, dtype=np.float32), axis=1))
+        levels[first:last] = 20 * np.log10(np.maximum(rms, 1e-10))
+    return levels
+
+
+def detect_silence(samples, db_threshold=-30, min_duration=0.5, window=0.02):
+    """Vectorized silencedetect: [(start, end)] of at least `min_duration` seconds below `db_threshold` dBFS."""
+    levels = frame_levels_db(samples, window)
+    if len(levels) == 0:
+        return []
+
+    silent = np.concatenate(([0], (levels < db_threshold).astype(np.int8), [0]))
+    edges = np.diff(silent)
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+
+    keep = (run_ends - run_starts) * window >= min_duration
+    return [(float(s * window), float(e * window)) for s, e in zip(run_starts[keep], run_ends[keep])]
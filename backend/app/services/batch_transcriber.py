@@ -0,0 +1,240 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+import whisper
+from whisper.audio import N_FRAMES, N_SAMPLES, HOP_LENGTH
+from whisper.decoding import DecodingOptions
+from whisper.timing import add_word_timestamps
+from whisper.tokenizer import get_tokenizer
+
+from app.services.audio_cache import SAMPLE_RATE
+from app.services.model_pool import borrow_model, DEFAULT_MODEL
+from app.services.metrics import STAGE_SECONDS, CallbackGauge
+
+
+# A batch goes to the model once it has this many windows or its oldest window waited this long
+BATCH_MAX_SIZE = int(os.getenv("TRANSCRIBE_BATCH_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("TRANSCRIBE_BATCH_WAIT_MS", "50"))
+# Same fallback rules as whisper.transcribe
+TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+TIME_PRECISION = 0.02
+# Word alignment switches attention implementations class-wide while it runs, so two
+# alignments on different instances at once break each other
+_ALIGNMENT_LOCK = threading.Lock()
+
+
+class _Window:
+    def __init__(self, audio):
+        self.audio = np.asarray(audio, dtype=np.float32)
+        self.future = Future()
+        self.queued_at = time.perf_counter()
+
+
+class BatchingTranscriber:
+    """Runs Whisper windows from concurrent callers together in batches of up to `max_batch`."""
+
+    def __init__(self, model_name=None, max_batch=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS, threads=None, temperatures=TEMPERATURES, sample_len=None):
+        self.model_name = model_name or DEFAULT_MODEL
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self.threads = threads or os.cpu_count() or 1
+        self.temperatures = temperatures
+        self.sample_len = sample_len
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._windows = 0
+        self._busy_seconds = 0.0
+        self._wait_seconds = 0.0
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="whisper-batcher", daemon=True)
+                self._thread.start()
+
+    def submit_window(self, audio):
+        """Queues one window (at most 30s); the future resolves to segments relative to its start."""
+        if len(audio) > N_SAMPLES:
+            raise ValueError("A window can't be longer than 30 seconds")
+        window = _Window(audio)
+        self._ensure_worker()
+        self._queue.put(window)
+        return window.future
+
+    def close(self):
+        """Stops the worker once the windows already queued are done."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = batch[0].queued_at + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    window = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if window is None:
+                    # Finish this batch, then stop
+                    self._queue.put(None)
+                    break
+                batch.append(window)
+            started = time.perf_counter()
+            status = "ok"
+            try:
+                outcomes = self._run_batch(batch)
+            except Exception as e:
+                print(f"❌ Transcription batch of {len(batch)} failed: {e}")
+                outcomes = [e] * len(batch)
+                status = "error"
+            # Not a span: the worker serves every session at once, so there's nobody to log it for
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="whisper_batch", status=status)
+            with self._lock:
+                self._batches += 1
+                self._windows += len(batch)
+                self._busy_seconds += time.perf_counter() - started
+                self._wait_seconds += sum(started - w.queued_at for w in batch)
+            for window, outcome in zip(batch, outcomes):
+                if isinstance(outcome, Exception):
+                    window.future.set_exception(outcome)
+                else:
+                    window.future.set_result(outcome)
+
+    def _run_batch(self, batch):
+        """Segments (or the exception) for every window of the batch, in order."""
+        with borrow_model(self.model_name) as model:
+            torch.set_num_threads(self.threads)
+            mels = torch.stack([
+                whisper.log_mel_spectrogram(w.audio, model.dims.n_mels, padding=N_SAMPLES)[:, :N_FRAMES]
+                for w in batch
+            ]).to(model.device)
+
+            results = [None] * len(batch)
+            pending = list(range(len(batch)))
+            for temperature in self.temperatures:
+                options = DecodingOptions(task="transcribe", temperature=temperature, sample_len=self.sample_len, fp16=False)
+                decoded = whisper.decode(model, mels[pending], options)
+                retry = []
+                for i, result in zip(pending, decoded):
+                    results[i] = result
+                    silent = result.no_speech_prob > NO_SPEECH_THRESHOLD
+                    failed = result.compression_ratio > COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < LOGPROB_THRESHOLD
+                    if failed and not silent:
+                        retry.append(i)
+                pending = retry
+                if not pending:
+                    break
+
+            outcomes = []
+            for i, (window, result) in enumerate(zip(batch, results)):
+                try:
+                    outcomes.append(self._segments(model, window, mels[i], result))
+                except Exception as e:
+                    outcomes.append(e)
+            return outcomes
+
+    def _segments(self, model, window, mel, result):
+        """Splits one window's tokens at timestamp pairs (as whisper.transcribe does) and aligns the words."""
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+            return []
+
+        tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages, language=result.language, task="transcribe")
+        tokens = torch.tensor(result.tokens)
+        duration = len(window.audio) / SAMPLE_RATE
+        timestamp_tokens = tokens.ge(tokenizer.timestamp_begin)
+
+        def segment(start, end, seg_tokens):
+            seg_tokens = seg_tokens.tolist()
+            return {
+                "seek": 0,
+                "start": min(start, duration),
+                "end": min(end, duration),
+                "text": tokenizer.decode([t for t in seg_tokens if t < tokenizer.eot]),
+                "tokens": seg_tokens,
+            }
+
+        segments = []
+        consecutive = (torch.where(timestamp_tokens[:-1] & timestamp_tokens[1:])[0] + 1).tolist()
+        if consecutive:
+            last_slice = 0
+            for current_slice in consecutive:
+                sliced = tokens[last_slice:current_slice]
+                start = (sliced[0].item() - tokenizer.timestamp_begin) * TIME_PRECISION
+                end = (sliced[-1].item() - tokenizer.timestamp_begin) * TIME_PRECISION
+                segments.append(segment(start, end, sliced))
+                last_slice = current_slice
+            # There's no next window to seek into, so an unfinished tail runs to the window's end
+            tail = tokens[last_slice:]
+            if (tail < tokenizer.timestamp_begin).any():
+                start = (tail[0].item() - tokenizer.timestamp_begin) * TIME_PRECISION if timestamp_tokens[last_slice] else segments[-1]["end"]
+                end = (tail[-1].item() - tokenizer.timestamp_begin) * TIME_PRECISION if timestamp_tokens[-1] else duration
+                segments.append(segment(start, end, tail))
+        elif len(tokens):
+            end = duration
+            timestamps = tokens[timestamp_tokens.nonzero().flatten()]
+            if len(timestamps) and timestamps[-1].item() != tokenizer.timestamp_begin:
+                end = (timestamps[-1].item() - tokenizer.timestamp_begin) * TIME_PRECISION
+            segments.append(segment(0.0, end, tokens))
+
+        segments = [s for s in segments if s["text"].strip()]
+        if segments:
+            with _ALIGNMENT_LOCK:
+                add_word_timestamps(
+                    segments=segments, model=model, tokenizer=tokenizer, mel=mel,
+                    num_frames=len(window.audio) // HOP_LENGTH, last_speech_timestamp=0.0
+                )
+        return segments
+
+    def stats(self):
+        with self._lock:
+            batches = self._batches or 1
+            return {
+                "model": self.model_name,
+                "batches": self._batches,
+                "windows": self._windows,
+                "avg_batch_size": round(self._windows / batches, 2),
+                "avg_batch_seconds": round(self._busy_seconds / batches, 3),
+                "avg_queue_wait": round(self._wait_seconds / max(1, self._windows), 3),
+                "queued": self._queue.qsize(),
+            }
+
+
+_BATCHERS = {}
+_BATCHERS_LOCK = threading.Lock()
+
+
+def get_batcher(model_name=None):
+    """One batcher per model, shared by every upload in the process."""
+    model_name = model_name or DEFAULT_MODEL
+    with _BATCHERS_LOCK:
+        batcher = _BATCHERS.get(model_name)
+        if batcher is None:
+            batcher = BatchingTranscriber(model_name)
+            _BATCHERS[model_name] = batcher
+        return batcher
+
+
+def _queued_windows():
+    with _BATCHERS_LOCK:
+        return {(name,): batcher._queue.qsize() for name, batcher in _BATCHERS.items()}
+
+
+BATCH_QUEUE = CallbackGauge("transcribe_windows_queued", "Audio windows waiting for the Whisper batcher.", _queued_windows, ["model"])
@@ -0,0 +1,114 @@
+import os
+import time
+import shutil
+import threading
+import subprocess
+
+from app.services.metrics import span, CallbackGauge
+
+
+# Engines loaded in the background right after startup; the rest load on first use
+WARM_ENGINES = [name.strip() for name in os.getenv("WARM_ENGINES", "ffmpeg,llm,whisper").split(",") if name.strip()]
+STATES = ("cold", "loading", "ready", "failed")
+
+
+class Engine:
+    """A heavy dependency loaded once, on first use or by the warm-up; concurrent callers wait for that load."""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.state = "cold"
+        self.value = None
+        self.error = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The loaded engine; loads it first if needed. Re-raises the load error after a failure."""
+        if self.state == "ready":
+            return self.value
+        with self._lock:
+            if self.state != "ready":
+                self.state = "loading"
+                started = time.perf_counter()
+                try:
+                    with span("engine_load", engine=self.name):
+                        self.value = self.loader()
+                except Exception as e:
+                    self.state, self.error = "failed", str(e)
+                    raise
+                self.load_seconds = round(time.perf_counter() - started, 3)
+                self.state, self.error = "ready", None
+        return self.value
+
+    def status(self):
+        return {"state": self.state, "load_seconds": self.load_seconds, "error": self.error}
+
+
+_ENGINES = {}
+
+
+def register_engine(name, loader):
+    _ENGINES[name] = Engine(name, loader)
+    return _ENGINES[name]
+
+
+def require_engine(name):
+    """Blocks until `name` is loaded and returns it. Don't call this on the event loop."""
+    return _ENGINES[name].get()
+
+
+def warm_engines(names=None):
+    """Loads engines one after another; meant for a daemon thread started at startup."""
+    for name in names if names is not None else WARM_ENGINES:
+        try:
+            require_engine(name)
+        except Exception as e:
+            print(f"⚠️ Warm-up of {name} failed: {e}")
+
+
+def engine_status():
+    return {name: engine.status() for name, engine in _ENGINES.items()}
+
+
+def is_ready(names=None):
+    """Whether every engine the startup warm-up is responsible for has loaded."""
+    names = names if names is not None else WARM_ENGINES
+    return all(_ENGINES[name].state == "ready" for name in names if name in _ENGINES)
+
+
+def _load_whisper():
+    from app.services.model_pool import warm_up, DEFAULT_MODEL
+    from app.services.transcriber import BATCHING
+    if BATCHING:
+        from app.services.batch_transcriber import get_batcher
+        get_batcher()
+    warm_up()
+    return DEFAULT_MODEL
+
+
+def _load_llm():
+    # langchain, langgraph and the Gemini client are built when the agent module is imported
+    from app.agent.graph import graph
+    return graph
+
+
+def _load_ffmpeg():
+    for tool in ("ffmpeg", "ffprobe"):
+        if shutil.which(tool) is None:
+            raise RuntimeError(f"{tool} not found on PATH")
+    out = subprocess.run(["ffmpeg", "-hide_banner", "-version"], capture_output=True, text=True, check=True).stdout
+    return out.splitlines()[0] if out else "ffmpeg"
+
+
+register_engine("whisper", _load_whisper)
+register_engine("llm", _load_llm)
+register_engine("ffmpeg", _load_ffmpeg)
+
+
+def _engine_samples():
+    return {(name, state): int(engine.state == state) for name, engine in _ENGINES.items() for state in STATES}
+
+
+ENGINE_STATE = CallbackGauge("engine_state", "1 for the state each engine is in.", _engine_samples, ["engine", "state"])
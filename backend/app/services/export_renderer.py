@@ -0,0 +1,286 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+from fractions import Fraction
+from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import ffmpeg
+
+from app.services.segment_cutter import probe_streams
+from app.services.timeline_remap import remap_subtitles
+from app.services.video_utils import generate_srt, build_style_string
+from app.services.metrics import span, track_process, count_lookup
+from app.services.ffmpeg_scheduler import cpu_slot, submit_in_lane, FFMPEG_CPU_BUDGET
+
+
+EXPORT_CHUNK_SECONDS = float(os.getenv("EXPORT_CHUNK_SECONDS", "10"))
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "0")) or max(1, (os.cpu_count() or 1) // 2)
+RENDER_CACHE_DIR = Path(os.getenv("RENDER_CACHE_DIR", Path(__file__).resolve().parents[2] / "cache" / "render"))
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(4 * 1024 * 1024 * 1024)))
+# Every chunk must come out of the encoder with identical parameters or the copy-concat breaks.
+# Bump the version whenever these change so stale chunks stop matching.
+VIDEO_ENCODE = {"vcodec": "libx264", "preset": "veryfast", "crf": 20, "pix_fmt": "yuv420p"}
+AUDIO_ENCODE = {"acodec": "aac", "audio_bitrate": "192k", "ar": 48000, "ac": 2}
+ENCODE_VERSION = 2
+# Used when the source's rate is missing or is a timebase rather than a frame rate (some VFR files)
+FALLBACK_FRAME_RATE = Fraction(30)
+MAX_FRAME_RATE = 120
+
+# Cache files an export in flight still has to concat; eviction leaves them alone
+_pinned = {}
+_pinned_lock = threading.Lock()
+
+
+def probe_duration(input_path):
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", input_path]
+    with track_process(cmd):
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    return float(result.stdout.strip())
+
+
+def output_frame_rate(video_stream):
+    """The constant frame rate chunks are encoded at, as an exact fraction (30000/1001, not 29.97)."""
+    for field in ("r_frame_rate", "avg_frame_rate"):
+        try:
+            rate = Fraction((video_stream or {}).get(field) or "0")
+        except (ValueError, ZeroDivisionError):
+            continue
+        if 0 < rate <= MAX_FRAME_RATE:
+            return rate
+    return FALLBACK_FRAME_RATE
+
+
+def source_fingerprint(input_path):
+    stat = os.stat(input_path)
+    return f"{os.path.abspath(input_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def output_to_source(keep_segments, start, end):
+    """The source ranges that make up [start, end] of the edited (output) timeline."""
+    pieces = []
+    cursor = 0.0
+    for src_start, src_end in keep_segments:
+        length = src_end - src_start
+        lo, hi = max(start, cursor), min(end, cursor + length)
+        if hi > lo:
+            pieces.append((src_start + (lo - cursor), src_start + (hi - cursor)))
+        cursor += length
+        if cursor >= end:
+            break
+    return pieces
+
+
+def subtitles_in_range(subtitles, start, end):
+    """Subtitles overlapping [start, end], shifted to chunk-local time and clipped to it."""
+    local = []
+    for sub in subtitles:
+        if sub["end"] <= start or sub["start"] >= end:
+            continue
+        local.append({
+            "start": round(max(sub["start"], start) - start, 3),
+            "end": round(min(sub["end"], end) - start, 3),
+            "text": sub["text"]
+        })
+    return local
+
+
+def plan_chunks(keep_segments, subtitles, style_str, fingerprint, frame_rate=FALLBACK_FRAME_RATE, chunk_seconds=EXPORT_CHUNK_SECONDS):
+    """Fixed-length, frame-aligned chunks of the output timeline, each keyed by everything that changes its pixels."""
+    output_duration = sum(end - start for start, end in keep_segments)
+    total_frames = max(1, round(output_duration * frame_rate))
+    chunk_frames = max(1, round(chunk_seconds * frame_rate))
+    chunks = []
+    for first in range(0, total_frames, chunk_frames):
+        last = min(first + chunk_frames, total_frames)
+        start, end = float(first / frame_rate), float(last / frame_rate)
+        pieces = output_to_source(keep_segments, start, min(end, output_duration))
+        local_subs = subtitles_in_range(subtitles, start, end)
+        key_blob = json.dumps({
+            "source": fingerprint,
+            "pieces": [[round(a, 3), round(b, 3)] for a, b in pieces],
+            "subtitles": local_subs,
+            "style": style_str,
+            "frames": [str(frame_rate), last - first],
+            "encode": [VIDEO_ENCODE, ENCODE_VERSION],
+        }, sort_keys=True)
+        chunks.append({
+            "key": hashlib.sha256(key_blob.encode("utf-8")).hexdigest(),
+            "pieces": pieces,
+            "subtitles": local_subs,
+            "frame_rate": frame_rate,
+            "frames": last - first,
+        })
+    return chunks
+
+
+def _run(cmd):
+    with track_process(cmd):
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-500:] or f"ffmpeg exited with {result.returncode}")
+
+
+def _render_chunk(input_path, chunk, style_str, work_dir, threads):
+    """Renders one video-only chunk into the cache (audio is rendered once for the whole export)."""
+    cached = RENDER_CACHE_DIR / f"chunk_{chunk['key']}.mp4"
+    count_lookup("render_chunks", cached.exists())
+    if cached.exists():
+        os.utime(cached)
+        return cached, True
+
+    # Accurate input seek to the first piece; trims are relative to it
+    seek = chunk["pieces"][0][0]
+    source = ffmpeg.input(input_path, ss=seek)
+    streams = [source.video.trim(start=a - seek, end=b - seek).setpts("PTS-STARTPTS") for a, b in chunk["pieces"]]
+    video = streams[0] if len(streams) == 1 else ffmpeg.concat(*streams, v=1, a=0)
+    # Constant frame rate with exactly the planned frame count (the last frame is repeated if the
+    # trim comes up a frame short), whatever the source's rate or timestamp jitter
+    frame_time = float(1 / chunk["frame_rate"])
+    video = video.filter("fps", fps=str(chunk["frame_rate"])).filter("tpad", stop_mode="clone", stop_duration=2 * frame_time)
+
+    if chunk["subtitles"]:
+        srt_path = os.path.join(work_dir, f"{chunk['key']}.srt")
+        generate_srt(chunk["subtitles"], srt_path)
+        video = video.filter("subtitles", srt_path, force_style=style_str)
+
+    part_path = cached.with_suffix(f".{os.getpid()}.{chunk['key'][:8]}.part.mp4")
+    with cpu_slot(threads) as granted:
+        out = ffmpeg.output(video, str(part_path), an=None, threads=granted, **{"frames:v": chunk["frames"]}, **VIDEO_ENCODE)
+        _run(ffmpeg.compile(out, overwrite_output=True))
+    os.replace(part_path, cached)
+    return cached, False
+
+
+def _audio_path(keep_segments, fingerprint):
+    key_blob = json.dumps({
+        "source": fingerprint,
+        "keep": [[round(a, 3), round(b, 3)] for a, b in keep_segments],
+        "encode": [AUDIO_ENCODE, ENCODE_VERSION],
+    }, sort_keys=True)
+    return RENDER_CACHE_DIR / f"audio_{hashlib.sha256(key_blob.encode('utf-8')).hexdigest()}.m4a"
+
+
+def _render_audio(input_path, keep_segments, fingerprint):
+    """The whole edited soundtrack in one encode, so chunk joins never click or drift."""
+    cached = _audio_path(keep_segments, fingerprint)
+    count_lookup("render_audio", cached.exists())
+    if cached.exists():
+        os.utime(cached)
+        return cached
+
+    source = ffmpeg.input(input_path)
+    streams = [source.audio.filter_("atrim", start=a, end=b).filter_("asetpts", "PTS-STARTPTS") for a, b in keep_segments]
+    audio = streams[0] if len(streams) == 1 else ffmpeg.concat(*streams, v=0, a=1)
+    part_path = cached.with_suffix(f".{os.getpid()}.part.m4a")
+    # The AAC encoder is single-threaded
+    with cpu_slot(1) as granted:
+        _run(ffmpeg.compile(ffmpeg.output(audio, str(part_path), vn=None, threads=granted, **AUDIO_ENCODE), overwrite_output=True))
+    os.replace(part_path, cached)
+    return cached
+
+
+@contextmanager
+def pin_cache_files(paths):
+    """Keeps `paths` out of evict_render_cache() while the block runs (an export reading them)."""
+    names = [Path(p).name for p in paths]
+    with _pinned_lock:
+        for name in names:
+            _pinned[name] = _pinned.get(name, 0) + 1
+    try:
+        yield
+    finally:
+        with _pinned_lock:
+            for name in names:
+                _pinned[name] -= 1
+                if not _pinned[name]:
+                    del _pinned[name]
+
+
+def evict_render_cache(max_bytes=RENDER_CACHE_MAX_BYTES):
+    """Drops the least recently used chunks once the render cache outgrows its quota, except pinned ones."""
+    entries = []
+    for p in RENDER_CACHE_DIR.glob("*"):
+        if p.name.endswith(("part.mp4", "part.m4a")):
+            continue
+        try:
+            stat = p.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, p))
+    total = sum(size for _, size, _ in entries)
+    with _pinned_lock:
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= max_bytes:
+                break
+            if path.name in _pinned:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def render_export(input_path, subtitles, style, output_path, keep_segments=None, progress_callback=None, workers=None):
+    """Renders the export as cached, parallel chunks, so an edit only re-encodes the chunks it touches."""
+    RENDER_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    report = progress_callback or (lambda progress: None)
+
+    try:
+        video_stream, audio_stream, _ = probe_streams(input_path)
+        total_duration = probe_duration(input_path)
+    except (subprocess.CalledProcessError, FileNotFoundError, ValueError) as e:
+        print(f"⚠️ Export probe failed: {e}")
+        return False
+
+    keep_segments = [tuple(r) for r in keep_segments] if keep_segments else [(0.0, total_duration)]
+    if keep_segments != [(0.0, total_duration)]:
+        subtitles = remap_subtitles(subtitles, keep_segments)
+
+    fingerprint = source_fingerprint(input_path)
+    style_str = build_style_string(style)
+    chunks = plan_chunks(keep_segments, subtitles, style_str, fingerprint, output_frame_rate(video_stream))
+    workers = workers or EXPORT_WORKERS
+    threads = max(1, FFMPEG_CPU_BUDGET // workers)
+    # Pinned from before the cache lookups until the concat, so a concurrent export's eviction can't pull them away
+    pinned = [RENDER_CACHE_DIR / f"chunk_{chunk['key']}.mp4" for chunk in chunks] + [_audio_path(keep_segments, fingerprint)]
+
+    work_dir = tempfile.mkdtemp(prefix="export_")
+    try:
+        with pin_cache_files(pinned):
+            with span("chunk_render", chunks=len(chunks), workers=workers) as details, ThreadPoolExecutor(max_workers=workers) as pool:
+                submit = lambda fn, *args: submit_in_lane(pool, fn, *args)
+                audio_future = submit(_render_audio, input_path, keep_segments, fingerprint) if audio_stream else None
+                futures = {submit(_render_chunk, input_path, chunk, style_str, work_dir, threads): i for i, chunk in enumerate(chunks)}
+
+                chunk_paths = [None] * len(chunks)
+                reused = 0
+                for done, future in enumerate(as_completed(futures), start=1):
+                    chunk_paths[futures[future]], was_cached = future.result()
+                    reused += was_cached
+                    report(0.9 * done / len(chunks))
+                audio_path = audio_future.result() if audio_future else None
+                details["reused"] = reused
+
+            print(f"🧱 Export: {len(chunks)} chunks, {reused} reused from cache, {len(chunks) - reused} rendered")
+
+            list_path = os.path.join(work_dir, "chunks.txt")
+            with open(list_path, "w") as f:
+                f.writelines(f"file '{path}'\n" for path in chunk_paths)
+
+            cmd = ["ffmpeg", "-nostdin", "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", list_path]
+            if audio_path:
+                cmd += ["-i", str(audio_path), "-map", "0:v", "-map", "1:a"]
+            with span("concat_chunks", chunks=len(chunks)):
+                _run(cmd + ["-c", "copy", "-movflags", "+faststart", output_path])
+            report(1.0)
+            return True
+    except (RuntimeError, ffmpeg.Error) as e:
+        print(f"FFmpeg Error: {e}")
+        return False
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        evict_render_cache()
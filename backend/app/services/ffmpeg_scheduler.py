@@ -0,0 +1,117 @@
+import os
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+from app.services.metrics import Histogram, CallbackGauge
+
+
+# Encoder threads all ffmpeg processes may use at once; 0 means one per core
+FFMPEG_CPU_BUDGET = int(os.getenv("FFMPEG_CPU_BUDGET", "0")) or os.cpu_count() or 1
+# Highest priority first: a batch encode only starts while no interactive one is waiting
+LANES = ("interactive", "batch")
+
+_lane = contextvars.ContextVar("ffmpeg_lane", default="interactive")
+
+SLOT_WAIT = Histogram("ffmpeg_slot_wait_seconds", "Time encodes waited for CPU budget, per lane.", ["lane"])
+
+
+@contextmanager
+def use_lane(lane):
+    """Every encode started inside the block (and in jobs it submits) queues in `lane`."""
+    if lane not in LANES:
+        raise ValueError(f"Unknown lane: {lane}")
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane():
+    return _lane.get()
+
+
+def submit_in_lane(pool, fn, *args):
+    """pool.submit that keeps the caller's lane: pool threads don't inherit context variables."""
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def with_threads(cmd, threads):
+    """An ffmpeg command line with `-threads` added as an option of its (single) output."""
+    return cmd[:-1] + ["-threads", str(threads), cmd[-1]]
+
+
+class FfmpegScheduler:
+    """Hands out encoder threads from a fixed CPU budget, strict priority between lanes and FIFO within one."""
+
+    def __init__(self, budget=FFMPEG_CPU_BUDGET):
+        self.budget = max(1, budget)
+        self._free = self.budget
+        self._cond = threading.Condition()
+        self._waiting = {lane: deque() for lane in LANES}
+        self._running = {lane: 0 for lane in LANES}
+        self._started = {lane: 0 for lane in LANES}
+
+    def _first_in_line(self, lane, ticket):
+        for name in LANES:
+            if self._waiting[name]:
+                return name == lane and self._waiting[name][0] is ticket
+        return False
+
+    @contextmanager
+    def slot(self, want=None, lane=None):
+        """Blocks until the encode may start; yields the number of threads it may use."""
+        lane = lane or current_lane()
+        want = max(1, min(want or self.budget, self.budget))
+        ticket = object()
+        queued_at = time.perf_counter()
+        with self._cond:
+            self._waiting[lane].append(ticket)
+            while not (self._free > 0 and self._first_in_line(lane, ticket)):
+                self._cond.wait()
+            self._waiting[lane].popleft()
+            granted = min(want, self._free)
+            self._free -= granted
+            self._running[lane] += 1
+            self._started[lane] += 1
+            # Whatever is left may fit the next encode in line
+            self._cond.notify_all()
+        SLOT_WAIT.observe(time.perf_counter() - queued_at, lane=lane)
+        try:
+            yield granted
+        finally:
+            with self._cond:
+                self._free += granted
+                self._running[lane] -= 1
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "budget": self.budget,
+                "threads_in_use": self.budget - self._free,
+                "lanes": {
+                    lane: {"waiting": len(self._waiting[lane]), "running": self._running[lane], "started": self._started[lane]}
+                    for lane in LANES
+                },
+            }
+
+
+SCHEDULER = FfmpegScheduler()
+
+
+def cpu_slot(want=None, lane=None):
+    """A slot from the process-wide scheduler: `with cpu_slot(4) as threads: ...`."""
+    return SCHEDULER.slot(want, lane)
+
+
+def _usage():
+    stats = SCHEDULER.stats()
+    return {(lane, state): counts[state] for lane, counts in stats["lanes"].items() for state in ("waiting", "running")}
+
+
+ENCODES = CallbackGauge("ffmpeg_encodes", "Scheduled ffmpeg encodes waiting for or holding CPU budget.", _usage, ["lane", "state"])
+THREADS_IN_USE = CallbackGauge("ffmpeg_threads_in_use", "Encoder threads granted out of the CPU budget.", lambda: SCHEDULER.stats()["threads_in_use"])
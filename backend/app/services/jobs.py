@@ -0,0 +1,213 @@
+import os
+import time
+import uuid
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.metrics import JOB_SECONDS, CallbackGauge
+from app.services.model_pool import DEFAULT_POOL_SIZE
+
+
+# Whisper is CPU-heavy and ffmpeg encodes are too, so each kind gets its own bounded pool
+JOB_LIMITS = {
+    # One per pooled Whisper instance; more would only hold a worker while waiting for a model
+    "transcribe": int(os.getenv("JOBS_TRANSCRIBE_WORKERS", "0")) or DEFAULT_POOL_SIZE,
+    "render": int(os.getenv("JOBS_RENDER_WORKERS", "2")),
+    "proxy": int(os.getenv("JOBS_PROXY_WORKERS", "1")),
+    # Bulk exports; their encodes queue behind interactive ones in the ffmpeg scheduler anyway
+    "batch": int(os.getenv("JOBS_BATCH_WORKERS", "2")),
+}
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+# Weight of the latest run in the per-kind average used for ETAs
+ETA_SMOOTHING = 0.3
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.status = "queued"
+        self.progress = 0.0
+        self.stage = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.dedup_key = None
+        self._cancel_event = threading.Event()
+        self._future = None
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def update(self, progress=None, stage=None):
+        """Reports progress (0..1) and/or the stage; also where a cancel request lands."""
+        if self.cancelled:
+            raise JobCancelled()
+        if progress is not None:
+            self.progress = max(self.progress, min(1.0, float(progress)))
+        if stage is not None:
+            self.stage = stage
+
+    def eta(self):
+        """Seconds until the job should be done, from its progress or its kind's average run time."""
+        if self.status not in ("queued", "running"):
+            return None
+        average = _AVERAGE_RUN.get(self.kind) or _projected_run(self.kind)
+        if self.status == "running":
+            elapsed = time.time() - self.started_at
+            if self.progress >= 0.05:
+                return round(elapsed * (1 - self.progress) / self.progress, 1)
+            return round(max(0.0, average - elapsed), 1) if average is not None else None
+        if average is None:
+            return None
+        ahead = queue_position(self)
+        # Everything ahead drains through the kind's workers before this job even starts
+        return round(average * (ahead // max(1, JOB_LIMITS[self.kind]) + 1), 1)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress * 100, 1),
+            "eta_seconds": self.eta(),
+            "error": self.error,
+            "result": self.result if self.status == "done" else None,
+        }
+
+
+JOBS = {}
+_JOBS_LOCK = threading.Lock()
+# dedup key -> job still queued or running under it
+_IN_FLIGHT = {}
+# kind -> smoothed run time of finished jobs, seconds
+_AVERAGE_RUN = {}
+_EXECUTORS = {
+    kind: ThreadPoolExecutor(max_workers=max(1, limit), thread_name_prefix=f"job-{kind}")
+    for kind, limit in JOB_LIMITS.items()
+}
+
+
+def _run(job, fn, args, kwargs):
+    if job.cancelled:
+        job.status = "cancelled"
+        job.finished_at = time.time()
+        _release(job)
+        return
+
+    job.status = "running"
+    job.stage = "running"
+    job.started_at = started = time.time()
+    JOB_SECONDS.observe(started - job.created_at, kind=job.kind, phase="wait")
+    try:
+        job.result = fn(job, *args, **kwargs)
+        job.progress = 1.0
+        job.stage = "done"
+        job.status = "done"
+        duration = time.time() - started
+        previous = _AVERAGE_RUN.get(job.kind)
+        _AVERAGE_RUN[job.kind] = duration if previous is None else previous + ETA_SMOOTHING * (duration - previous)
+    except JobCancelled:
+        print(f"🛑 Job {job.id} ({job.kind}) cancelled.")
+        job.status = "cancelled"
+    except Exception as e:
+        print(f"❌ Job {job.id} ({job.kind}) failed: {e}")
+        job.error = str(e)
+        job.status = "failed"
+    finally:
+        job.finished_at = time.time()
+        JOB_SECONDS.observe(job.finished_at - started, kind=job.kind, phase="run")
+        _release(job)
+
+
+def _prune_finished():
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    with _JOBS_LOCK:
+        for job_id in [j.id for j in JOBS.values() if j.finished_at and j.finished_at < cutoff]:
+            del JOBS[job_id]
+
+
+def _release(job):
+    with _JOBS_LOCK:
+        if job.dedup_key is not None and _IN_FLIGHT.get(job.dedup_key) is job:
+            del _IN_FLIGHT[job.dedup_key]
+
+
+def submit_job(kind, fn, *args, dedup_key=None, **kwargs):
+    """Queues fn(job, *args, **kwargs) for `kind`; an equal `dedup_key` still in flight returns that job instead."""
+    if kind not in _EXECUTORS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    _prune_finished()
+    with _JOBS_LOCK:
+        existing = _IN_FLIGHT.get(dedup_key) if dedup_key is not None else None
+        if existing is not None and existing.status in ("queued", "running"):
+            return existing
+        job = Job(kind)
+        job.dedup_key = dedup_key
+        JOBS[job.id] = job
+        if dedup_key is not None:
+            _IN_FLIGHT[dedup_key] = job
+    # The job keeps the submitting request's context, so its spans carry the same session id
+    context = contextvars.copy_context()
+    job._future = _EXECUTORS[kind].submit(context.run, _run, job, fn, args, kwargs)
+    return job
+
+
+def get_job(job_id):
+    with _JOBS_LOCK:
+        return JOBS.get(job_id)
+
+
+def cancel_job(job_id):
+    job = get_job(job_id)
+    if not job:
+        return None
+    job._cancel_event.set()
+    # Still waiting for a worker? Then it never starts.
+    if job._future and job._future.cancel():
+        job.status = "cancelled"
+        job.finished_at = time.time()
+        _release(job)
+    return job
+
+
+def _projected_run(kind):
+    """Until a job of `kind` has finished, the total run time its running jobs are heading for."""
+    with _JOBS_LOCK:
+        running = [j for j in JOBS.values() if j.kind == kind and j.status == "running" and j.progress >= 0.05]
+    if not running:
+        return None
+    now = time.time()
+    return sum((now - j.started_at) / j.progress for j in running) / len(running)
+
+
+def queue_position(job):
+    """How many jobs of the same kind were queued before this one and haven't started yet."""
+    with _JOBS_LOCK:
+        return sum(1 for other in JOBS.values() if other.kind == job.kind and other.status == "queued" and other.created_at < job.created_at)
+
+
+def queue_depths():
+    with _JOBS_LOCK:
+        depths = {kind: {"queued": 0, "running": 0} for kind in JOB_LIMITS}
+        for job in JOBS.values():
+            if job.status in ("queued", "running"):
+                depths[job.kind][job.status] += 1
+        return depths
+
+
+def _depth_samples():
+    return {(kind, status): count for kind, depths in queue_depths().items() for status, count in depths.items()}
+
+
+JOB_QUEUE = CallbackGauge("jobs", "Background jobs waiting for or holding a worker.", _depth_samples, ["kind", "status"])
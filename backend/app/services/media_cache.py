@@ -0,0 +1,132 @@
+import os
+import gzip
+import json
+import time
+import uuid
+import hashlib
+import threading
+from pathlib import Path
+
+from app.services.metrics import count_lookup
+
+
+CHUNK_SIZE = 1024 * 1024
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+def store_upload(fileobj, directory, suffix=""):
+    """Streams an upload to disk under its content hash; returns (path, sha256), reusing a repeat upload."""
+    directory = Path(directory)
+    part_path = directory / f".upload-{uuid.uuid4().hex}.part"
+    digest = hashlib.sha256()
+
+    try:
+        with open(part_path, "wb") as out:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+
+        content_hash = digest.hexdigest()
+        final_path = directory / f"{content_hash}{suffix.lower()}"
+        if final_path.exists():
+            print(f"♻️ Upload already stored as {final_path.name}")
+            part_path.unlink()
+        else:
+            os.replace(part_path, final_path)
+        return final_path, content_hash
+    finally:
+        if part_path.exists():
+            part_path.unlink()
+
+
+class TranscriptCache:
+    """Whisper results keyed by (content hash, model, options), evicted LRU past `max_bytes`."""
+
+    def __init__(self, directory, max_bytes=TRANSCRIPT_CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # key -> (size, last_used); rebuilt from disk so restarts keep the cache
+        self._entries = {}
+        for path in self.directory.glob("*.json.gz"):
+            stat = path.stat()
+            self._entries[path.name[: -len(".json.gz")]] = (stat.st_size, stat.st_mtime)
+
+    @staticmethod
+    def make_key(content_hash, model_name, options=None):
+        options_blob = json.dumps(options or {}, sort_keys=True)
+        return hashlib.sha256(f"{content_hash}:{model_name}:{options_blob}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.directory / f"{key}.json.gz"
+
+    def get(self, content_hash, model_name, options=None):
+        key = self.make_key(content_hash, model_name, options)
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                segments = json.load(f)
+        except (FileNotFoundError, OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+                self._entries.pop(key, None)
+            count_lookup("transcripts", False)
+            return None
+
+        count_lookup("transcripts", True)
+        with self._lock:
+            self.hits += 1
+            size = self._entries.get(key, (path.stat().st_size, 0))[0]
+            self._entries[key] = (size, time.time())
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return segments
+
+    def put(self, content_hash, model_name, options, segments):
+        key = self.make_key(content_hash, model_name, options)
+        path = self._path(key)
+        part_path = path.with_suffix(f".{uuid.uuid4().hex}.part")
+        with gzip.open(part_path, "wt", encoding="utf-8") as f:
+            json.dump(segments, f, separators=(",", ":"))
+        os.replace(part_path, path)
+
+        with self._lock:
+            self._entries[key] = (path.stat().st_size, time.time())
+            self._evict()
+
+    def _evict(self):
+        total = sum(size for size, _ in self._entries.values())
+        if total <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+            del self._entries[key]
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(size for size, _ in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,117 @@
+import os
+import uuid
+import mimetypes
+from email.utils import formatdate
+
+from fastapi.responses import Response, StreamingResponse
+
+
+READ_CHUNK_BYTES = 256 * 1024
+
+
+def make_etag(stat):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """[(start, end)] of a `bytes=` Range header; None to ignore it, [] when nothing is satisfiable."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        first, sep, last = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if not first:
+                # suffix range: the last N bytes
+                length = int(last)
+                if length > 0:
+                    ranges.append((max(0, size - length), size - 1))
+                continue
+            start = int(first)
+            last = int(last) if last else None
+        except ValueError:
+            return None
+        # Malformed (end before start) is ignored; a start past the end is unsatisfiable
+        if last is not None and start > last:
+            return None
+        if start < size:
+            ranges.append((start, size - 1 if last is None else min(last, size - 1)))
+    return ranges
+
+
+def _read_range(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = f.read(min(READ_CHUNK_BYTES, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def _multipart(path, ranges, size, media_type, boundary):
+    for start, end in ranges:
+        yield f"--{boundary}\r\nContent-Type: {media_type}\r\nContent-Range: bytes {start}-{end}/{size}\r\n\r\n".encode()
+        yield from _read_range(path, start, end)
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
+
+
+def serve_media(request, path, media_type=None, filename=None):
+    """FileResponse with byte ranges, ETag / Last-Modified validators, If-None-Match / If-Range and HEAD."""
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = make_etag(stat)
+    media_type = media_type or mimetypes.guess_type(str(path))[0] or "application/octet-stream"
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    ranges = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # A stale If-Range means the client's partial copy is of another version: send it all
+    if range_header and (not if_range or if_range.strip() == etag):
+        ranges = parse_range(range_header, size)
+        if ranges == []:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    head_only = request.method == "HEAD"
+
+    if not ranges:
+        body = None if head_only else _read_range(path, 0, size - 1)
+        return _stream(body, 200, {**headers, "Content-Length": str(size)}, media_type)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        range_headers = {**headers, "Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)}
+        return _stream(None if head_only else _read_range(path, start, end), 206, range_headers, media_type)
+
+    boundary = uuid.uuid4().hex
+    length = sum(
+        len(f"--{boundary}\r\nContent-Type: {media_type}\r\nContent-Range: bytes {s}-{e}/{size}\r\n\r\n") + (e - s + 1) + 2
+        for s, e in ranges
+    ) + len(f"--{boundary}--\r\n")
+    body = None if head_only else _multipart(path, ranges, size, media_type, boundary)
+    return _stream(body, 206, {**headers, "Content-Length": str(length)}, f"multipart/byteranges; boundary={boundary}")
+
+
+def _stream(body, status_code, headers, media_type):
+    if body is None:
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return StreamingResponse(body, status_code=status_code, headers=headers, media_type=media_type)
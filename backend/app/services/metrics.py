@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+
+# "text": one key=value line per span, "json": one JSON object per line, "off": metrics only
+SPAN_LOG = os.getenv("SPAN_LOG", "text").lower()
+# Spans faster than this aren't logged (they're still counted in the histograms)
+SPAN_LOG_MIN_MS = float(os.getenv("SPAN_LOG_MIN_MS", "0"))
+METRIC_PREFIX = "videoeditor_"
+# Seconds; covers everything from a cached session read to a long export
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_session_id = contextvars.ContextVar("session_id", default=None)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key)) + list(extra or [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = METRIC_PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self.labelnames, key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def by_labels(self):
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(self.labelnames, labels)] = value
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram in the Prometheus sense, one series per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                running = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    running += count
+                    out.append((self.name + "_bucket", self.labelnames, key, [("le", _format_value(float(bound)))], running))
+                out.append((self.name + "_bucket", self.labelnames, key, [("le", "+Inf")], series["count"]))
+                out.append((self.name + "_sum", self.labelnames, key, (), series["sum"]))
+                out.append((self.name + "_count", self.labelnames, key, (), series["count"]))
+        return out
+
+    def summary(self):
+        """Count, total and mean seconds per label set, for the JSON stats endpoints."""
+        with self._lock:
+            return {
+                ",".join(key): {"count": s["count"], "total": round(s["sum"], 3), "mean": round(s["sum"] / s["count"], 4)}
+                for key, s in sorted(self._values.items()) if s["count"]
+            }
+
+
+class CallbackGauge(Metric):
+    """A gauge read at scrape time from `fn`, which returns a number or {label values tuple: number}."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, fn, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception as e:
+            print(f"⚠️ Metric {self.name} failed: {e}")
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [(self.name, self.labelnames, tuple(map(str, key)), (), value) for key, value in sorted(values.items())]
+
+
+_REGISTRY = []
+
+STAGE_SECONDS = Histogram("stage_seconds", "Time spent per pipeline stage.", ["stage", "status"])
+HTTP_SECONDS = Histogram("http_request_seconds", "HTTP request latency by route.", ["method", "route", "status"])
+JOB_SECONDS = Histogram("job_seconds", "Background job time waiting for a worker and running.", ["kind", "phase"])
+PROCESSES_IN_FLIGHT = Gauge("processes_in_flight", "ffmpeg/ffprobe processes currently running.", ["tool"])
+PROCESSES = Counter("processes_total", "ffmpeg/ffprobe processes started.", ["tool"])
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Cache lookups by cache and result (hit/miss).", ["cache", "result"])
+
+
+def _hit_ratios():
+    totals = {}
+    for (cache, result), count in CACHE_LOOKUPS.by_labels().items():
+        hits, lookups = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (count if result == "hit" else 0), lookups + count)
+    return {(cache,): round(hits / lookups, 4) for cache, (hits, lookups) in totals.items() if lookups}
+
+
+CACHE_HIT_RATIO = CallbackGauge("cache_hit_ratio", "Hits over lookups since start, per cache.", _hit_ratios, ["cache"])
+
+
+def count_lookup(cache, hit):
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def set_session(session_id):
+    """Tags everything logged from this request (and the jobs it starts) with the session."""
+    _session_id.set(session_id)
+
+
+def current_session():
+    return _session_id.get()
+
+
+@contextmanager
+def bind_session(session_id):
+    token = _session_id.set(session_id)
+    try:
+        yield
+    finally:
+        _session_id.reset(token)
+
+
+def log_event(event, **fields):
+    """One structured log line; the current session id is added when there is one."""
+    if SPAN_LOG == "off":
+        return
+    session_id = _session_id.get()
+    if session_id and "session" not in fields:
+        fields["session"] = session_id
+    if SPAN_LOG == "json":
+        print(json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, default=str), flush=True)
+    else:
+        print(f"⏱️ {event} " + " ".join(f"{key}={value}" for key, value in fields.items()), flush=True)
+
+
+@contextmanager
+def span(stage, **fields):
+    """Times one stage into STAGE_SECONDS and logs it with the details put in the yielded dict; also a decorator."""
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield fields
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        STAGE_SECONDS.observe(duration, stage=stage, status=status)
+        if duration * 1000 >= SPAN_LOG_MIN_MS:
+            log_event("span", stage=stage, status=status, ms=round(duration * 1000, 1), **fields)
+
+
+@contextmanager
+def track_process(cmd):
+    """Counts an external process (ffmpeg, ffprobe) as in flight while the block runs."""
+    tool = os.path.basename(cmd[0]) if isinstance(cmd, (list, tuple)) else str(cmd)
+    PROCESSES.inc(tool=tool)
+    PROCESSES_IN_FLIGHT.inc(tool=tool)
+    try:
+        yield
+    finally:
+        PROCESSES_IN_FLIGHT.dec(tool=tool)
+
+
+class RequestMetrics:
+    """ASGI middleware timing requests by method, route and status, until the last body chunk."""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = {}
+
+    def _route(self, scope):
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if endpoint not in self._routes:
+            routes = scope["app"].router.routes if "app" in scope else []
+            self._routes[endpoint] = next((r.path for r in routes if getattr(r, "endpoint", None) is endpoint), endpoint.__name__)
+        return self._routes[endpoint]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        token = _session_id.set(None)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _session_id.reset(token)
+            HTTP_SECONDS.observe(time.perf_counter() - started, method=scope["method"], route=self._route(scope), status=status["code"])
+
+
+def render_metrics():
+    """Every registered metric in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for metric in _REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labelnames, key, extra, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labelnames, key, extra)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
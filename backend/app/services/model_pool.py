@@ -0,0 +1,136 @@
+import os
+import copy
+import queue
+import threading
+from contextlib import contextmanager
+
+from app.services.metrics import span, CallbackGauge
+
+
+DEFAULT_MODEL = os.getenv("WHISPER_MODEL", "base")
+DEFAULT_DEVICE = os.getenv("WHISPER_DEVICE", "cpu")
+DEFAULT_POOL_SIZE = int(os.getenv("WHISPER_POOL_SIZE", "2"))
+# 0 means "split the cores evenly between the instances of a pool"
+DEFAULT_THREADS = int(os.getenv("WHISPER_THREADS", "0"))
+
+
+class ModelPool:
+    """Warm Whisper instances for one (model, device); each serves one caller at a time."""
+
+    def __init__(self, model_name, device, size, threads):
+        self.model_name = model_name
+        self.device = device
+        self.size = max(1, size)
+        self.threads = threads or max(1, (os.cpu_count() or 1) // self.size)
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._template = None
+        self._created = 0
+
+    def _create_instance(self):
+        with self._lock:
+            if self._template is None:
+                print(f"📦 Loading Whisper '{self.model_name}' on {self.device}...")
+                # Imported here: whisper and torch take seconds to import and most requests never need them
+                import whisper
+                with span("model_load", model=self.model_name):
+                    self._template = whisper.load_model(self.model_name, device=self.device)
+                return self._template
+        with span("model_copy", model=self.model_name):
+            return copy.deepcopy(self._template)
+
+    def acquire(self, timeout=None):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_grow = self._created < self.size
+            if can_grow:
+                self._created += 1
+
+        if can_grow:
+            try:
+                return self._create_instance()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        return self._idle.get(timeout=timeout)
+
+    def release(self, model):
+        self._idle.put(model)
+
+    def stats(self):
+        return {
+            "model": self.model_name,
+            "device": self.device,
+            "size": self.size,
+            "threads": self.threads,
+            "loaded": self._created,
+            "idle": self._idle.qsize(),
+        }
+
+
+_POOLS = {}
+_POOL_CONFIG = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def configure_pool(model_name, size=None, threads=None):
+    """Overrides pool size / per-instance CPU threads for one model. Call before first use."""
+    _POOL_CONFIG[model_name] = {"size": size, "threads": threads}
+
+
+def get_pool(model_name=None, device=None):
+    model_name = model_name or DEFAULT_MODEL
+    device = device or DEFAULT_DEVICE
+    key = (model_name, device)
+
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            config = _POOL_CONFIG.get(model_name, {})
+            pool = ModelPool(
+                model_name,
+                device,
+                size=config.get("size") or DEFAULT_POOL_SIZE,
+                threads=config.get("threads") or DEFAULT_THREADS,
+            )
+            _POOLS[key] = pool
+        return pool
+
+
+@contextmanager
+def borrow_model(model_name=None, device=None, timeout=None):
+    """Lends a warm Whisper instance, blocking while all of them are busy."""
+    pool = get_pool(model_name, device)
+    model = pool.acquire(timeout=timeout)
+    try:
+        import torch
+        # torch applies the intra-op thread count to the calling thread
+        torch.set_num_threads(pool.threads)
+        yield model
+    finally:
+        pool.release(model)
+
+
+def warm_up(model_name=None, device=None):
+    """Loads the first instance of a pool so the first upload doesn't pay for it."""
+    with borrow_model(model_name, device):
+        pass
+
+
+def pool_stats():
+    with _POOLS_LOCK:
+        return [pool.stats() for pool in _POOLS.values()]
+
+
+def _pool_samples():
+    return {(s["model"], state): s[state] for s in pool_stats() for state in ("loaded", "idle")}
+
+
+MODEL_INSTANCES = CallbackGauge("whisper_instances", "Whisper instances per pool, loaded and idle.", _pool_samples, ["model", "state"])
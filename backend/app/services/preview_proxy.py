@@ -0,0 +1,60 @@
+import os
+import threading
+import subprocess
+from pathlib import Path
+
+from app.services.metrics import span, track_process
+from app.services.ffmpeg_scheduler import cpu_slot, with_threads
+
+
+PROXY_HEIGHT = int(os.getenv("PROXY_HEIGHT", "540"))
+PROXY_MAXRATE = os.getenv("PROXY_MAXRATE", "1200k")
+# Seconds between forced keyframes: scrubbing lands on a decodable frame almost immediately
+PROXY_KEYFRAME_SECONDS = float(os.getenv("PROXY_KEYFRAME_SECONDS", "1"))
+
+_proxy_locks = {}
+_proxy_locks_guard = threading.Lock()
+
+
+def proxy_path_for(media_path):
+    media_path = Path(media_path)
+    return media_path.with_name(f"{media_path.stem}.proxy.mp4")
+
+
+def build_proxy(media_path, progress_callback=None):
+    """Encodes the low-bitrate, seek-friendly preview copy of an upload once; returns its path."""
+    proxy_path = proxy_path_for(media_path)
+    if proxy_path.exists():
+        return proxy_path
+
+    with _proxy_locks_guard:
+        lock = _proxy_locks.setdefault(str(proxy_path), threading.Lock())
+
+    with lock:
+        if proxy_path.exists():
+            return proxy_path
+
+        part_path = proxy_path.with_suffix(".part.mp4")
+        print(f"🪶 Building preview proxy for {Path(media_path).name}...")
+        cmd = [
+            "ffmpeg", "-nostdin", "-y", "-v", "error", "-i", str(media_path),
+            "-vf", f"scale=-2:min({PROXY_HEIGHT}\\,ih)",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "28",
+            "-maxrate", PROXY_MAXRATE, "-bufsize", "2M", "-pix_fmt", "yuv420p",
+            "-force_key_frames", f"expr:gte(t,n_forced*{PROXY_KEYFRAME_SECONDS})", "-sc_threshold", "0",
+            "-c:a", "aac", "-b:a", "96k", "-ac", "2",
+            "-movflags", "+faststart", str(part_path)
+        ]
+        with span("proxy_build"), cpu_slot() as threads, track_process(cmd):
+            result = subprocess.run(with_threads(cmd, threads), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            if part_path.exists():
+                part_path.unlink()
+            raise RuntimeError(f"Failed to build preview proxy: {result.stderr[-500:]}")
+        os.replace(part_path, proxy_path)
+
+    with _proxy_locks_guard:
+        _proxy_locks.pop(str(proxy_path), None)
+    if progress_callback:
+        progress_callback(1.0)
+    return proxy_path
@@ -0,0 +1,110 @@
+import os
+import re
+import time
+from collections import defaultdict
+
+import ffmpeg
+
+from app.services.segment_cutter import probe_streams
+from app.services.timeline_remap import remap_subtitles
+from app.services.video_utils import generate_srt, build_style_string, concat_segments, run_ffmpeg
+from app.services.ffmpeg_scheduler import cpu_slot
+
+
+# Used when an export request doesn't list its own renditions
+DEFAULT_RENDITIONS = [
+    {"name": "1080p", "height": 1080},
+    {"name": "720p", "height": 720},
+    {"name": "vertical", "height": 1920, "aspect": "9:16"},
+    {"name": "audio", "audio_only": True},
+]
+
+# -benchmark_all: "bench: <user> user <sys> sys <real> real encode_video 1.0" (microseconds, file.stream)
+BENCH_PATTERN = re.compile(r"bench:\s+\d+ user\s+\d+ sys\s+(\d+) real (?:encode|flush)_(?:video|audio) (\d+)\.\d+")
+# Threaded ffmpeg (6.1+) shares one bench clock between encoder threads, so some deltas
+# come out negative and print as wrapped unsigned 64-bit values
+UINT64 = 1 << 64
+
+
+def rendition_filename(basename, spec):
+    safe_name = re.sub(r"[^A-Za-z0-9_-]", "_", spec["name"])
+    return f"{basename}_{safe_name}" + (".m4a" if spec.get("audio_only") else ".mp4")
+
+
+def _scale_video(video, spec):
+    """Resizes one branch of the split: plain height, or scale-to-cover and crop for an aspect."""
+    height = spec.get("height")
+    if spec.get("aspect"):
+        num, den = (int(x) for x in spec["aspect"].split(":"))
+        height = height or 1920
+        width = int(height * num / den) // 2 * 2
+        video = video.filter("scale", width, height, force_original_aspect_ratio="increase")
+        return video.filter("crop", width, height).filter("setsar", 1)
+    if height:
+        return video.filter("scale", -2, height)
+    return video
+
+
+def encode_times(stderr_log, count):
+    """Per-output encoder seconds from the -benchmark_all lines (approximate on threaded ffmpeg)."""
+    totals = defaultdict(int)
+    for match in BENCH_PATTERN.finditer(stderr_log):
+        real = int(match.group(1))
+        if real < UINT64 // 2:
+            totals[int(match.group(2))] += real
+    return [round(totals[i] / 1_000_000, 3) if i in totals else None for i in range(count)]
+
+
+def render_renditions(video_path, subtitles, style, output_dir, basename, renditions, progress_callback=None, keep_segments=None):
+    """Renders every rendition from one decode in one ffmpeg process; returns ([{name, path, encode_seconds}], wall)."""
+    _, has_audio, _ = probe_streams(video_path)
+    if not has_audio and any(spec.get("audio_only") for spec in renditions):
+        raise ValueError("Source has no audio track for an audio-only rendition")
+
+    if keep_segments:
+        subtitles = remap_subtitles(subtitles, keep_segments)
+    srt_path = os.path.join(output_dir, f"{basename}.srt")
+    generate_srt(subtitles, srt_path)
+
+    source = ffmpeg.input(video_path)
+    if keep_segments:
+        video, audio = concat_segments(source, keep_segments, audio=bool(has_audio))
+        duration = sum(end - start for start, end in keep_segments)
+    else:
+        video, audio = source.video, source.audio if has_audio else None
+        duration = None
+    video = video.filter("subtitles", srt_path, force_style=build_style_string(style))
+
+    video_specs = [spec for spec in renditions if not spec.get("audio_only")]
+    video_split = video.filter_multi_output("split", len(video_specs)) if video_specs else None
+    video_branches = iter(video_split[i] for i in range(len(video_specs)))
+    audio_split = audio.filter_multi_output("asplit", len(renditions)) if audio is not None else None
+
+    outputs, results = [], []
+    # One process for every output, so its slot's threads are split between the encoders
+    with cpu_slot() as threads:
+        per_output = max(1, threads // len(renditions))
+        for spec in renditions:
+            path = os.path.join(output_dir, rendition_filename(basename, spec))
+            streams, options = [], {"threads": per_output}
+            if not spec.get("audio_only"):
+                streams.append(_scale_video(next(video_branches), spec))
+                options.update(vcodec="libx264", preset="veryfast", crf=spec.get("crf", 20), pix_fmt="yuv420p", movflags="+faststart")
+            if audio_split is not None:
+                streams.append(audio_split[len(results)])
+                options.update(acodec="aac", audio_bitrate=spec.get("audio_bitrate", "160k"))
+            outputs.append(ffmpeg.output(*streams, path, **options))
+            results.append({"name": spec["name"], "path": path})
+
+        stream = ffmpeg.merge_outputs(*outputs).global_args("-benchmark_all")
+        started = time.perf_counter()
+        try:
+            stderr_log = run_ffmpeg(stream, progress_callback, duration=duration)
+        finally:
+            os.remove(srt_path)
+        wall = round(time.perf_counter() - started, 3)
+
+    for result, seconds in zip(results, encode_times(stderr_log, len(results))):
+        result["encode_seconds"] = seconds
+    print(f"🎞️ Rendered {len(results)} renditions in {wall}s")
+    return results, wall
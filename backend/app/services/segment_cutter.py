@@ -0,0 +1,161 @@
+import os
+import json
+import shutil
+import tempfile
+import subprocess
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app.services.metrics import track_process
+from app.services.ffmpeg_scheduler import cpu_slot, with_threads, submit_in_lane, FFMPEG_CPU_BUDGET
+
+
+CUT_WORKERS = int(os.getenv("CUT_WORKERS", "0")) or max(1, (os.cpu_count() or 1) // 2)
+# Only codecs we can re-encode boundary pieces into and still stream-copy the rest
+ENCODERS = {"h264": "libx264", "hevc": "libx265"}
+# Boundary pieces shorter than this are dropped instead of encoded (about one frame)
+MIN_PIECE_SECONDS = 0.04
+
+
+def probe_streams(input_path):
+    """First video and audio stream descriptions, plus the container start time."""
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-show_entries", "stream=codec_type,codec_name,pix_fmt,sample_rate,channels,r_frame_rate,avg_frame_rate:format=start_time",
+        "-of", "json", input_path
+    ]
+    with track_process(cmd):
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    info = json.loads(result.stdout)
+    streams = info.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    start_time = float(info.get("format", {}).get("start_time") or 0.0)
+    return video, audio, start_time
+
+
+def probe_keyframes(input_path, start_time=0.0):
+    """Keyframe times of the first video stream from packet flags, shifted by the container start time."""
+    cmd = [
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", input_path
+    ]
+    with track_process(cmd):
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            keyframes.append(float(pts_time) - start_time)
+    return sorted(keyframes)
+
+
+def plan_pieces(keep_segments, keyframes):
+    """(start, end, mode) pieces: keyframe-aligned interiors are copied, only the edges encoded."""
+    pieces = []
+    for start, end in keep_segments:
+        first = bisect_left(keyframes, start)
+        last = bisect_right(keyframes, end) - 1
+        if first >= len(keyframes) or last < 0 or keyframes[first] >= keyframes[last]:
+            pieces.append((start, end, "encode"))
+            continue
+
+        k_in, k_out = keyframes[first], keyframes[last]
+        if k_in - start >= MIN_PIECE_SECONDS:
+            pieces.append((start, k_in, "encode"))
+        pieces.append((k_in, k_out, "copy"))
+        if end - k_out >= MIN_PIECE_SECONDS:
+            pieces.append((k_out, end, "encode"))
+    return pieces
+
+
+def _encode_command(input_path, piece_path, start, end, video, audio):
+    cmd = ["ffmpeg", "-nostdin", "-y", "-v", "error", "-ss", f"{start:.6f}", "-i", input_path, "-t", f"{end - start:.6f}"]
+    cmd += ["-map", "0:v:0"] + (["-map", "0:a:0"] if audio else [])
+    cmd += ["-c:v", ENCODERS[video["codec_name"]], "-preset", "veryfast", "-crf", "18"]
+    if video.get("pix_fmt"):
+        cmd += ["-pix_fmt", video["pix_fmt"]]
+    if audio:
+        cmd += ["-c:a", "aac", "-ar", str(audio.get("sample_rate", 48000)), "-ac", str(audio.get("channels", 2))]
+    # MPEG-TS keeps SPS/PPS in-band, so copied and re-encoded pieces concat cleanly
+    return cmd + ["-f", "mpegts", piece_path]
+
+
+def _split_command(input_path, work_dir, split_times, audio):
+    """One stream-copy pass splitting the source exactly on the given keyframes."""
+    cmd = ["ffmpeg", "-nostdin", "-y", "-v", "error", "-i", input_path]
+    cmd += ["-map", "0:v:0"] + (["-map", "0:a:0"] if audio else [])
+    # Nudge split times below the keyframe so float formatting can't push them past it
+    times = ",".join(f"{max(0.0, t - 0.0005):.6f}" for t in split_times)
+    cmd += ["-c", "copy", "-f", "segment", "-segment_times", times, "-segment_format", "mpegts", "-reset_timestamps", "1"]
+    return cmd + [os.path.join(work_dir, "gop_%05d.ts")]
+
+
+def _run(cmd):
+    with track_process(cmd):
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-500:] or f"ffmpeg exited with {result.returncode}")
+
+
+def _run_encode(cmd, want):
+    with cpu_slot(want) as threads:
+        _run(with_threads(cmd, threads))
+
+
+def cut_segments(input_path, output_path, keep_segments, progress_callback=None, workers=None):
+    """Cuts `keep_segments` by copying whole GOPs and encoding the edges; False when the source isn't suitable."""
+    try:
+        video, audio, start_time = probe_streams(input_path)
+        if not video or video.get("codec_name") not in ENCODERS or (audio and audio.get("codec_name") != "aac"):
+            print("⚠️ Segment cutter: unsupported codecs, falling back to filter graph.")
+            return False
+        keyframes = probe_keyframes(input_path, start_time)
+    except (subprocess.CalledProcessError, FileNotFoundError, ValueError) as e:
+        print(f"⚠️ Segment cutter: probe failed ({e}), falling back to filter graph.")
+        return False
+
+    pieces = plan_pieces(keep_segments, keyframes)
+    encoded = sum(1 for p in pieces if p[2] == "encode")
+    print(f"✂️ Cutting {len(pieces)} pieces ({encoded} re-encoded, {len(pieces) - encoded} copied)...")
+
+    # Copied piece (k_in, k_out) is the split segment that starts at k_in
+    split_times = sorted({t for start, end, mode in pieces if mode == "copy" for t in (start, end)})
+    split_index = {t: i + 1 for i, t in enumerate(split_times)}
+
+    work_dir = tempfile.mkdtemp(prefix="cut_", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        piece_paths = []
+        copies, encodes = [], []
+        if split_times:
+            copies.append(_split_command(input_path, work_dir, split_times, audio))
+        for i, (start, end, mode) in enumerate(pieces):
+            if mode == "copy":
+                piece_paths.append(os.path.join(work_dir, f"gop_{split_index[start]:05d}.ts"))
+            else:
+                piece_paths.append(os.path.join(work_dir, f"piece_{i:05d}.ts"))
+                encodes.append(_encode_command(input_path, piece_paths[-1], start, end, video, audio))
+
+        workers = workers or CUT_WORKERS
+        want = max(1, FFMPEG_CPU_BUDGET // workers)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [submit_in_lane(pool, _run, cmd) for cmd in copies]
+            futures += [submit_in_lane(pool, _run_encode, cmd, want) for cmd in encodes]
+            for done, future in enumerate(as_completed(futures), start=1):
+                future.result()
+                if progress_callback:
+                    progress_callback(0.9 * done / len(futures))
+
+        list_path = os.path.join(work_dir, "pieces.txt")
+        with open(list_path, "w") as f:
+            f.writelines(f"file '{path}'\n" for path in piece_paths)
+
+        cmd = ["ffmpeg", "-nostdin", "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy"]
+        if audio:
+            cmd += ["-bsf:a", "aac_adtstoasc"]
+        _run(cmd + ["-movflags", "+faststart", output_path])
+        if progress_callback:
+            progress_callback(1.0)
+        return True
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
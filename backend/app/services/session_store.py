@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from app.services.metrics import count_lookup
+
+
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "128"))
+
+
+def _round(value, digits):
+    return round(value, digits) if isinstance(value, float) else value
+
+
+def pack_words(words):
+    """Stores a word list column-wise, with the floats trimmed to what the editor uses."""
+    if not words:
+        return []
+    keys = list(words[0].keys())
+    if any(list(w.keys()) != keys for w in words):
+        return words
+    digits = {"start": 3, "end": 3, "probability": 3}
+    return {"keys": keys, "rows": [[_round(w[k], digits.get(k, 6)) for k in keys] for w in words]}
+
+
+def unpack_words(packed):
+    if isinstance(packed, dict):
+        return [dict(zip(packed["keys"], row)) for row in packed["rows"]]
+    return packed
+
+
+def encode_state(state):
+    compact = dict(state)
+    compact["subtitles"] = [
+        {**sub, "start": _round(sub["start"], 3), "end": _round(sub["end"], 3), "words": pack_words(sub.get("words", []))}
+        for sub in state.get("subtitles", [])
+    ]
+    return zlib.compress(json.dumps(compact, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_state(blob):
+    state = json.loads(zlib.decompress(blob).decode("utf-8"))
+    state["subtitles"] = [
+        {**sub, "words": unpack_words(sub.get("words", []))}
+        for sub in state.get("subtitles", [])
+    ]
+    return state
+
+
+class SessionStore:
+    """One SQLite row per session behind a bounded LRU; mapping-style access loads sessions lazily."""
+
+    def __init__(self, db_path, cache_size=SESSION_CACHE_SIZE, legacy_json=None):
+        self.db_path = str(db_path)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+        if legacy_json:
+            self._import_legacy_json(legacy_json)
+
+    def _import_legacy_json(self, path):
+        """One-off migration from the old whole-file sessions.json."""
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r") as f:
+                sessions = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Failed to import legacy sessions: {e}")
+            return
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for session_id, state in sessions.items():
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO sessions (id, data, updated_at) VALUES (?, ?, ?)",
+                    (session_id, encode_state(state), time.time()),
+                )
+            self._conn.execute("COMMIT")
+        os.replace(path, f"{path}.migrated")
+        print(f"📂 Imported {len(sessions)} sessions from {os.path.basename(path)}.")
+
+    def _remember(self, session_id, state):
+        self._cache[session_id] = state
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get(self, session_id, default=None):
+        with self._lock:
+            state = self._cache.get(session_id)
+            count_lookup("sessions", state is not None)
+            if state is not None:
+                self._cache.move_to_end(session_id)
+                return state
+
+            row = self._conn.execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return default
+            state = decode_state(row[0])
+            self._remember(session_id, state)
+            return state
+
+    def put(self, session_id, state):
+        """Caches the state and writes its row atomically."""
+        blob = encode_state(state)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, updated_at) VALUES (?, ?, ?)",
+                (session_id, blob, time.time()),
+            )
+            self._remember(session_id, state)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._cache.pop(session_id, None)
+
+    def ids(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT id FROM sessions")]
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+    def __getitem__(self, session_id):
+        state = self.get(session_id)
+        if state is None:
+            raise KeyError(session_id)
+        return state
+
+    def __setitem__(self, session_id, state):
+        self.put(session_id, state)
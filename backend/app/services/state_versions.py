@@ -0,0 +1,161 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+# The editable part of a session, i.e. what the client mirrors and what undo restores
+TRACKED_KEYS = ["style", "subtitles", "visuals", "text_layers", "bg_layers", "camera_moves", "hud_items", "keep_segments"]
+# Restored by undo/redo as well, but never sent to the client
+SERVER_KEYS = ["video_path", "duration"]
+UNDO_DEPTH = int(os.getenv("UNDO_DEPTH", "50"))
+# Versions a client can still get a delta against; older clients get a full snapshot
+DELTA_VERSIONS = int(os.getenv("DELTA_VERSIONS", "64"))
+
+
+class VersionConflict(Exception):
+    """An edit was based on a version that is no longer the session's latest."""
+
+
+def snapshot(state):
+    """Shallow snapshot of the tracked keys; edits build new lists, so unchanged ones are shared."""
+    return {key: state.get(key) for key in TRACKED_KEYS + SERVER_KEYS}
+
+
+def _list_ops(key, old, new):
+    """JSON-patch ops turning list `old` into `new`, touching only the changed middle."""
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and (old[prefix] is new[prefix] or old[prefix] == new[prefix]):
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and (old[-1 - suffix] is new[-1 - suffix] or old[-1 - suffix] == new[-1 - suffix]):
+        suffix += 1
+
+    old_mid = old[prefix:len(old) - suffix]
+    new_mid = new[prefix:len(new) - suffix]
+    ops = [{"op": "replace", "path": f"/{key}/{prefix + i}", "value": v} for i, v in enumerate(new_mid[:len(old_mid)])]
+    if len(new_mid) > len(old_mid):
+        for i, value in enumerate(new_mid[len(old_mid):], start=prefix + len(old_mid)):
+            path = f"/{key}/-" if suffix == 0 else f"/{key}/{i}"
+            ops.append({"op": "add", "path": path, "value": value})
+    else:
+        # Remove from the back so earlier indices stay valid
+        for i in reversed(range(prefix + len(new_mid), prefix + len(old_mid))):
+            ops.append({"op": "remove", "path": f"/{key}/{i}"})
+    return ops
+
+
+def diff_snapshots(old, new):
+    """JSON-patch (RFC 6902 subset: add/remove/replace) from one snapshot to another."""
+    ops = []
+    for key in TRACKED_KEYS:
+        before, after = old.get(key), new.get(key)
+        if before is after or before == after:
+            continue
+        if isinstance(before, list) and isinstance(after, list):
+            ops.extend(_list_ops(key, before, after))
+        else:
+            ops.append({"op": "replace", "path": f"/{key}", "value": after})
+    return ops
+
+
+class _SessionVersions:
+    def __init__(self, version, snap):
+        self.by_version = OrderedDict([(version, snap)])
+        self.latest = version
+        self.undo = []
+        self.redo = []
+
+
+class StateHistory:
+    """Per-session versions and undo/redo stacks, kept in memory."""
+
+    def __init__(self):
+        self._sessions = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _register(self, entry, version, snap):
+        entry.by_version[version] = snap
+        entry.latest = version
+        while len(entry.by_version) > DELTA_VERSIONS:
+            entry.by_version.popitem(last=False)
+
+    def lock(self, session_id):
+        """Per-session lock, so reading the latest state, committing and saving it happen as one step."""
+        with self._lock:
+            return self._locks.setdefault(session_id, threading.RLock())
+
+    def _entry(self, session_id, state):
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            entry = _SessionVersions(state.get("version", 0), snapshot(state))
+            self._sessions[session_id] = entry
+        return entry
+
+    def _check_latest(self, session_id, entry, state):
+        if state.get("version", 0) != entry.latest:
+            raise VersionConflict(f"Session {session_id} is at version {entry.latest}, not {state.get('version', 0)}")
+
+    def commit(self, session_id, previous, state):
+        """Stamps `state` with the next version and makes `previous` undoable; raises VersionConflict when it is stale."""
+        with self._lock:
+            entry = self._entry(session_id, previous)
+            self._check_latest(session_id, entry, previous)
+            state["version"] = previous.get("version", 0) + 1
+            before, snap = snapshot(previous), snapshot(state)
+            if before != snap:
+                entry.undo.append(before)
+                del entry.undo[:-UNDO_DEPTH]
+                entry.redo.clear()
+            self._register(entry, state["version"], snap)
+        return state
+
+    def _step(self, session_id, state, backwards):
+        with self._lock:
+            entry = self._entry(session_id, state)
+            self._check_latest(session_id, entry, state)
+            stack, other = (entry.undo, entry.redo) if backwards else (entry.redo, entry.undo)
+            if not stack:
+                return None
+            other.append(snapshot(state))
+            restored = {**state, **stack.pop(), "version": state.get("version", 0) + 1}
+            self._register(entry, restored["version"], snapshot(restored))
+            return restored
+
+    def undo(self, session_id, state):
+        """The state one edit back as a new version, or None when there is nothing to undo."""
+        return self._step(session_id, state, True)
+
+    def redo(self, session_id, state):
+        return self._step(session_id, state, False)
+
+    def can_undo(self, session_id):
+        entry = self._sessions.get(session_id)
+        return bool(entry and entry.undo)
+
+    def can_redo(self, session_id):
+        entry = self._sessions.get(session_id)
+        return bool(entry and entry.redo)
+
+    def referenced(self, session_id, key):
+        """Every value of `key` that undo or redo could bring back, e.g. the video files to keep."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return set()
+            return {snap.get(key) for snap in entry.undo + entry.redo if snap.get(key) is not None}
+
+    def delta(self, session_id, base_version, state):
+        """A patch from `base_version` to `state` when that version is still known, else the full snapshot."""
+        with self._lock:
+            entry = self._entry(session_id, state)
+            base = entry.by_version.get(base_version) if base_version is not None else None
+        version = state.get("version", 0)
+        if base is None:
+            return {"version": version, "snapshot": {key: state.get(key) for key in TRACKED_KEYS}}
+        return {"version": version, "patch": diff_snapshots(base, snapshot(state))}
+
+    def forget(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
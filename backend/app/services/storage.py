@@ -0,0 +1,314 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+from app.services.metrics import CallbackGauge
+
+
+# Bytes TEMP_DIR and PROCESSED_DIR may hold together before derived files get evicted
+STORAGE_QUOTA_BYTES = int(os.getenv("STORAGE_QUOTA_BYTES", str(20 * 1024 * 1024 * 1024)))
+STORAGE_SWEEP_SECONDS = float(os.getenv("STORAGE_SWEEP_SECONDS", "60"))
+# Directory entries / registry rows checked and files evicted per sweep, so one sweep stays short
+STORAGE_SWEEP_BATCH = int(os.getenv("STORAGE_SWEEP_BATCH", "500"))
+# Files younger than this are never evicted: they may still be being written or downloaded
+STORAGE_MIN_AGE_SECONDS = float(os.getenv("STORAGE_MIN_AGE_SECONDS", "600"))
+# How long after its last save a session counts as active and keeps its rebuildable files pinned
+SESSION_ACTIVE_SECONDS = float(os.getenv("SESSION_ACTIVE_SECONDS", str(24 * 3600)))
+# Kinds that can't be rebuilt from anything else
+ORIGINAL_KINDS = {"upload"}
+
+# Refs that still pin their file: held ones, and active ones whose session hasn't gone idle
+LIVE_REF = "(expires_at IS NULL OR expires_at > ?)"
+
+SESSION_PREFIX = re.compile(r"^(?:cut|burned)_([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})")
+
+
+def classify(path, default_kind):
+    """(kind, session id) of a file from its name, or (None, None) for partial/hidden files."""
+    name = Path(path).name
+    if name.startswith(".") or name.endswith(".part") or ".part." in name:
+        return None, None
+    match = SESSION_PREFIX.match(name)
+    session_id = match.group(1) if match else None
+    if name.endswith(".proxy.mp4"):
+        return "proxy", session_id
+    if name.endswith(".peaks"):
+        return "peaks", session_id
+    if name.endswith(".srt"):
+        return "srt", session_id
+    if name.endswith(".f32"):
+        return "pcm", session_id
+    if name.startswith("cut_"):
+        return "cut", session_id
+    if name.startswith("burned_"):
+        return "export", session_id
+    return default_kind, session_id
+
+
+class ArtifactRegistry:
+    """Files in the managed directories; unreferenced derived ones are evicted LRU past `quota`."""
+
+    def __init__(self, db_path, roots, quota=STORAGE_QUOTA_BYTES, batch=STORAGE_SWEEP_BATCH, min_age=STORAGE_MIN_AGE_SECONDS,
+                 active_seconds=SESSION_ACTIVE_SECONDS):
+        # root directory -> kind of the files in it that the name doesn't give away
+        self.roots = {str(Path(root).resolve()): kind for root, kind in roots.items()}
+        self.quota = quota
+        self.batch = batch
+        self.min_age = min_age
+        self.active_seconds = active_seconds
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.last_sweep = None
+        self._lock = threading.RLock()
+        # Touches are cheap dict writes (every Range request makes one) and reach the db on the next sweep
+        self._touched = {}
+        self._scan = None
+        self._check_after = ""
+        self._thread = None
+        self._stop = threading.Event()
+
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts ("
+            " path TEXT PRIMARY KEY, kind TEXT NOT NULL, session_id TEXT, size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, last_used REAL NOT NULL, source TEXT)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(artifacts)")}
+        if "source" not in columns:
+            self._conn.execute("ALTER TABLE artifacts ADD COLUMN source TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS artifacts_source ON artifacts (source)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS artifacts_lru ON artifacts (last_used)")
+        # expires_at is NULL for refs held until the session is deleted
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS artifact_refs ("
+            " session_id TEXT NOT NULL, path TEXT NOT NULL, expires_at REAL, PRIMARY KEY (session_id, path))"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(artifact_refs)")}
+        if "expires_at" not in columns:
+            self._conn.execute("ALTER TABLE artifact_refs ADD COLUMN expires_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS artifact_refs_path ON artifact_refs (path)")
+
+    def _root_kind(self, path):
+        parent = str(Path(path).parent)
+        return self.roots.get(parent)
+
+    def register(self, path, kind=None, session_id=None, discovered=False, source=None):
+        """Records a file the app wrote (or refreshes its size); paths outside the roots are ignored."""
+        path = str(Path(path).resolve())
+        source = str(Path(source).resolve()) if source else None
+        default_kind = self._root_kind(path)
+        if default_kind is None:
+            return
+        guessed_kind, guessed_session = classify(path, default_kind)
+        kind, session_id = kind or guessed_kind, session_id or guessed_session
+        if kind is None:
+            return
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        used_at = stat.st_mtime if discovered else max(time.time(), stat.st_mtime)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO artifacts (path, kind, session_id, size, created_at, last_used, source) VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(path) DO UPDATE SET size = excluded.size, last_used = excluded.last_used,"
+                " session_id = COALESCE(excluded.session_id, artifacts.session_id),"
+                " source = COALESCE(excluded.source, artifacts.source)",
+                (path, kind, session_id, stat.st_size, stat.st_mtime, used_at, source),
+            )
+
+    def touch(self, path):
+        """Marks a file as just used (served, read by a render)."""
+        self._touched[str(Path(path).resolve())] = time.time()
+
+    def set_refs(self, session_id, paths, active=()):
+        """Replaces the files `session_id` needs: `paths` until it's released, `active` ones until it goes idle."""
+        held = {str(Path(p).resolve()) for p in paths if p}
+        active = {str(Path(p).resolve()) for p in active if p} - held
+        expires_at = time.time() + self.active_seconds
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM artifact_refs WHERE session_id = ?", (session_id,))
+            self._conn.executemany(
+                "INSERT INTO artifact_refs (session_id, path, expires_at) VALUES (?, ?, ?)",
+                [(session_id, p, None) for p in held] + [(session_id, p, expires_at) for p in active],
+            )
+            self._conn.execute("COMMIT")
+
+    def release_refs(self, session_id):
+        """Unpins everything `session_id` held (the session was deleted)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM artifact_refs WHERE session_id = ?", (session_id,))
+
+    def session_paths(self, session_id, kind):
+        """Registered files of one kind that were written for `session_id`."""
+        with self._lock:
+            return {row[0] for row in self._conn.execute(
+                "SELECT path FROM artifacts WHERE session_id = ? AND kind = ?", (session_id, kind)
+            )}
+
+    def refcount(self, path):
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM artifact_refs WHERE path = ? AND {LIVE_REF}", (str(Path(path).resolve()), time.time())
+            ).fetchone()[0]
+
+    def _expire_refs(self):
+        """Drops the refs of sessions that went idle."""
+        with self._lock:
+            self._conn.execute("DELETE FROM artifact_refs WHERE expires_at <= ?", (time.time(),))
+
+    def _flush_touches(self):
+        touched, self._touched = self._touched, {}
+        if touched:
+            with self._lock:
+                self._conn.executemany("UPDATE artifacts SET last_used = MAX(last_used, ?) WHERE path = ?", [(t, p) for p, t in touched.items()])
+
+    def _scan_entries(self):
+        for root in self.roots:
+            try:
+                with os.scandir(root) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            yield entry.path
+            except FileNotFoundError:
+                continue
+
+    def _reconcile(self):
+        """Registers up to `batch` files found on disk and drops up to `batch` rows whose file is gone."""
+        if self._scan is None:
+            self._scan = self._scan_entries()
+        with self._lock:
+            found = set()
+            for _ in range(self.batch):
+                path = next(self._scan, None)
+                if path is None:
+                    self._scan = None
+                    break
+                found.add(path)
+            registered = {row[0] for row in self._conn.execute(
+                f"SELECT path FROM artifacts WHERE path IN ({','.join('?' * len(found))})", tuple(found)
+            )} if found else set()
+        for path in found - registered:
+            self.register(path, discovered=True)
+
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM artifacts WHERE path > ? ORDER BY path LIMIT ?", (self._check_after, self.batch)).fetchall()
+            self._check_after = rows[-1][0] if len(rows) == self.batch else ""
+            gone = [path for (path,) in rows if not os.path.exists(path)]
+            if gone:
+                self._conn.executemany("DELETE FROM artifacts WHERE path = ?", [(path,) for path in gone])
+                self._drop_derived(gone)
+
+    def _used_bytes(self):
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+
+    def _evictable(self, limit):
+        placeholders = ",".join("?" * len(ORIGINAL_KINDS))
+        return self._conn.execute(
+            f"SELECT path, size FROM artifacts a WHERE kind NOT IN ({placeholders}) AND created_at < ?"
+            f" AND NOT EXISTS (SELECT 1 FROM artifact_refs WHERE path = a.path AND {LIVE_REF})"
+            " ORDER BY last_used LIMIT ?",
+            (*ORIGINAL_KINDS, time.time() - self.min_age, time.time(), limit),
+        ).fetchall()
+
+    def _remove(self, path, size):
+        """Deletes one registered file and its row; False if it couldn't be removed or was already dropped."""
+        if self._conn.execute("SELECT 1 FROM artifacts WHERE path = ?", (path,)).fetchone() is None:
+            return False
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"⚠️ Couldn't evict {path}: {e}")
+            return False
+        self._conn.execute("DELETE FROM artifacts WHERE path = ?", (path,))
+        self.evictions += 1
+        self.evicted_bytes += size
+        return True
+
+    def _drop_derived(self, sources):
+        """Deletes files derived from `sources` (which are gone); returns the bytes freed."""
+        freed = 0
+        for source in sources:
+            for path, size in self._conn.execute("SELECT path, size FROM artifacts WHERE source = ?", (source,)).fetchall():
+                if self._remove(path, size):
+                    freed += size
+        return freed
+
+    def evict(self):
+        """Deletes unreferenced derived files, least recently used first, until usage fits the quota (one batch at most)."""
+        evicted = 0
+        with self._lock:
+            excess = self._used_bytes() - self.quota
+            if excess <= 0:
+                return 0
+            for path, size in self._evictable(self.batch):
+                if excess <= 0:
+                    break
+                if not self._remove(path, size):
+                    continue
+                excess -= size + self._drop_derived([path])
+                evicted += 1
+        if evicted:
+            print(f"🧹 Evicted {evicted} files to stay under the {self.quota / 1024 ** 3:.1f} GB storage quota")
+        return evicted
+
+    def sweep(self):
+        """One incremental step: flush touches, reconcile a batch of files, unpin idle sessions, evict if over quota."""
+        self._flush_touches()
+        self._reconcile()
+        self._expire_refs()
+        self.evict()
+        self.last_sweep = time.time()
+
+    def start(self, interval=STORAGE_SWEEP_SECONDS):
+        """Runs sweep() every `interval` seconds on a daemon thread."""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"⚠️ Storage sweep failed: {e}")
+
+        self._thread = threading.Thread(target=loop, name="storage-sweep", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def usage(self):
+        with self._lock:
+            kinds = {
+                kind: {"files": files, "bytes": size}
+                for kind, files, size in self._conn.execute("SELECT kind, COUNT(*), SUM(size) FROM artifacts GROUP BY kind")
+            }
+            referenced = self._conn.execute(
+                f"SELECT COALESCE(SUM(size), 0) FROM artifacts WHERE path IN (SELECT path FROM artifact_refs WHERE {LIVE_REF})",
+                (time.time(),),
+            ).fetchone()[0]
+            used = self._used_bytes()
+        originals = sum(kinds.get(kind, {}).get("bytes", 0) for kind in ORIGINAL_KINDS)
+        return {
+            "quota_bytes": self.quota,
+            "used_bytes": used,
+            "original_bytes": originals,
+            "referenced_bytes": referenced,
+            "kinds": kinds,
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes,
+            "last_sweep": self.last_sweep,
+        }
+
+    def register_metrics(self):
+        def by_kind():
+            return {(kind,): stats["bytes"] for kind, stats in self.usage()["kinds"].items()}
+        CallbackGauge("storage_bytes", "Bytes on disk in the managed directories, per artifact kind.", by_kind, ["kind"])
@@ -0,0 +1,149 @@
+import uuid
+import heapq
+import threading
+from collections import OrderedDict
+
+
+# Overlay layers that live on the session timeline as {"id", "start", "end", ...} items
+TIMELINE_LAYERS = ["visuals", "text_layers", "bg_layers", "camera_moves", "hud_items"]
+# Layers where two items at once fight over the same thing (the camera transform)
+EXCLUSIVE_LAYERS = ["camera_moves"]
+TIMELINE_CACHE_SIZE = 64
+
+
+def new_layer_id():
+    """Stable id for a new overlay item; unlike len(list)+1 it survives removals and undo."""
+    return uuid.uuid4().hex[:12]
+
+
+def layer_end(tree, items):
+    """Where the latest of `items` ends (0 for none): `tree` covers the items it was built from, the rest were appended since."""
+    return max([tree.end] + [item["end"] for item in items[len(tree.source):]])
+
+
+def layer_between(tree, items, start, end):
+    """IntervalTree.between over `items`, which may have grown past the tree's source by appends."""
+    return tree.between(start, end) + [item for item in items[len(tree.source):] if item["start"] <= end and item["end"] >= start]
+
+
+class IntervalTree:
+    """Static interval tree over one layer: an implicit BST by start with the max end per subtree."""
+
+    def __init__(self, items):
+        self.source = items
+        self.items = sorted(
+            (item for item in items if item.get("end", 0) >= item.get("start", 0)),
+            key=lambda item: (item["start"], item["end"])
+        )
+        self.starts = [item["start"] for item in self.items]
+        self.ends = [item["end"] for item in self.items]
+        self.max_end = list(self.ends)
+        self._build(0, len(self.items))
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def end(self):
+        """Where the latest item ends (0 when empty): the root's subtree max."""
+        return self.max_end[len(self.items) // 2] if self.items else 0
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return float("-inf")
+        mid = (lo + hi) // 2
+        self.max_end[mid] = max(self.ends[mid], self._build(lo, mid), self._build(mid + 1, hi))
+        return self.max_end[mid]
+
+    def _collect(self, lo, hi, start, end, out):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self.max_end[mid] < start:
+            return
+        self._collect(lo, mid, start, end, out)
+        if self.starts[mid] <= end:
+            if self.ends[mid] >= start:
+                out.append(self.items[mid])
+            self._collect(mid + 1, hi, start, end, out)
+
+    def between(self, start, end):
+        """Items that are on screen at any point of [start, end], in start order."""
+        out = []
+        self._collect(0, len(self.items), start, end, out)
+        return out
+
+    def at(self, t):
+        """Items active at time t (start <= t <= end, like the player's check)."""
+        return self.between(t, t)
+
+    def overlaps(self):
+        """Pairs of items running at the same time (touching doesn't count)."""
+        running, pairs = [], []
+        for index, item in enumerate(self.items):
+            while running and running[0][0] <= item["start"]:
+                heapq.heappop(running)
+            pairs.extend((self.items[other], item) for _, other in running)
+            heapq.heappush(running, (item["end"], index))
+        return pairs
+
+
+class Timeline:
+    """One interval tree per overlay layer of a session."""
+
+    def __init__(self):
+        self.trees = {}
+        self.version = None
+        self._conflicts = None
+
+    def update(self, state):
+        """Rebuilds only the layers whose list changed since the last call."""
+        for key in TIMELINE_LAYERS:
+            items = state.get(key) or []
+            tree = self.trees.get(key)
+            if tree is None or tree.source is not items:
+                self.trees[key] = IntervalTree(items)
+                self._conflicts = None
+        self.version = state.get("version")
+
+    def _layers(self, layers):
+        return [key for key in (layers or TIMELINE_LAYERS) if key in self.trees]
+
+    def at(self, t, layers=None):
+        return {key: self.trees[key].at(t) for key in self._layers(layers)}
+
+    def between(self, start, end, layers=None):
+        return {key: self.trees[key].between(start, end) for key in self._layers(layers)}
+
+    def conflicts(self):
+        """Overlapping items on exclusive layers, e.g. two camera moves at once."""
+        if self._conflicts is None:
+            self._conflicts = [
+                {
+                    "layer": key,
+                    "ids": [first.get("id"), second.get("id")],
+                    "start": max(first["start"], second["start"]),
+                    "end": min(first["end"], second["end"]),
+                }
+                for key in EXCLUSIVE_LAYERS
+                for first, second in self.trees[key].overlaps()
+            ]
+        return self._conflicts
+
+
+_TIMELINES = OrderedDict()
+_TIMELINES_LOCK = threading.Lock()
+
+
+def get_timeline(session_id, state):
+    """The timeline for a session, kept between requests and refreshed from `state`."""
+    with _TIMELINES_LOCK:
+        timeline = _TIMELINES.get(session_id)
+        if timeline is None:
+            timeline = Timeline()
+            _TIMELINES[session_id] = timeline
+            while len(_TIMELINES) > TIMELINE_CACHE_SIZE:
+                _TIMELINES.popitem(last=False)
+        _TIMELINES.move_to_end(session_id)
+        timeline.update(state)
+        return timeline
@@ -0,0 +1,102 @@
+from bisect import bisect_right
+
+
+def build_cut_map(keep_segments):
+    """(source_starts, source_ends, output_starts) of the kept ranges, for binary searching."""
+    source_starts, source_ends, output_starts = [], [], []
+    cursor = 0.0
+    for start, end in keep_segments:
+        source_starts.append(start)
+        source_ends.append(end)
+        output_starts.append(cursor)
+        cursor += end - start
+    return source_starts, source_ends, output_starts
+
+
+def remap_interval(start, end, cut_map):
+    """A source [start, end] on the edited timeline, clipped; None when it was removed entirely."""
+    source_starts, source_ends, output_starts = cut_map
+    if not source_starts or end <= start:
+        return None
+
+    # First kept range that ends after `start`
+    i = bisect_right(source_ends, start)
+    if i < len(source_starts) and start < source_starts[i]:
+        start = source_starts[i]
+    # Last kept range that starts before `end`
+    j = bisect_right(source_starts, end) - 1
+    if j >= 0 and end > source_ends[j]:
+        end = source_ends[j]
+
+    if i >= len(source_starts) or j < 0 or i > j or end <= start:
+        return None
+
+    new_start = output_starts[i] + (start - source_starts[i])
+    new_end = output_starts[j] + (end - source_starts[j])
+    return new_start, new_end
+
+
+def remap_subtitles(subtitles, keep_segments):
+    """Subtitles on the cut timeline: removed words are dropped and the text rebuilt from the rest."""
+    cut_map = build_cut_map(keep_segments)
+    remapped = []
+
+    for sub in subtitles:
+        span = remap_interval(sub["start"], sub["end"], cut_map)
+        if span is None:
+            continue
+
+        words = sub.get("words", [])
+        kept_words = []
+        for word in words:
+            word_span = remap_interval(word["start"], word["end"], cut_map)
+            if word_span is not None:
+                kept_words.append({**word, "start": word_span[0], "end": word_span[1]})
+
+        if words and not kept_words:
+            continue
+
+        text = "".join(w["word"] for w in kept_words).strip() if words else sub["text"]
+        remapped.append({**sub, "start": span[0], "end": span[1], "text": text, "words": kept_words})
+
+    return remapped
+
+
+def remap_layers(layers, keep_segments):
+    """Same as remap_subtitles for overlay layers (visuals, HUD, text, camera...)."""
+    cut_map = build_cut_map(keep_segments)
+    remapped = []
+    for layer in layers:
+        span = remap_interval(layer["start"], layer["end"], cut_map)
+        if span is not None:
+            remapped.append({**layer, "start": span[0], "end": span[1]})
+    return remapped
+
+
+def intersect_ranges(a, b):
+    """Ranges covered by both sorted range lists (e.g. an existing edit list and a new cut)."""
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if end > start:
+            result.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def complement_ranges(keep_segments, total_duration):
+    """The removed ranges of an edit list, i.e. what the preview player should skip."""
+    skips = []
+    cursor = 0.0
+    for start, end in keep_segments:
+        if start > cursor:
+            skips.append((cursor, start))
+        cursor = end
+    if cursor < total_duration:
+        skips.append((cursor, total_duration))
+    return skips
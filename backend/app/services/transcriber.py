@@ -1,24 +1,195 @@
-import whisper
+import os
 import warnings
-import torch
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from app.services.model_pool import borrow_model, configure_pool, DEFAULT_MODEL
+from app.services.audio_cache import load_pcm, open_pcm, SAMPLE_RATE
+from app.services.metrics import span
 
 
 warnings.filterwarnings("ignore")
 
-def transcribe_video(video_path: str):
-    model = whisper.load_model("base", device="cpu")
-    
-    print("Whisper running with word timestamps...")
-    result = model.transcribe(video_path, fp16=False, word_timestamps=True)
+# Chunked mode kicks in for inputs at least this long (seconds); 0 disables it
+CHUNKED_MIN_SECONDS = float(os.getenv("TRANSCRIBE_CHUNKED_MIN_SECONDS", "600"))
+CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", "300"))
+CHUNK_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "0")) or max(1, (os.cpu_count() or 1) // 2)
+# Opt-in: shorter inputs go through the shared batcher, so concurrent uploads share encoder/decoder
+# runs. Its fixed windows drop Whisper's previous-text conditioning, so compare the words against
+# the sequential path (benchmarks/bench_batch_transcribe.py --audio) before turning it on
+BATCHING = os.getenv("TRANSCRIBE_BATCHING", "false").lower() == "true"
+# Batched windows are cut at pauses near every BATCH_WINDOW_SECONDS and always fit Whisper's 30s input
+BATCH_WINDOW_SECONDS = 25.0
+BATCH_WINDOW_SEARCH_SECONDS = 4.0
+
+
+def mode_options():
+    """The settings that pick (and shape) the transcription path; transcripts differ between paths."""
+    chunked = CHUNKED_MIN_SECONDS > 0 and CHUNK_WORKERS > 1
+    return {
+        "chunked_min_seconds": CHUNKED_MIN_SECONDS if chunked else 0,
+        "chunk_seconds": CHUNK_SECONDS if chunked else None,
+        "batched": BATCHING,
+    }
+
+_executor = None
+_executor_config = None
+_executor_lock = threading.Lock()
 
-    
+
+def format_segments(result_segments, offset=0.0):
     segments = []
-    for seg in result["segments"]:
+    for seg in result_segments:
+        words = [
+            {**w, "start": w["start"] + offset, "end": w["end"] + offset}
+            for w in seg.get("words", [])
+        ]
         segments.append({
-            "start": seg["start"],
-            "end": seg["end"],
+            "start": seg["start"] + offset,
+            "end": seg["end"] + offset,
             "text": seg["text"].strip(),
-            "words": seg.get("words", []) 
+            "words": words
         })
-        
-    return segments
\ No newline at end of file
+    return segments
+
+
+def find_split_points(audio, chunk_seconds=CHUNK_SECONDS, search_seconds=10.0):
+    """Sample offsets about every `chunk_seconds`, each moved to the quietest spot within `search_seconds`."""
+    frame = int(SAMPLE_RATE * 0.02)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return []
+
+    rms = np.sqrt(np.mean(audio[: n_frames * frame].reshape(n_frames, frame) ** 2, axis=1))
+    # A 200ms moving average finds pauses rather than a single quiet frame mid-word
+    energy = np.convolve(rms, np.ones(10) / 10, mode="same")
+
+    frames_per_second = SAMPLE_RATE / frame
+    splits = []
+    target = chunk_seconds
+    total_seconds = len(audio) / SAMPLE_RATE
+    while target < total_seconds - search_seconds:
+        lo = int((target - search_seconds) * frames_per_second)
+        hi = int((target + search_seconds) * frames_per_second)
+        best = lo + int(np.argmin(energy[lo:hi]))
+        splits.append(best * frame)
+        target = best / frames_per_second + chunk_seconds
+    return splits
+
+
+def _init_worker(model_name, threads):
+    configure_pool(model_name or DEFAULT_MODEL, size=1, threads=threads)
+
+
+def _transcribe_chunk(audio, offset, model_name):
+    # Memory-mapped input travels as (path, start, end) and is re-mapped in the worker
+    if isinstance(audio, tuple):
+        audio = open_pcm(*audio)
+    with borrow_model(model_name) as model:
+        result = model.transcribe(audio, fp16=False, word_timestamps=True)
+    return format_segments(result["segments"], offset)
+
+
+def _load_worker_model(model_name):
+    with borrow_model(model_name):
+        return os.getpid()
+
+
+def _get_executor(workers, model_name):
+    """One long-lived process pool, so every worker keeps its Whisper instance warm between uploads."""
+    global _executor, _executor_config
+    with _executor_lock:
+        if _executor is None or _executor_config != (workers, model_name):
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                # torch + fork is deadlock-prone, start clean interpreters instead
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(model_name, threads),
+            )
+            _executor_config = (workers, model_name)
+        return _executor
+
+
+def warm_chunk_workers(model_name=None, workers=None):
+    """Starts the worker processes and loads their models ahead of the first long upload."""
+    workers = workers or CHUNK_WORKERS
+    executor = _get_executor(workers, model_name)
+    return set(executor.map(_load_worker_model, [model_name] * workers))
+
+
+def transcribe_chunked(audio, model_name=None, workers=None, progress_callback=None):
+    """Transcribes windows split at pauses in parallel processes and stitches them into one timeline."""
+    workers = workers or CHUNK_WORKERS
+    bounds = [0] + find_split_points(audio) + [len(audio)]
+    chunks = [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+    print(f"🧩 Transcribing {len(chunks)} chunks on {workers} workers...")
+
+    def chunk_of(start, end):
+        if isinstance(audio, np.memmap) and audio.nbytes == os.path.getsize(audio.filename):
+            return (audio.filename, start, end)
+        return audio[start:end]
+
+    executor = _get_executor(workers, model_name)
+    futures = {
+        executor.submit(_transcribe_chunk, chunk_of(start, end), start / SAMPLE_RATE, model_name): i
+        for i, (start, end) in enumerate(chunks)
+    }
+
+    results = [None] * len(chunks)
+    for done, future in enumerate(as_completed(futures), start=1):
+        results[futures[future]] = future.result()
+        if progress_callback:
+            progress_callback(done / len(chunks))
+
+    return [seg for chunk_segments in results for seg in chunk_segments]
+
+
+def transcribe_batched(audio, model_name=None, progress_callback=None, batcher=None):
+    """Transcribes <30s windows split at pauses through the shared batcher."""
+    bounds = [0] + find_split_points(audio, BATCH_WINDOW_SECONDS, BATCH_WINDOW_SEARCH_SECONDS) + [len(audio)]
+    windows = [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+    if batcher is None:
+        from app.services.batch_transcriber import get_batcher
+        batcher = get_batcher(model_name)
+    futures = [batcher.submit_window(audio[start:end]) for start, end in windows]
+
+    segments = []
+    for done, ((start, _), future) in enumerate(zip(windows, futures), start=1):
+        segments.extend(format_segments(future.result(), start / SAMPLE_RATE))
+        if progress_callback:
+            progress_callback(done / len(futures))
+    return segments
+
+
+def transcribe_audio(audio, model_name=None, chunked=None, workers=None, progress_callback=None, batched=None):
+    duration = len(audio) / SAMPLE_RATE
+    if chunked is None:
+        chunked = CHUNKED_MIN_SECONDS > 0 and duration >= CHUNKED_MIN_SECONDS and (workers or CHUNK_WORKERS) > 1
+    batched = BATCHING if batched is None else batched
+    mode = "chunked" if chunked else "batched" if batched else "single"
+
+    with span("transcribe", mode=mode, audio_s=round(duration, 1)) as details:
+        if chunked:
+            segments = transcribe_chunked(audio, model_name, workers, progress_callback)
+        elif batched:
+            segments = transcribe_batched(audio, model_name, progress_callback)
+        else:
+            with borrow_model(model_name) as model:
+                print("Whisper running with word timestamps...")
+                result = model.transcribe(audio, fp16=False, word_timestamps=True)
+            segments = format_segments(result["segments"])
+        details["segments"] = len(segments)
+    return segments
+
+
+def transcribe_video(video_path: str, model_name: str = None, chunked: bool = None, progress_callback=None):
+    # Shared decode: silence detection and waveforms read the same cached buffer
+    audio = load_pcm(video_path)
+    return transcribe_audio(audio, model_name, chunked=chunked, progress_callback=progress_callback)
@@ -3,6 +3,18 @@ import os
 import sys
 import re
 import subprocess
+import threading
+
+from app.services.audio_cache import load_pcm, detect_silence, SAMPLE_RATE
+from app.services.timeline_remap import remap_subtitles
+from app.services.segment_cutter import cut_segments
+from app.services.metrics import span, track_process
+from app.services.ffmpeg_scheduler import cpu_slot
+
+# "segments": keyframe-aware cutter (stream copy + re-encoded boundaries); "filtergraph": one trim/concat graph
+CUT_ENGINE = os.getenv("CUT_ENGINE", "segments").lower()
+
+DURATION_PATTERN = re.compile(r"Duration: (\d{2}):(\d{2}):(\d{2}\.\d{2})")
 
 def generate_srt(subtitles, output_path):
     """
@@ -26,11 +38,49 @@ def generate_srt(subtitles, output_path):
             f.write(f"{start} --> {end}\n")
             f.write(f"{text}\n\n")
 
-def burn_subtitles(video_path, subtitles, style, output_path):
-   
-    srt_path = video_path.replace(".mp4", ".srt")
-    generate_srt(subtitles, srt_path)
-    
+def run_ffmpeg(stream, progress_callback=None, duration=None):
+    """Runs an ffmpeg-python graph, reporting progress (0..1); returns ffmpeg's stderr log."""
+    args = ffmpeg.compile(stream, overwrite_output=True)
+    args = args[:1] + ["-nostats", "-progress", "pipe:1"] + args[1:]
+
+    with track_process(args):
+        proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        stderr_lines = []
+        probed = {"duration": duration}
+
+        def drain_stderr():
+            for line in proc.stderr:
+                stderr_lines.append(line)
+                if probed["duration"] is None:
+                    match = DURATION_PATTERN.search(line)
+                    if match:
+                        h, m, s = map(float, match.groups())
+                        probed["duration"] = h * 3600 + m * 60 + s
+
+        reader = threading.Thread(target=drain_stderr, daemon=True)
+        reader.start()
+
+        try:
+            for line in proc.stdout:
+                # both keys are microseconds; out_time_ms is a misnomer that older builds still emit
+                if not progress_callback or not line.startswith(("out_time_us=", "out_time_ms=")):
+                    continue
+                total = probed["duration"]
+                value = line.split("=", 1)[1].strip()
+                if total and value.isdigit():
+                    progress_callback(min(1.0, int(value) / 1_000_000 / total))
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+
+        proc.wait()
+        reader.join()
+        if proc.returncode != 0:
+            raise ffmpeg.Error("ffmpeg", None, "".join(stderr_lines).encode("utf-8"))
+        return "".join(stderr_lines)
+
+def build_style_string(style):
     font_size = style.get('font_size', 24)
     color_map = {
         "white": "&HFFFFFF",
@@ -40,43 +90,64 @@ def burn_subtitles(video_path, subtitles, style, output_path):
     }
     font_color = color_map.get(style.get('font_color', 'white').lower(), "&HFFFFFF")
 
-    style_str = f"FontSize={font_size},PrimaryColour={font_color},BorderStyle=1,Outline=1,Shadow=0"
+    return f"FontSize={font_size},PrimaryColour={font_color},BorderStyle=1,Outline=1,Shadow=0"
+
+def concat_segments(input_stream, keep_segments, audio=True):
+    """trim/atrim each kept range and concat them; returns the (video, audio) streams (audio None without one)."""
+    streams = []
+    
+    for i, (start, end) in enumerate(keep_segments):
+        v = input_stream.video.trim(start=start, end=end).setpts('PTS-STARTPTS')
+        streams.append(v)
+        if audio:
+            a = input_stream.audio.filter_('atrim', start=start, end=end).filter_('asetpts', 'PTS-STARTPTS')
+            streams.append(a)
+
+    joined = ffmpeg.concat(*streams, v=1, a=int(audio)).node
+    return joined[0], joined[1] if audio else None
+
+def burn_subtitles(video_path, subtitles, style, output_path, progress_callback=None, keep_segments=None):
+    """Renders the final video (cut, remapped subtitles and burn-in) in one encode."""
+   
+    if keep_segments:
+        subtitles = remap_subtitles(subtitles, keep_segments)
+
+    # Next to the output, not the source: several sessions can share one stored upload
+    srt_path = os.path.splitext(output_path)[0] + ".srt"
+    generate_srt(subtitles, srt_path)
+    
+    style_str = build_style_string(style)
     
     try:
-        stream = ffmpeg.input(video_path)
-        stream = ffmpeg.output(stream, output_path, vf=f"subtitles={srt_path}:force_style='{style_str}'")
-        ffmpeg.run(stream, overwrite_output=True)
+        with span("burn_subtitles", segments=len(keep_segments or [])), cpu_slot() as threads:
+            if keep_segments:
+                video, audio = concat_segments(ffmpeg.input(video_path), keep_segments)
+                video = video.filter("subtitles", srt_path, force_style=style_str)
+                stream = ffmpeg.output(video, audio, output_path, threads=threads)
+                duration = sum(end - start for start, end in keep_segments)
+            else:
+                stream = ffmpeg.input(video_path)
+                stream = ffmpeg.output(stream, output_path, vf=f"subtitles={srt_path}:force_style='{style_str}'", threads=threads)
+                duration = None
+            run_ffmpeg(stream, progress_callback, duration=duration)
         return True
     except ffmpeg.Error as e:
         print("FFmpeg Error:", e.stderr)
         return False
+    finally:
+        # Only the render needs it; left behind, one accumulates per export
+        if os.path.exists(srt_path):
+            os.remove(srt_path)
 
 
-def remove_silence_and_fillers(input_path, output_path, filler_intervals=[], db_threshold=-30, min_duration=0.5):
-  
-    input_path = os.path.abspath(input_path)
-    output_path = os.path.abspath(output_path)
-
-    print("Detecting silence...")
-    try:
-        cmd = [
-            "ffmpeg", "-i", input_path, 
-            "-af", f"silencedetect=noise={db_threshold}dB:d={min_duration}", 
-            "-f", "null", "-"
-        ]
-        result = subprocess.run(cmd, stderr=subprocess.PIPE, text=True)
-        log = result.stderr
-    except Exception as e:
-        print(f"Detection failed: {e}")
-        return False
+def plan_cuts(input_path, filler_intervals=[], db_threshold=-30, min_duration=0.5):
+    """(keep_segments, total_duration) after silence and filler removal; keep_segments is None when nothing is cut."""
+    samples = load_pcm(os.path.abspath(input_path))
+    total_duration = len(samples) / SAMPLE_RATE
 
-    silence_starts = [float(x) for x in re.findall(r'silence_start: ([\d\.]+)', log)]
-    silence_ends = [float(x) for x in re.findall(r'silence_end: ([\d\.]+)', log)]
-    
-    remove_list = []
-    count = min(len(silence_starts), len(silence_ends))
-    for i in range(count):
-        remove_list.append((silence_starts[i], silence_ends[i]))
+    with span("silencedetect", audio_s=round(total_duration, 1)) as details:
+        remove_list = detect_silence(samples, db_threshold, min_duration)
+        details["silences"] = len(remove_list)
         
     if filler_intervals:
         print(f"➕ Adding {len(filler_intervals)} filler word cuts...")
@@ -84,7 +155,7 @@ def remove_silence_and_fillers(input_path, output_path, filler_intervals=[], db_
 
     if not remove_list:
         print("⚠️ No silence or fillers found to remove.")
-        return False
+        return None, total_duration
 
     remove_list.sort(key=lambda x: x[0])
     
@@ -99,11 +170,6 @@ def remove_silence_and_fillers(input_path, output_path, filler_intervals=[], db_
                 curr_start, curr_end = next_start, next_end
         merged_removals.append((curr_start, curr_end))
 
-    duration_match = re.search(r"Duration: (\d{2}):(\d{2}):(\d{2}\.\d{2})", log)
-    if not duration_match: return False
-    h, m, s = map(float, duration_match.groups())
-    total_duration = h * 3600 + m * 60 + s
-
     keep_segments = []
     current_time = 0.0
     
@@ -115,22 +181,48 @@ def remove_silence_and_fillers(input_path, output_path, filler_intervals=[], db_
     if current_time < total_duration:
         keep_segments.append((current_time, total_duration))
 
+    return keep_segments, total_duration
+
+
+def remove_silence_and_fillers(input_path, output_path, filler_intervals=[], db_threshold=-30, min_duration=0.5, progress_callback=None):
+  
+    input_path = os.path.abspath(input_path)
+    output_path = os.path.abspath(output_path)
+    report = progress_callback or (lambda progress, stage=None: None)
+
+    print("Detecting silence...")
+    report(0.0, "detecting silence")
+    try:
+        keep_segments, _ = plan_cuts(input_path, filler_intervals, db_threshold, min_duration)
+    except Exception as e:
+        print(f"Detection failed: {e}")
+        return False
+
+    if not keep_segments:
+        return False
+
     print(f"✂️ Stitching {len(keep_segments)} clean segments...")
+    report(0.2, f"stitching {len(keep_segments)} segments")
 
-    input_stream = ffmpeg.input(input_path)
-    streams = []
-    
-    for i, (start, end) in enumerate(keep_segments):
-        v = input_stream.video.trim(start=start, end=end).setpts('PTS-STARTPTS')
-        a = input_stream.audio.filter_('atrim', start=start, end=end).filter_('asetpts', 'PTS-STARTPTS')
-        streams.extend([v, a])
+    if CUT_ENGINE == "segments":
+        try:
+            with span("concat_render", engine="segments", segments=len(keep_segments)):
+                done = cut_segments(input_path, output_path, keep_segments, lambda p: report(0.2 + 0.8 * p))
+            if done:
+                print("Magic Cut Complete!")
+                return keep_segments
+        except RuntimeError as e:
+            print(f"⚠️ Segment cutter failed, falling back to filter graph: {e}")
 
     try:
-        joined = ffmpeg.concat(*streams, v=1, a=1).node
-        out = ffmpeg.output(joined[0], joined[1], output_path)
-        out.run(overwrite_output=True, capture_stderr=True)
+        video, audio = concat_segments(ffmpeg.input(input_path), keep_segments)
+        kept_duration = sum(end - start for start, end in keep_segments)
+        with span("concat_render", engine="filtergraph", segments=len(keep_segments)), cpu_slot() as threads:
+            out = ffmpeg.output(video, audio, output_path, threads=threads)
+            run_ffmpeg(out, lambda p: report(0.2 + 0.8 * p), duration=kept_duration)
         print("Magic Cut Complete!")
-        return True
+        # The edit list doubles as the success flag: callers remap timestamps through it
+        return keep_segments
     except ffmpeg.Error as e:
         print("Stitching Error:", e.stderr.decode('utf-8'))
-        return False
\ No newline at end of file
+        return False
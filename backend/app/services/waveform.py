@@ -0,0 +1,117 @@
+import os
+import struct
+
+import numpy as np
+
+from app.services.audio_cache import load_pcm, detect_silence, SAMPLE_RATE, BLOCK_SECONDS
+
+
+# Level 0 holds one min/max pair per 256 samples (16ms); every level above halves the resolution
+BASE_SAMPLES_PER_PEAK = 256
+# Stop adding levels once a whole level fits in this many peaks
+MIN_TOP_LEVEL_PEAKS = 512
+# Upper bound on peaks per response, so any zoom/pan request stays a few kilobytes
+MAX_WINDOW_PEAKS = 4096
+
+PEAKS_MAGIC = b"PEAK"
+PEAKS_VERSION = 1
+# magic, version, level count, sample rate, base samples per peak, silence range count
+HEADER = struct.Struct("<4sHHIII")
+
+
+def peaks_path_for(media_path):
+    return os.path.splitext(media_path)[0] + ".peaks"
+
+
+def _base_level(samples):
+    """min/max per BASE_SAMPLES_PER_PEAK samples as int8 pairs, computed block by block."""
+    n_peaks = -(-len(samples) // BASE_SAMPLES_PER_PEAK)
+    level = np.zeros((n_peaks, 2), dtype=np.int8)
+    block = (SAMPLE_RATE * BLOCK_SECONDS) // BASE_SAMPLES_PER_PEAK * BASE_SAMPLES_PER_PEAK
+
+    for first in range(0, len(samples), block):
+        chunk = np.asarray(samples[first:first + block])
+        pad = -len(chunk) % BASE_SAMPLES_PER_PEAK
+        if pad:
+            chunk = np.concatenate([chunk, np.zeros(pad, dtype=np.float32)])
+        frames = chunk.reshape(-1, BASE_SAMPLES_PER_PEAK)
+        row = first // BASE_SAMPLES_PER_PEAK
+        level[row:row + len(frames), 0] = np.clip(frames.min(axis=1) * 127, -127, 127)
+        level[row:row + len(frames), 1] = np.clip(frames.max(axis=1) * 127, -127, 127)
+    return level
+
+
+def _halve(level):
+    if len(level) % 2:
+        level = np.concatenate([level, level[-1:]])
+    pairs = level.reshape(-1, 2, 2)
+    return np.stack([pairs[:, :, 0].min(axis=1), pairs[:, :, 1].max(axis=1)], axis=1)
+
+
+def build_peaks(media_path, peaks_path=None):
+    """Writes the min/max peak pyramid and silence ranges of a video to one binary file."""
+    peaks_path = peaks_path or peaks_path_for(media_path)
+    if os.path.exists(peaks_path):
+        return peaks_path
+
+    samples = load_pcm(os.path.abspath(media_path))
+    levels = [_base_level(samples)]
+    while len(levels[-1]) > MIN_TOP_LEVEL_PEAKS:
+        levels.append(_halve(levels[-1]))
+    silences = np.array(detect_silence(samples), dtype=np.float32).reshape(-1, 2)
+
+    part_path = peaks_path + ".part"
+    with open(part_path, "wb") as f:
+        f.write(HEADER.pack(PEAKS_MAGIC, PEAKS_VERSION, len(levels), SAMPLE_RATE, BASE_SAMPLES_PER_PEAK, len(silences)))
+        f.write(np.array([len(level) for level in levels], dtype="<u4").tobytes())
+        f.write(silences.astype("<f4").tobytes())
+        for level in levels:
+            f.write(level.tobytes())
+    os.replace(part_path, peaks_path)
+    print(f"〰️ Waveform: {len(levels)} levels, {os.path.getsize(peaks_path) / 1024:.0f} KB")
+    return peaks_path
+
+
+class PeakPyramid:
+    """Read-only view over a .peaks file; levels are memory-mapped, nothing is loaded up front."""
+
+    def __init__(self, peaks_path):
+        with open(peaks_path, "rb") as f:
+            magic, version, n_levels, self.sample_rate, self.base_samples, n_silences = HEADER.unpack(f.read(HEADER.size))
+            if magic != PEAKS_MAGIC or version != PEAKS_VERSION:
+                raise ValueError(f"Not a v{PEAKS_VERSION} peaks file: {peaks_path}")
+            counts = np.frombuffer(f.read(4 * n_levels), dtype="<u4")
+            self.silences = np.frombuffer(f.read(8 * n_silences), dtype="<f4").reshape(-1, 2)
+
+        offset = HEADER.size + 4 * n_levels + 8 * n_silences
+        self.levels = []
+        for count in counts:
+            if not count:
+                self.levels.append(np.zeros((0, 2), dtype=np.int8))
+                continue
+            self.levels.append(np.memmap(peaks_path, dtype=np.int8, mode="r", offset=offset, shape=(int(count), 2)))
+            offset += int(count) * 2
+
+    def seconds_per_peak(self, level):
+        return self.base_samples * (1 << level) / self.sample_rate
+
+    @property
+    def duration(self):
+        return len(self.levels[0]) * self.seconds_per_peak(0)
+
+    def pick_level(self, start, end, width):
+        """Finest level that covers [start, end] in at most `width` peaks."""
+        for level in range(len(self.levels)):
+            if (end - start) / self.seconds_per_peak(level) <= width:
+                return level
+        return len(self.levels) - 1
+
+    def window(self, level, start, end):
+        """(int8 [min, max] rows, first row time) of one level between `start` and `end`."""
+        step = self.seconds_per_peak(level)
+        first = max(0, int(start / step))
+        last = min(len(self.levels[level]), int(np.ceil(end / step)), first + MAX_WINDOW_PEAKS)
+        return np.asarray(self.levels[level][first:last]), first * step
+
+    def silences_between(self, start, end):
+        return [(round(float(s), 3), round(float(e), 3)) for s, e in self.silences if e > start and s < end]
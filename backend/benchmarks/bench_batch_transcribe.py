@@ -0,0 +1,162 @@
+"""
+Concurrent uploads: N independent Whisper calls vs one shared batcher.
+
+Run from backend/:
+    python -m benchmarks.bench_batch_transcribe --callers 4 --seconds 60 --model tiny
+
+Every caller transcribes its own audio (`--audio`, or synthetic speech-like bursts) at
+the same moment, cut into the same <30s windows in every mode:
+  independent  each caller decodes its windows one at a time on its own pooled Whisper
+               instance with an equal share of the cores (batch size 1)
+  batched      every caller's windows go through one shared BatchingTranscriber
+  transcribe   each caller runs model.transcribe on its own instance, as uploads did
+               before batching (needs real weights)
+
+`--random-weights` builds the architecture with random weights instead of downloading the
+checkpoint, for boxes without network access. Random weights never emit end-of-text or
+pass the fallback checks, so decoding is capped at `--sample-len` tokens (about what 25s
+of speech produces) with a single temperature; the text is noise, the compute is real.
+
+TRANSCRIBE_BATCHING is off by default. Before turning it on, check that batching keeps the
+words of the sequential path on real speech:
+    python -m benchmarks.bench_batch_transcribe --audio talk.mp4 --parity
+which transcribes the first caller's audio both ways and exits 1 when the word-level
+similarity is under --min-similarity.
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from contextlib import ExitStack
+
+import numpy as np
+import whisper
+from whisper.model import ModelDimensions, Whisper
+
+from app.services import model_pool
+from app.services.audio_cache import SAMPLE_RATE, load_pcm
+from app.services.batch_transcriber import BatchingTranscriber
+from app.services.transcriber import transcribe_audio, transcribe_batched
+from benchmarks.bench_chunked_transcription import word_similarity
+
+
+DIMENSIONS = {
+    "tiny": dict(n_audio_state=384, n_audio_head=6, n_audio_layer=4, n_text_state=384, n_text_head=6, n_text_layer=4),
+    "base": dict(n_audio_state=512, n_audio_head=8, n_audio_layer=6, n_text_state=512, n_text_head=8, n_text_layer=6),
+}
+
+
+def random_weights_loader(name, device="cpu", **kwargs):
+    dims = ModelDimensions(n_mels=80, n_audio_ctx=1500, n_vocab=51865, n_text_ctx=448, **DIMENSIONS[name])
+    return Whisper(dims).to(device).eval()
+
+
+def synthetic_audio(seconds, seed):
+    """Tone bursts separated by pauses, roughly the rhythm of speech."""
+    rng = np.random.default_rng(seed)
+    audio = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    t = 0.0
+    while t < seconds:
+        burst = rng.uniform(0.4, 2.5)
+        n = int(min(burst, seconds - t) * SAMPLE_RATE)
+        start = int(t * SAMPLE_RATE)
+        phase = np.arange(n) / SAMPLE_RATE
+        audio[start:start + n] = 0.3 * np.sin(2 * np.pi * rng.uniform(120, 300) * phase) + 0.05 * rng.standard_normal(n)
+        t += burst + rng.uniform(0.2, 0.8)
+    return audio
+
+
+def run_callers(fn, callers):
+    """Starts one thread per caller at the same time; returns the wall time until the last one finishes."""
+    errors = []
+
+    def call(caller):
+        try:
+            fn(caller)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call, args=(caller,)) for caller in callers]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--callers", type=int, default=4, help="concurrent uploads")
+    parser.add_argument("--seconds", type=float, default=60, help="audio per caller")
+    parser.add_argument("--audio", help="media file to use instead of synthetic audio")
+    parser.add_argument("--model", default="tiny")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--wait-ms", type=float, default=50)
+    parser.add_argument("--random-weights", action="store_true", help="skip the checkpoint download")
+    parser.add_argument("--sample-len", type=int, default=None, help="max tokens per window (64 with --random-weights)")
+    parser.add_argument("--modes", default="independent,batched")
+    parser.add_argument("--parity", action="store_true", help="compare batched words with model.transcribe")
+    parser.add_argument("--min-similarity", type=float, default=0.95, help="word-level parity threshold")
+    args = parser.parse_args()
+
+    decoding = {}
+    if args.random_weights:
+        whisper.load_model = random_weights_loader
+        decoding = {"temperatures": (0.0,), "sample_len": args.sample_len or 64}
+    elif args.sample_len:
+        decoding = {"sample_len": args.sample_len}
+
+    if args.audio:
+        source = np.asarray(load_pcm(args.audio))[: int(args.seconds * SAMPLE_RATE)]
+        clips = [source] * args.callers
+    else:
+        clips = [synthetic_audio(args.seconds, seed) for seed in range(args.callers)]
+    audio_seconds = sum(len(clip) for clip in clips) / SAMPLE_RATE
+    cores = os.cpu_count() or 1
+
+    # One instance per caller, each with an equal share of the cores
+    model_pool.configure_pool(args.model, size=args.callers, threads=max(1, cores // args.callers))
+    batcher = BatchingTranscriber(args.model, max_batch=args.batch_size, max_wait_ms=args.wait_ms, threads=cores, **decoding)
+    singles = [BatchingTranscriber(args.model, max_batch=1, max_wait_ms=0, threads=max(1, cores // args.callers), **decoding) for _ in clips]
+    # Load (and copy) every instance up front so neither mode pays for it
+    with ExitStack() as stack:
+        for _ in range(args.callers):
+            stack.enter_context(model_pool.borrow_model(args.model))
+
+    modes = {
+        "independent": lambda i: transcribe_batched(clips[i], args.model, batcher=singles[i]),
+        "batched": lambda i: transcribe_batched(clips[i], args.model, batcher=batcher),
+        "transcribe": lambda i: transcribe_audio(clips[i], args.model, chunked=False, batched=False),
+    }
+    print(f"{args.callers} callers x {args.seconds:.0f}s of audio, model {args.model}, {cores} cores")
+    results = {}
+    for mode in args.modes.split(","):
+        wall = run_callers(modes[mode], range(len(clips)))
+        results[mode] = audio_seconds / wall
+        print(f"{mode:<12} {wall:8.2f}s wall  {results[mode]:6.2f} audio-s/s")
+    similarity = None
+    if args.parity:
+        reference = transcribe_audio(clips[0], args.model, chunked=False, batched=False)
+        similarity = word_similarity(reference, transcribe_batched(clips[0], args.model, batcher=batcher))
+    print(f"batcher: {batcher.stats()}")
+    for transcriber in [batcher] + singles:
+        transcriber.close()
+
+    if "independent" in results and "batched" in results:
+        print(f"batched throughput: {results['batched'] / results['independent']:.2f}x")
+
+    if similarity is not None:
+        print(f"word similarity batched vs transcribe: {similarity:.3f} (min {args.min_similarity:.2f})")
+        if similarity < args.min_similarity:
+            print("❌ Batched transcription drifts from the sequential path; keep TRANSCRIBE_BATCHING off")
+            return 1
+        print("✅ Batched transcription matches the sequential path")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
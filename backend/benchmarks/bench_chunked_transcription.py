@@ -0,0 +1,65 @@
+"""
+Chunked vs single-pass transcription: wall-clock speedup per worker count.
+
+Run from backend/:
+    python -m benchmarks.bench_chunked_transcription talk.mp4 --tile-to 3600 --workers 2 4 8
+
+--tile-to repeats a shorter recording until it reaches the given length, so a few
+minutes of speech are enough to benchmark an hour-long input.
+"""
+import time
+import argparse
+import difflib
+
+import numpy as np
+
+from app.services.audio_cache import load_pcm, SAMPLE_RATE
+from app.services.transcriber import transcribe_audio, warm_chunk_workers
+
+
+def word_similarity(reference, candidate):
+    ref_words = " ".join(seg["text"] for seg in reference).lower().split()
+    cand_words = " ".join(seg["text"] for seg in candidate).lower().split()
+    return difflib.SequenceMatcher(None, ref_words, cand_words, autojunk=False).ratio()
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("media")
+    parser.add_argument("--tile-to", type=float, default=0, help="repeat the audio up to this many seconds")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--skip-single", action="store_true", help="don't run the (slow) single-pass baseline")
+    args = parser.parse_args()
+
+    audio = load_pcm(args.media)
+    if args.tile_to:
+        repeats = int(np.ceil(args.tile_to * SAMPLE_RATE / len(audio)))
+        audio = np.tile(audio, repeats)[: int(args.tile_to * SAMPLE_RATE)]
+    duration = len(audio) / SAMPLE_RATE
+    print(f"Input: {duration / 60:.1f} min of audio")
+
+    baseline, baseline_time = None, None
+    if not args.skip_single:
+        baseline, baseline_time = timed(transcribe_audio, audio, args.model, chunked=False)
+        print(f"single-pass     {baseline_time:8.1f}s  ({duration / baseline_time:5.1f}x realtime)")
+
+    for workers in args.workers:
+        # Spawning the pool and loading a model per worker is a one-off; keep it out of the timing
+        warm_chunk_workers(args.model, workers)
+        segments, elapsed = timed(transcribe_audio, audio, args.model, chunked=True, workers=workers)
+
+        line = f"chunked x{workers:<3}   {elapsed:8.1f}s  ({duration / elapsed:5.1f}x realtime)"
+        if baseline is not None:
+            line += f"  speedup {baseline_time / elapsed:4.2f}x  text match {word_similarity(baseline, segments):.3f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
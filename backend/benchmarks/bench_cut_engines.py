@@ -0,0 +1,122 @@
+"""
+Keyframe-aware segment cutter vs the single trim/concat filter graph: runtime and peak RSS.
+
+Run from backend/:
+    python -m benchmarks.bench_cut_engines --generate 20       # synthetic 20 min, pause every 6s
+    python -m benchmarks.bench_cut_engines --input talk.mp4
+
+Each engine runs in a fresh interpreter; peak RSS is the largest sum of resident memory
+over that interpreter and all its ffmpeg children, sampled from /proc every 50ms.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+
+
+def generate_input(path, minutes, pause_every=6.0, pause_length=1.2):
+    """Color bars and a tone that goes quiet for `pause_length`s every `pause_every`s."""
+    duration = minutes * 60
+    cmd = [
+        "ffmpeg", "-nostdin", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=30:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}",
+        "-af", f"volume='if(lt(mod(t,{pause_every}),{pause_length}),0,1)':eval=frame",
+        "-c:v", "libx264", "-preset", "veryfast", "-g", "60", "-c:a", "aac", "-shortest", path
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def _descendants(pid):
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    found, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        found.append(current)
+        stack.extend(children.get(current, []))
+    return found
+
+
+def _rss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def run_one(engine, input_path):
+    """Child mode: cut with one engine and print {"wall", "peak_rss_mb"} as JSON."""
+    os.environ["CUT_ENGINE"] = engine
+    from app.services.video_utils import plan_cuts, remove_silence_and_fillers
+
+    plan_cuts(input_path)  # decode + detect outside the timing; both engines share it
+
+    peak = {"kb": 0}
+    done = threading.Event()
+
+    def sample():
+        while not done.is_set():
+            peak["kb"] = max(peak["kb"], sum(_rss_kb(pid) for pid in _descendants(os.getpid())))
+            time.sleep(0.05)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    output_path = os.path.join(tempfile.mkdtemp(), "out.mp4")
+    start = time.perf_counter()
+    keep_segments = remove_silence_and_fillers(input_path, output_path)
+    wall = time.perf_counter() - start
+    done.set()
+    sampler.join()
+
+    print(json.dumps({"wall": wall, "peak_rss_mb": peak["kb"] / 1024, "segments": len(keep_segments or [])}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input")
+    parser.add_argument("--generate", type=float, help="minutes of synthetic pause-heavy video")
+    parser.add_argument("--run-one", choices=["segments", "filtergraph"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        return run_one(args.run_one, args.input)
+
+    input_path = args.input
+    if args.generate:
+        input_path = os.path.join(tempfile.mkdtemp(), f"synthetic_{args.generate:g}min.mp4")
+        print(f"Generating {args.generate:g} min test video...")
+        generate_input(input_path, args.generate)
+
+    results = {}
+    for engine in ("filtergraph", "segments"):
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_cut_engines", "--run-one", engine, "--input", input_path],
+            stdout=subprocess.PIPE, text=True, check=True
+        ).stdout
+        results[engine] = json.loads(out.strip().splitlines()[-1])
+        r = results[engine]
+        print(f"{engine:<12} {r['wall']:8.2f}s  peak RSS {r['peak_rss_mb']:8.1f} MB  ({r['segments']} segments)")
+
+    speedup = results["filtergraph"]["wall"] / results["segments"]["wall"]
+    print(f"segments engine: {speedup:.2f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Compound editing commands: one action per /chat turn vs one multi-action plan per turn.
+
+Run from backend/:
+    python -m benchmarks.bench_multi_action --commands 20 --llm-latency 0.8
+
+The Gemini client is swapped for a local stub that sleeps `--llm-latency` seconds and
+returns canned JSON, so the numbers isolate round-trips and session writes. Each turn
+goes through the real graph (context building, handlers) and a real SessionStore write.
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+import app.agent.graph as agent_graph
+from app.services.session_store import SessionStore
+
+
+COMMAND = [
+    {"action": "camera", "type": "zoom-in", "intensity": 1.5, "trigger_phrase": "market crashed"},
+    {"action": "hud", "title": "2008", "content": "Global financial crisis.", "type": "info", "trigger_phrase": "housing bubble"},
+    {"action": "style", "new_style": {"font_color": "Yellow"}},
+]
+
+
+class StubLLM:
+    """Answers with whatever plan is queued, after a fixed delay standing in for the network."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.replies = []
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        time.sleep(self.latency)
+        return AIMessage(content=json.dumps(self.replies.pop(0)))
+
+
+def make_subtitles(n=1500):
+    subs = []
+    for i in range(n):
+        text = "and then we talk about the market crashed again" if i == 1200 else f"segment {i} about the housing bubble" if i == 900 else f"filler words number {i}"
+        subs.append({"start": i * 4.0, "end": i * 4.0 + 3.5, "text": text})
+    return subs
+
+
+def run_turn(store, session_id, prompt):
+    """Same shape as /chat: invoke the graph, merge the result, write the session once."""
+    state = store.get(session_id)
+    result = agent_graph.graph.invoke({**state, "session_id": session_id, "messages": [HumanMessage(content=prompt)]})
+    final_state = dict(state)
+    for key in ["style", "subtitles", "visuals", "text_layers", "camera_moves", "hud_items"]:
+        if key in result:
+            final_state[key] = result[key]
+    store.put(session_id, final_state)
+
+
+def run(mode, commands, stub, store, session_id):
+    started = time.perf_counter()
+    calls_before = stub.calls
+    for _ in range(commands):
+        if mode == "single":
+            for action in COMMAND:
+                stub.replies.append(action)
+                run_turn(store, session_id, f"please do: {action['action']}")
+        else:
+            stub.replies.append({"actions": COMMAND})
+            run_turn(store, session_id, "zoom in when the market crashed, add a HUD on the housing bubble and make captions yellow")
+    return time.perf_counter() - started, stub.calls - calls_before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--commands", type=int, default=20, help="compound (3-edit) commands to run")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="seconds per stub LLM round-trip")
+    args = parser.parse_args()
+
+    stub = StubLLM(args.llm_latency)
+    agent_graph.llm = stub
+    store = SessionStore(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    base = {
+        "video_path": "bench.mp4", "subtitles": make_subtitles(), "style": {"font_color": "white", "font_size": 24},
+        "visuals": [], "text_layers": [], "camera_moves": [], "hud_items": [], "bg_layers": [], "messages": []
+    }
+
+    results = {}
+    for mode in ("single", "plan"):
+        session_id = f"bench-{mode}"
+        store.put(session_id, dict(base))
+        wall, calls = run(mode, args.commands, stub, store, session_id)
+        state = store.get(session_id)
+        results[mode] = wall
+        print(
+            f"{mode:<7} {wall:7.2f}s  {calls:4d} LLM calls  {calls:4d} session writes  "
+            f"{wall / args.commands * 1000:7.1f} ms/command  "
+            f"(layers: {len(state['camera_moves'])} camera, {len(state['hud_items'])} hud)"
+        )
+
+    print(f"multi-action plans: {results['single'] / results['plan']:.2f}x faster per compound command")
+
+
+if __name__ == "__main__":
+    main()
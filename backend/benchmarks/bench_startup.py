@@ -0,0 +1,144 @@
+"""
+Cold-start cost of the API: how long `import app.main` takes and how soon a fresh server
+answers /healthz and /readyz.
+
+Run from backend/:
+    python -m benchmarks.bench_startup                    # import budget + time to live
+    python -m benchmarks.bench_startup --wait-ready 300   # also wait for the engines to warm up
+
+Every measurement runs in a new interpreter, so nothing is already imported or cached in
+the process. The import check fails (exit 1) when the median import time is over
+--budget or when any of the heavy modules in LAZY_MODULES got imported with the app:
+they belong to engines that load after startup (app/services/engines.py).
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Seconds `import app.main` may take in a fresh interpreter
+IMPORT_BUDGET_SECONDS = 1.0
+LAZY_MODULES = ["torch", "whisper", "langchain_google_genai", "langchain_core", "langgraph", "google.genai"]
+
+IMPORT_PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "bench")
+    env["PYTHONPATH"] = BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def measure_import(runs):
+    """Wall seconds of `import app.main` in `runs` fresh interpreters, and the heavy modules it pulled in."""
+    times, loaded = [], set()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=BACKEND_DIR, env=child_env(),
+                             capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        times.append(result["seconds"])
+        loaded.update(result["loaded"])
+    return times, sorted(loaded)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def fetch(url):
+    """(status, body) of a GET; (None, None) while nothing listens yet."""
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except OSError:
+        return None, None
+
+
+def poll(url, deadline):
+    """Whether `url` answered 200 before the deadline."""
+    while time.perf_counter() < deadline:
+        if fetch(url)[0] == 200:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def measure_server(wait_ready, timeout=60):
+    """Starts uvicorn and times the first /healthz answer and, optionally, /readyz turning 200."""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=child_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        result = {}
+        live = poll(base + "/healthz", started + timeout)
+        result["live_seconds"] = round(time.perf_counter() - started, 3) if live else None
+        if wait_ready:
+            ready = poll(base + "/readyz", started + wait_ready)
+            result["ready_seconds"] = round(time.perf_counter() - started, 3) if ready else None
+        _, body = fetch(base + "/readyz")
+        result["engines"] = json.loads(body)["engines"] if body else None
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to time the import in")
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS, help="max median import seconds")
+    parser.add_argument("--wait-ready", type=float, default=0, help="also wait up to this many seconds for /readyz")
+    parser.add_argument("--skip-server", action="store_true")
+    args = parser.parse_args()
+
+    times, loaded = measure_import(args.runs)
+    median = statistics.median(times)
+    print(f"import app.main: median {median:.3f}s, min {min(times):.3f}s, max {max(times):.3f}s over {args.runs} runs")
+
+    if not args.skip_server:
+        server = measure_server(args.wait_ready)
+        print(f"/healthz answered after {server['live_seconds']}s")
+        if args.wait_ready:
+            ready = server["ready_seconds"]
+            print(f"/readyz turned 200 after {ready}s" if ready else f"/readyz not 200 within {args.wait_ready:.0f}s")
+        for name, status in (server["engines"] or {}).items():
+            loaded_in = f"in {status['load_seconds']}s" if status["load_seconds"] is not None else ""
+            print(f"  {name:8} {status['state']:8} {loaded_in} {status['error'] or ''}")
+
+    failed = False
+    if loaded:
+        print(f"❌ Imported with the app, but should load lazily: {', '.join(loaded)}")
+        failed = True
+    if median > args.budget:
+        print(f"❌ Import took {median:.3f}s, over the {args.budget:.2f}s budget")
+        failed = True
+    if not failed:
+        print(f"✅ Import within the {args.budget:.2f}s budget and no heavy module loaded eagerly")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
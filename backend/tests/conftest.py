@@ -0,0 +1,4 @@
+import os
+
+# app.agent.graph builds the Gemini client at import; it needs a key but never calls out in these tests
+os.environ.setdefault("GOOGLE_API_KEY", "test")
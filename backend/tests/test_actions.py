@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from app.agent.graph import ACTION_HANDLERS, apply_actions, parse_actions, validate_action
+
+
+STATE = {
+    "session_id": "test",
+    "subtitles": [],
+    "style": {"color": "white", "fontSize": 24},
+    "text_layers": [],
+    "camera_moves": [],
+    "hud_items": [],
+    "visuals": [],
+}
+
+
+def test_parse_plan():
+    raw = json.dumps({"actions": [{"action": "style", "new_style": {"color": "red"}}, {"action": "auto_cut"}]})
+    assert [a["action"] for a in parse_actions(raw)] == ["style", "auto_cut"]
+
+
+def test_parse_bare_action_in_code_fence():
+    raw = 'Sure!\n```json\n{"action": "chat", "response": "hi"}\n```'
+    assert parse_actions(raw) == [{"action": "chat", "response": "hi"}]
+
+
+def test_parse_list_drops_non_objects():
+    raw = '[{"action": "auto_cut"}, "oops", 3]'
+    assert parse_actions(raw) == [{"action": "auto_cut"}]
+
+
+def test_parse_rejects_invalid_json():
+    with pytest.raises(json.JSONDecodeError):
+        parse_actions("no json here")
+
+
+@pytest.mark.parametrize("decision, problem", [
+    ({"action": "explode"}, "unknown action 'explode'"),
+    ({}, "unknown action 'None'"),
+    ({"action": "style", "new_style": "red"}, "style needs a 'new_style' object"),
+    ({"action": "chat"}, "chat needs a 'response'"),
+    ({"action": "camera", "intensity": "big"}, "camera intensity must be a number"),
+    ({"action": "visual", "visual_props": []}, "'visual_props' must be an object"),
+    ({"action": "text_behind", "text_props": "bold"}, "'text_props' must be an object"),
+])
+def test_validate_rejects(decision, problem):
+    assert validate_action(decision) == problem
+
+
+@pytest.mark.parametrize("decision", [
+    {"action": "style", "new_style": {"color": "red"}},
+    {"action": "chat", "response": "hello"},
+    {"action": "camera"},
+    {"action": "camera", "intensity": 2},
+    {"action": "auto_cut"},
+])
+def test_validate_accepts(decision):
+    assert validate_action(decision) is None
+
+
+def test_every_handler_names_state_keys():
+    for action, (handler, keys) in ACTION_HANDLERS.items():
+        assert callable(handler), action
+        assert all(key in STATE for key in keys), action
+
+
+def test_apply_actions_in_order_skipping_invalid():
+    actions = [
+        {"action": "style", "new_style": {"color": "red"}},
+        {"action": "explode"},
+        {"action": "style", "new_style": {"fontSize": 30}},
+        {"action": "chat", "response": "done"},
+    ]
+    result = apply_actions(STATE, actions)
+    assert result["style"] == {"color": "red", "fontSize": 30}
+    assert [(entry["action"], entry["ok"]) for entry in result["action_log"]] == [
+        ("style", True), ("explode", False), ("style", True), ("chat", True)
+    ]
+    assert "text_layers" not in result
+    # The caller's state is never modified in place
+    assert STATE["style"] == {"color": "white", "fontSize": 24}
+
+
+def test_apply_auto_cut_leaves_a_pending_operation():
+    result = apply_actions(STATE, [{"action": "auto_cut"}])
+    assert result["pending_operation"] == "auto_cut"
@@ -0,0 +1,85 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.services.media_server import parse_range, serve_media
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", [(0, 9)]),
+    ("bytes=10-", [(10, 49)]),
+    ("bytes=40-100", [(40, 49)]),
+    ("bytes=-5", [(45, 49)]),
+    ("bytes=-500", [(0, 49)]),
+    ("bytes=0-4, 10-14,-2", [(0, 4), (10, 14), (48, 49)]),
+    ("bytes=0-4,60-70", [(0, 4)]),
+    # Unsatisfiable: every range starts at or past the end
+    ("bytes=50-", []),
+    ("bytes=100-200", []),
+    ("bytes=100-", []),
+    ("bytes=60-70,80-", []),
+    ("bytes=-0", []),
+    # Ignored: malformed or another unit
+    ("bytes=9-0", None),
+    ("bytes=200-100", None),
+    ("bytes=a-b", None),
+    ("bytes=5", None),
+    ("bytes=", None),
+    ("items=0-9", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 50) == expected
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "clip.bin"
+    path.write_bytes(bytes(range(50)))
+    app = FastAPI()
+
+    @app.api_route("/media", methods=["GET", "HEAD"])
+    async def media(request: Request):
+        return serve_media(request, path)
+
+    return TestClient(app)
+
+
+def test_single_range(client):
+    response = client.get("/media", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 10-19/50"
+    assert response.content == bytes(range(10, 20))
+
+
+def test_unsatisfiable_range_is_416(client):
+    for header in ("bytes=100-200", "bytes=100-"):
+        response = client.get("/media", headers={"Range": header})
+        assert response.status_code == 416
+        assert response.headers["content-range"] == "bytes */50"
+
+
+def test_malformed_range_sends_everything(client):
+    response = client.get("/media", headers={"Range": "bytes=9-0"})
+    assert response.status_code == 200
+    assert len(response.content) == 50
+
+
+def test_multipart_ranges(client):
+    response = client.get("/media", headers={"Range": "bytes=0-1,-2"})
+    assert response.status_code == 206
+    assert response.headers["content-type"].startswith("multipart/byteranges")
+    assert int(response.headers["content-length"]) == len(response.content)
+    assert b"Content-Range: bytes 0-1/50" in response.content and b"Content-Range: bytes 48-49/50" in response.content
+
+
+def test_if_range(client):
+    etag = client.head("/media").headers["etag"]
+    fresh = client.get("/media", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert fresh.status_code == 206 and len(fresh.content) == 10
+    stale = client.get("/media", headers={"Range": "bytes=0-9", "If-Range": '"other"'})
+    assert stale.status_code == 200 and len(stale.content) == 50
+
+
+def test_if_none_match(client):
+    etag = client.head("/media").headers["etag"]
+    assert client.get("/media", headers={"If-None-Match": etag}).status_code == 304
@@ -0,0 +1,41 @@
+import shutil
+import subprocess
+
+import pytest
+
+from app.services.renditions import render_renditions
+from app.services.segment_cutter import probe_streams
+
+
+pytestmark = pytest.mark.skipif(not (shutil.which("ffmpeg") and shutil.which("ffprobe")), reason="needs ffmpeg and ffprobe")
+
+SUBTITLES = [{"start": 0.5, "end": 2.5, "text": "hello", "words": []}]
+STYLE = {"font_size": 24, "font_color": "white"}
+
+
+def make_clip(path, audio):
+    cmd = ["ffmpeg", "-nostdin", "-y", "-v", "error", "-f", "lavfi", "-i", "testsrc=size=160x90:rate=25:duration=4"]
+    if audio:
+        cmd += ["-f", "lavfi", "-i", "sine=frequency=440:duration=4", "-c:a", "aac"]
+    subprocess.run(cmd + ["-c:v", "libx264", "-pix_fmt", "yuv420p", "-shortest", str(path)], check=True)
+    return str(path)
+
+
+@pytest.mark.parametrize("audio", [True, False])
+def test_cut_renditions(tmp_path, audio):
+    clip = make_clip(tmp_path / "source.mp4", audio)
+    renditions = [{"name": "small", "height": 60}, {"name": "vertical", "height": 96, "aspect": "9:16"}]
+    results, _ = render_renditions(
+        clip, SUBTITLES, STYLE, str(tmp_path), "out", renditions, keep_segments=[(0.0, 1.0), (2.0, 3.5)]
+    )
+    assert [r["name"] for r in results] == ["small", "vertical"]
+    for result in results:
+        video, audio_stream, _ = probe_streams(result["path"])
+        assert video is not None
+        assert (audio_stream is not None) == audio
+
+
+def test_audio_only_rendition_needs_audio(tmp_path):
+    clip = make_clip(tmp_path / "silent.mp4", audio=False)
+    with pytest.raises(ValueError):
+        render_renditions(clip, SUBTITLES, STYLE, str(tmp_path), "out", [{"name": "audio", "audio_only": True}])
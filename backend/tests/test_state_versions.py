@@ -0,0 +1,119 @@
+import copy
+
+import pytest
+
+from app.services.state_versions import TRACKED_KEYS, StateHistory, VersionConflict, diff_snapshots, snapshot
+
+
+def apply_patch(doc, ops):
+    """Python mirror of applyPatch in frontend/src/api/client.js."""
+    doc = dict(doc)
+    copied = set()
+    for op in ops:
+        key, _, index = op["path"][1:].partition("/")
+        if not index:
+            doc[key] = op["value"]
+            continue
+        if key not in copied:
+            doc[key] = list(doc.get(key) or [])
+            copied.add(key)
+        items = doc[key]
+        if op["op"] == "remove":
+            del items[int(index)]
+        elif op["op"] == "add":
+            items.append(op["value"]) if index == "-" else items.insert(int(index), op["value"])
+        else:
+            items[int(index)] = op["value"]
+    return doc
+
+
+def layer(i, start=None):
+    start = float(i) if start is None else start
+    return {"id": f"l{i}", "start": start, "end": start + 1}
+
+
+BASE = {
+    "style": {"color": "white"},
+    "subtitles": [{"start": 0, "end": 1, "text": "a"}, {"start": 1, "end": 2, "text": "b"}],
+    "visuals": [layer(i) for i in range(5)],
+    "text_layers": [],
+    "hud_items": [layer(9)],
+    "keep_segments": None,
+}
+
+
+@pytest.mark.parametrize("edit", [
+    lambda s: s["visuals"].append(layer(5)),
+    lambda s: s["visuals"].insert(0, layer(7)),
+    lambda s: s["visuals"].insert(2, layer(8)),
+    lambda s: s["visuals"].pop(),
+    lambda s: s["visuals"].pop(0),
+    lambda s: s["visuals"].__delitem__(slice(1, 4)),
+    lambda s: s["visuals"].__setitem__(2, {**layer(2), "end": 10}),
+    lambda s: s["visuals"].clear(),
+    lambda s: s["hud_items"].clear() or s["text_layers"].append(layer(3)),
+    lambda s: s.update(style={"color": "red"}),
+    lambda s: s.update(keep_segments=[(0, 1.5)]),
+    lambda s: s["subtitles"].reverse(),
+])
+def test_patch_round_trip(edit):
+    new = copy.deepcopy(BASE)
+    edit(new)
+    patched = apply_patch(snapshot(BASE), diff_snapshots(snapshot(BASE), snapshot(new)))
+    assert {key: patched[key] for key in TRACKED_KEYS} == {key: new.get(key) for key in TRACKED_KEYS}
+
+
+def test_unchanged_state_has_an_empty_patch():
+    assert diff_snapshots(snapshot(BASE), snapshot(copy.deepcopy(BASE))) == []
+
+
+def test_append_patches_only_the_new_item():
+    new = copy.deepcopy(BASE)
+    new["visuals"].append(layer(5))
+    assert diff_snapshots(snapshot(BASE), snapshot(new)) == [{"op": "add", "path": "/visuals/-", "value": layer(5)}]
+
+
+def test_history_delta_reaches_every_version():
+    history = StateHistory()
+    states = [dict(BASE, version=0)]
+    for i in range(4):
+        state = dict(states[-1], visuals=states[-1]["visuals"] + [layer(10 + i)])
+        states.append(history.commit("s", states[-1], state))
+    undone = history.undo("s", states[-1])
+    assert undone["version"] == 5 and undone["visuals"] == states[-2]["visuals"]
+
+    for base in states:
+        delta = history.delta("s", base["version"], undone)
+        assert delta["version"] == 5
+        client = apply_patch({key: base.get(key) for key in TRACKED_KEYS}, delta["patch"])
+        assert client["visuals"] == undone["visuals"]
+    assert "snapshot" in history.delta("s", 99, undone)
+
+
+def test_commit_from_a_stale_version_is_rejected():
+    history = StateHistory()
+    base = dict(BASE, version=0)
+    first = history.commit("s", base, dict(base, style={"color": "red"}))
+    with pytest.raises(VersionConflict):
+        history.commit("s", base, dict(base, style={"color": "blue"}))
+    assert first["version"] == 1
+    assert history.delta("s", 0, first)["patch"] == [{"op": "replace", "path": "/style", "value": {"color": "red"}}]
+    second = history.commit("s", first, dict(first, style={"color": "blue"}))
+    assert second["version"] == 2
+
+
+def test_undo_from_a_stale_version_is_rejected():
+    history = StateHistory()
+    base = dict(BASE, version=0)
+    first = history.commit("s", base, dict(base, style={"color": "red"}))
+    with pytest.raises(VersionConflict):
+        history.undo("s", base)
+    assert history.undo("s", first)["style"] == {"color": "white"}
+
+
+def test_session_lock_is_shared_and_reentrant():
+    history = StateHistory()
+    assert history.lock("s") is history.lock("s")
+    assert history.lock("s") is not history.lock("other")
+    with history.lock("s"), history.lock("s"):
+        pass
@@ -0,0 +1,111 @@
+import os
+
+import pytest
+
+from app.services.storage import ArtifactRegistry
+
+SESSION = "0b6f3c1e-2d4a-4c8e-9f10-123456789abc"
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    uploads, exports = tmp_path / "temp", tmp_path / "processed"
+    uploads.mkdir()
+    exports.mkdir()
+    return uploads, exports
+
+
+def make_registry(tmp_path, dirs, quota, **kwargs):
+    uploads, exports = dirs
+    return ArtifactRegistry(tmp_path / "sessions.db", {uploads: "upload", exports: "export"}, quota=quota, min_age=0, **kwargs)
+
+
+def write(registry, path, size, used_at, **kwargs):
+    """A registered file of `size` bytes last used at `used_at` (seconds since the epoch)."""
+    path.write_bytes(b"\0" * size)
+    os.utime(path, (used_at, used_at))
+    registry.register(path, discovered=True, **kwargs)
+    return path
+
+
+def test_evicts_least_recently_used_derived_files_first(tmp_path, dirs):
+    uploads, exports = dirs
+    registry = make_registry(tmp_path, dirs, quota=250)
+    upload = write(registry, uploads / "clip.mp4", 100, 1000)
+    oldest = write(registry, uploads / "clip.proxy.mp4", 100, 2000)
+    newer = write(registry, exports / f"burned_{SESSION}.mp4", 100, 3000)
+
+    assert registry.evict() == 1
+    assert upload.exists() and newer.exists()
+    assert not oldest.exists()
+    assert registry.usage()["used_bytes"] == 200
+
+
+def test_originals_are_never_evicted(tmp_path, dirs):
+    uploads, _ = dirs
+    registry = make_registry(tmp_path, dirs, quota=0)
+    upload = write(registry, uploads / "clip.mp4", 100, 1000)
+    proxy = write(registry, uploads / "clip.proxy.mp4", 100, 2000)
+
+    registry.evict()
+    assert upload.exists()
+    assert not proxy.exists()
+
+
+def test_derived_pcm_goes_with_its_source(tmp_path, dirs):
+    uploads, _ = dirs
+    cut = uploads / f"cut_{SESSION}.mp4"
+    registry = make_registry(tmp_path, dirs, quota=150)
+    write(registry, cut, 100, 1000)
+    pcm = write(registry, uploads / "clip.f32", 100, 5000, source=cut)
+
+    registry.evict()
+    assert not cut.exists() and not pcm.exists()
+
+
+def test_held_refs_pin_until_released(tmp_path, dirs):
+    uploads, _ = dirs
+    registry = make_registry(tmp_path, dirs, quota=0)
+    cut = write(registry, uploads / f"cut_{SESSION}.mp4", 100, 1000)
+    registry.set_refs(SESSION, [cut])
+
+    registry.sweep()
+    assert cut.exists() and registry.refcount(cut) == 1
+
+    registry.release_refs(SESSION)
+    assert registry.refcount(cut) == 0
+    registry.sweep()
+    assert not cut.exists()
+
+
+def test_active_refs_are_dropped_once_the_session_goes_idle(tmp_path, dirs):
+    uploads, exports = dirs
+    registry = make_registry(tmp_path, dirs, quota=0)
+    cut = write(registry, uploads / f"cut_{SESSION}.mp4", 100, 1000)
+    proxy = write(registry, uploads / f"cut_{SESSION}.proxy.mp4", 100, 2000)
+    export = write(registry, exports / f"burned_{SESSION}.mp4", 100, 3000)
+
+    registry.set_refs(SESSION, [cut], active=[proxy, export])
+    registry.sweep()
+    assert proxy.exists() and export.exists()
+    assert registry.usage()["referenced_bytes"] == 300
+
+    # A save after the session went idle long ago: its rebuildable files are fair game again
+    registry.active_seconds = -1
+    registry.set_refs(SESSION, [cut], active=[proxy, export])
+    assert registry.refcount(proxy) == 0
+    registry.sweep()
+    assert cut.exists()
+    assert not proxy.exists() and not export.exists()
+
+
+def test_set_refs_replaces_the_previous_set(tmp_path, dirs):
+    uploads, exports = dirs
+    registry = make_registry(tmp_path, dirs, quota=0)
+    first = write(registry, exports / f"burned_{SESSION}_720p.mp4", 100, 1000)
+    second = write(registry, exports / f"burned_{SESSION}.mp4", 100, 2000)
+
+    registry.set_refs(SESSION, [], active=[first])
+    registry.set_refs(SESSION, [], active=[second])
+    registry.evict()
+    assert not first.exists() and second.exists()
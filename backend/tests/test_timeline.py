@@ -0,0 +1,46 @@
+from app.agent.graph import apply_actions
+from app.services.timeline import IntervalTree, get_timeline, layer_between, layer_end
+
+
+def test_interval_tree_matches_a_linear_scan():
+    items = [{"start": s, "end": s + d} for s, d in [(0, 5), (1, 1), (2, 8), (4, 0.5), (6, 1), (9, 3), (11, 0)]]
+    tree = IntervalTree(items)
+    for start, end in [(0, 0), (1.5, 1.5), (3, 4.2), (7.5, 8.5), (12, 20), (-1, 100)]:
+        expected = [i for i in items if i["start"] <= end and i["end"] >= start]
+        assert sorted(map(id, tree.between(start, end))) == sorted(map(id, expected))
+    assert {(a["start"], b["start"]) for a, b in tree.overlaps()} == {(0, 1), (0, 2), (0, 4), (2, 4), (2, 6), (2, 9), (9, 11)}
+
+def test_tree_end_is_the_latest_end():
+    assert IntervalTree([]).end == 0
+    items = [{"start": s, "end": e} for s, e in [(5, 6), (0, 30), (10, 12), (20, 21)]]
+    assert IntervalTree(items).end == 30
+
+
+def test_layer_end_and_between_cover_appended_items():
+    items = [{"start": 0, "end": 4}, {"start": 6, "end": 8}]
+    tree = IntervalTree(items)
+    grown = items + [{"start": 9, "end": 15}]
+    assert layer_end(tree, items) == 8
+    assert layer_end(tree, grown) == 15
+    assert layer_between(tree, grown, 7, 10) == [items[1], grown[2]]
+    assert layer_end(IntervalTree([]), []) == 0
+
+
+def test_hud_without_a_trigger_goes_after_the_last_card():
+    state = {
+        "session_id": "timeline-test",
+        "subtitles": [],
+        "style": {},
+        "hud_items": [{"id": "a", "start": 30, "end": 40}, {"id": "b", "start": 2, "end": 6}],
+    }
+    get_timeline("timeline-test", state)
+    result = apply_actions(state, [{"action": "hud", "title": "one"}, {"action": "hud", "title": "two"}])
+    assert [(item["start"], item["end"]) for item in result["hud_items"][2:]] == [(41, 45), (46, 50)]
+    assert len(state["hud_items"]) == 2
+
+
+def test_camera_clash_with_a_move_from_the_same_plan():
+    state = {"session_id": "camera-test", "subtitles": [], "style": {}, "camera_moves": [{"id": "m", "start": 10, "end": 12}]}
+    result = apply_actions(state, [{"action": "camera"}, {"action": "camera"}])
+    messages = [entry["message"] for entry in result["action_log"]]
+    assert "overlaps" not in messages[0] and "overlaps 1 existing move" in messages[1]
@@ -0,0 +1,49 @@
+import pytest
+
+from app.services.timeline_remap import (
+    build_cut_map, complement_ranges, intersect_ranges, remap_interval, remap_layers, remap_subtitles,
+)
+
+
+KEEP = [(1.0, 3.0), (5.0, 6.0), (8.0, 10.0)]
+
+
+@pytest.mark.parametrize("interval, expected", [
+    ((1.0, 3.0), (0.0, 2.0)),
+    ((5.5, 6.0), (2.5, 3.0)),
+    ((0.0, 2.0), (0.0, 1.0)),      # clipped at the front
+    ((2.0, 9.0), (1.0, 4.0)),      # spans two removed ranges
+    ((3.0, 5.0), None),            # entirely removed
+    ((10.5, 12.0), None),          # after the last kept range
+    ((2.0, 2.0), None),            # empty
+])
+def test_remap_interval(interval, expected):
+    result = remap_interval(*interval, build_cut_map(KEEP))
+    assert result == (pytest.approx(expected) if expected else None)
+
+
+def test_remap_subtitles_drops_removed_words():
+    words = [
+        {"word": " keep", "start": 1.0, "end": 1.5},
+        {"word": " gone", "start": 3.5, "end": 4.5},
+        {"word": " also", "start": 5.0, "end": 5.5},
+    ]
+    subtitles = [
+        {"start": 1.0, "end": 5.5, "text": "keep gone also", "words": words},
+        {"start": 3.2, "end": 4.8, "text": "silent", "words": [{"word": " x", "start": 3.2, "end": 4.8}]},
+    ]
+    [sub] = remap_subtitles(subtitles, KEEP)
+    assert sub["text"] == "keep also"
+    assert (sub["start"], sub["end"]) == pytest.approx((0.0, 2.5))
+    assert [(w["start"], w["end"]) for w in sub["words"]] == [pytest.approx((0.0, 0.5)), pytest.approx((2.0, 2.5))]
+
+
+def test_remap_layers_keeps_ids():
+    layers = [{"id": "a", "start": 8.5, "end": 9.5}, {"id": "b", "start": 3.5, "end": 4.0}]
+    assert remap_layers(layers, KEEP) == [{"id": "a", "start": 3.5, "end": 4.5}]
+
+
+def test_complement_and_intersect_ranges():
+    assert complement_ranges(KEEP, 12.0) == [(0.0, 1.0), (3.0, 5.0), (6.0, 8.0), (10.0, 12.0)]
+    assert complement_ranges([(0.0, 12.0)], 12.0) == []
+    assert intersect_ranges(KEEP, [(2.0, 9.0)]) == [(2.0, 3.0), (5.0, 6.0), (8.0, 9.0)]
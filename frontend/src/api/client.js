@@ -7,4 +7,68 @@ const client = axios.create({
   },
 });
 
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Polls a background job until it settles and resolves with its result.
+export const waitForJob = async (jobId, onProgress, intervalMs = 1000) => {
+  while (true) {
+    const { data } = await client.get(`/jobs/${jobId}`);
+    if (onProgress) onProgress(data);
+    if (data.status === "done") return data.result;
+    if (data.status === "failed" || data.status === "cancelled") {
+      throw new Error(data.error || `Job ${data.status}`);
+    }
+    await sleep(intervalMs);
+  }
+};
+
+// POSTs to an SSE endpoint and calls onEvent(event, data) for every event as it arrives.
+export const streamEvents = async (path, body, onEvent) => {
+  const res = await fetch(`${client.defaults.baseURL}${path}`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  });
+  if (!res.ok || !res.body) throw new Error(`Request failed: ${res.status}`);
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const chunk = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const event = chunk.match(/^event: (.*)$/m);
+      const data = chunk.match(/^data: (.*)$/m);
+      if (event && data) onEvent(event[1], JSON.parse(data[1]));
+    }
+  }
+};
+
+// Applies a server patch (add/remove/replace ops over "/key/index" paths) to a plain state object.
+export const applyPatch = (doc, ops) => {
+  const next = { ...doc };
+  const copied = new Set();
+  for (const { op, path, value } of ops) {
+    const [key, index] = path.slice(1).split("/");
+    if (index === undefined) {
+      next[key] = value;
+      continue;
+    }
+    if (!copied.has(key)) {
+      next[key] = [...(next[key] || [])];
+      copied.add(key);
+    }
+    const list = next[key];
+    if (op === "remove") list.splice(Number(index), 1);
+    else if (op === "add") index === "-" ? list.push(value) : list.splice(Number(index), 0, value);
+    else list[Number(index)] = value;
+  }
+  return next;
+};
+
 export default client;
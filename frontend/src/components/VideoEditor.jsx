@@ -1,10 +1,14 @@
 import React, { useState, useRef, useEffect } from "react";
 import ReactPlayer from "react-player";
-import client from "../api/client";
-import { Upload, Send, Download, Clapperboard, Sparkles } from "lucide-react";
+import client, { waitForJob, streamEvents, applyPatch } from "../api/client";
+import { Upload, Send, Download, Clapperboard, Sparkles, Undo2, Redo2 } from "lucide-react";
 import { clsx } from "clsx";
 import { twMerge } from "tailwind-merge";
 import { SelfieSegmentation } from "@mediapipe/selfie_segmentation";
+import Waveform from "./Waveform";
+
+// Seconds of overlays fetched per /timeline request; playback only filters that window
+const TIMELINE_WINDOW = 30;
 
 const VideoEditor = () => {
   const [sessionId, setSessionId] = useState(null);
@@ -20,11 +24,21 @@ const VideoEditor = () => {
   const [cameraMoves, setCameraMoves] = useState([]);
   const [currentTime, setCurrentTime] = useState(0);
   const [loading, setLoading] = useState(false);
+  const [jobProgress, setJobProgress] = useState(null);
+  const [skipRanges, setSkipRanges] = useState([]);
+  const [agentStatus, setAgentStatus] = useState(null);
+  const [canUndo, setCanUndo] = useState(false);
+  const [canRedo, setCanRedo] = useState(false);
+  const [timelineWindow, setTimelineWindow] = useState(null);
 
   const playerRef = useRef(null);
   const canvasRef = useRef(null);
   const segmentationRef = useRef(null);
   const animationRef = useRef(null);
+  // Mirror of the server's editable state at `version`; responses are patches against it
+  const docRef = useRef({ version: null, state: {} });
+  const windowGenerationRef = useRef(0);
+  const windowFetchRef = useRef(false);
 
   const cn = (...inputs) => twMerge(clsx(inputs));
 
@@ -109,6 +123,15 @@ const VideoEditor = () => {
     };
   }, [playing]);
 
+  // Keeps the playhead where it was when the preview source changes
+  const pendingSeekRef = useRef(null);
+  const swapPreview = (url) => {
+    pendingSeekRef.current = playerRef.current
+      ? playerRef.current.getCurrentTime()
+      : null;
+    setVideoUrl(url);
+  };
+
   const handleUpload = async (e) => {
     const file = e.target.files[0];
     if (!file) return;
@@ -119,11 +142,40 @@ const VideoEditor = () => {
       const res = await client.post("/upload", formData, {
         headers: { "Content-Type": "multipart/form-data" },
       });
-      setSessionId(res.data.session_id);
-      setVideoUrl(res.data.video_url);
-      setSubtitles(res.data.subtitles);
-      setStyle(res.data.style);
-      setVisuals(res.data.visuals || []);
+      const data = res.data.job_id
+        ? await waitForJob(res.data.job_id, (job) => setJobProgress(job.progress))
+        : res.data;
+      setSessionId(data.session_id);
+      setVideoUrl(data.video_url);
+      // Upload response plays the original until the low-res preview proxy is ready
+      const proxyJobId = res.data.proxy_job_id;
+      if (proxyJobId && !data.video_url.includes(".proxy.")) {
+        waitForJob(proxyJobId)
+          .then((proxy) => swapPreview(proxy.video_url))
+          .catch((err) => console.error("Preview proxy failed", err));
+      }
+      setSubtitles(data.subtitles);
+      setStyle(data.style);
+      setVisuals(data.visuals || []);
+      setSkipRanges(data.skip_ranges || []);
+      setHudItems([]);
+      setCameraMoves([]);
+      setTextLayers([]);
+      setCanUndo(false);
+      setCanRedo(false);
+      docRef.current = {
+        version: data.version ?? null,
+        state: {
+          style: data.style,
+          subtitles: data.subtitles,
+          visuals: data.visuals || [],
+          text_layers: [],
+          bg_layers: [],
+          camera_moves: [],
+          hud_items: [],
+          keep_segments: null,
+        },
+      };
       setChatHistory([
         {
           role: "ai",
@@ -136,7 +188,54 @@ const VideoEditor = () => {
       alert("Upload failed.");
     } finally {
       setLoading(false);
+      setJobProgress(null);
+    }
+  };
+
+  // Brings the mirrored state to the response's version from a patch or a full snapshot
+  const applyStateDelta = (data) => {
+    if (!data.patch && !data.snapshot) return false;
+    const state = data.snapshot || applyPatch(docRef.current.state, data.patch);
+    docRef.current = { version: data.version, state };
+    setStyle(state.style);
+    setSubtitles(state.subtitles);
+    setVisuals(state.visuals || []);
+    setHudItems(state.hud_items || []);
+    setCameraMoves(state.camera_moves || []);
+    setTextLayers(state.text_layers || []);
+    return true;
+  };
+
+  const applyChatResult = (data) => {
+    setChatHistory((prev) => [...prev, { role: "ai", content: data.reply }]);
+    if (applyStateDelta(data)) {
+      setCanUndo(data.can_undo);
+      setCanRedo(data.can_redo);
+      if (data.video_url) setVideoUrl(data.video_url);
+      if (data.skip_ranges) setSkipRanges(data.skip_ranges);
+      return;
     }
+    if (data.updated_style) setStyle(data.updated_style);
+    if (data.updated_subtitles) setSubtitles(data.updated_subtitles);
+    if (data.updated_visuals) setVisuals(data.updated_visuals);
+    if (data.updated_hud) setHudItems(data.updated_hud);
+    if (data.updated_camera) setCameraMoves(data.updated_camera);
+    if (data.updated_text_layers) setTextLayers(data.updated_text_layers);
+    if (data.video_url) setVideoUrl(data.video_url);
+    if (data.skip_ranges) setSkipRanges(data.skip_ranges);
+  };
+
+  // Auto-cut only records an edit list; the preview plays the original and jumps over removed ranges
+  const handleProgress = (p) => {
+    const skip = skipRanges.find(
+      ([start, end]) => p.playedSeconds >= start && p.playedSeconds < end
+    );
+    if (skip && playerRef.current) {
+      playerRef.current.seekTo(skip[1], "seconds");
+      setCurrentTime(skip[1]);
+      return;
+    }
+    setCurrentTime(p.playedSeconds);
   };
 
   const handleChat = async () => {
@@ -144,22 +243,50 @@ const VideoEditor = () => {
     const newMsg = { role: "user", content: prompt };
     setChatHistory((prev) => [...prev, newMsg]);
     setPrompt("");
+    // Streams the agent's output, its plan and the progress of long edits as they happen
+    setAgentStatus("Thinking...");
     try {
-      const res = await client.post("/chat", {
-        session_id: sessionId,
-        prompt: newMsg.content,
+      let tokens = 0;
+      await streamEvents(
+        "/chat/stream",
+        { session_id: sessionId, prompt: newMsg.content, base_version: docRef.current.version },
+        (event, data) => {
+          if (event === "token") {
+            tokens += 1;
+            setAgentStatus(`Thinking... (${tokens})`);
+          } else if (event === "actions") {
+            setAgentStatus(`Applying: ${data.actions.map((a) => a.action).join(", ")}`);
+          } else if (event === "progress") {
+            setAgentStatus(data.stage);
+            setJobProgress(data.progress);
+          } else if (event === "final") {
+            applyChatResult(data);
+          } else if (event === "error") {
+            // A conflict carries the latest state, so the next turn starts from it
+            applyStateDelta(data);
+            throw new Error(data.message);
+          }
+        }
+      );
+    } catch (err) {
+      console.error(err);
+    } finally {
+      setAgentStatus(null);
+      setJobProgress(null);
+    }
+  };
+
+  const handleHistory = async (direction) => {
+    if (!sessionId) return;
+    try {
+      const { data } = await client.post(`/sessions/${sessionId}/${direction}`, null, {
+        params: { base_version: docRef.current.version },
       });
-      setChatHistory((prev) => [
-        ...prev,
-        { role: "ai", content: res.data.reply },
-      ]);
-      if (res.data.updated_style) setStyle(res.data.updated_style);
-      if (res.data.updated_subtitles) setSubtitles(res.data.updated_subtitles);
-      if (res.data.updated_visuals) setVisuals(res.data.updated_visuals);
-      if (res.data.updated_hud) setHudItems(res.data.updated_hud);
-      if (res.data.updated_camera) setCameraMoves(res.data.updated_camera);
-      if (res.data.updated_text_layers)
-        setTextLayers(res.data.updated_text_layers);
+      applyStateDelta(data);
+      setCanUndo(data.can_undo);
+      setCanRedo(data.can_redo);
+      if (data.video_url) setVideoUrl(data.video_url);
+      setSkipRanges(data.skip_ranges || []);
     } catch (err) {
       console.error(err);
     }
@@ -176,8 +303,12 @@ const VideoEditor = () => {
         session_id: sessionId,
         prompt: "export",
       });
+      const data = res.data.job_id
+        ? await waitForJob(res.data.job_id, (job) => setJobProgress(job.progress))
+        : res.data;
+      setJobProgress(null);
       const link = document.createElement("a");
-      link.href = res.data.download_url;
+      link.href = data.download_url;
       link.setAttribute("download", "edited.mp4");
       document.body.appendChild(link);
       link.click();
@@ -187,27 +318,63 @@ const VideoEditor = () => {
         { role: "ai", content: "Download ready!" },
       ]);
     } catch (err) {
+      setJobProgress(null);
       alert("Export failed");
     }
   };
 
+  // Any edit makes the loaded overlay window stale
+  useEffect(() => {
+    windowGenerationRef.current += 1;
+    windowFetchRef.current = false;
+    setTimelineWindow(null);
+  }, [sessionId, visuals, hudItems, cameraMoves, textLayers]);
+
+  useEffect(() => {
+    if (!sessionId || windowFetchRef.current) return;
+    if (timelineWindow && currentTime >= timelineWindow.start && currentTime <= timelineWindow.end) return;
+    const generation = windowGenerationRef.current;
+    const start = Math.max(0, currentTime - 1);
+    windowFetchRef.current = true;
+    client
+      .get(`/timeline/${sessionId}`, {
+        params: { start, end: start + TIMELINE_WINDOW, layers: "visuals,hud_items,camera_moves,text_layers" },
+      })
+      .then(({ data }) => {
+        if (generation !== windowGenerationRef.current) return;
+        setTimelineWindow({ start: data.start, end: data.end, layers: data.layers });
+      })
+      .catch((err) => console.error("Timeline fetch failed", err))
+      .finally(() => {
+        if (generation === windowGenerationRef.current) windowFetchRef.current = false;
+      });
+  }, [sessionId, currentTime, timelineWindow]);
+
+  // Until the window arrives the full lists are filtered as before
+  const overlays = timelineWindow?.layers || {
+    visuals,
+    hud_items: hudItems,
+    camera_moves: cameraMoves,
+    text_layers: textLayers,
+  };
+
   const activeSub = subtitles.find(
     (s) => currentTime >= s.start && currentTime <= s.end
   );
   const activeVisuals =
-    visuals?.filter((v) => currentTime >= v.start && currentTime <= v.end) ||
+    overlays.visuals?.filter((v) => currentTime >= v.start && currentTime <= v.end) ||
     [];
 
   const currentVisual =
     activeVisuals.length > 0 ? activeVisuals[activeVisuals.length - 1] : null;
 
-  const activeHud = hudItems?.find(
+  const activeHud = overlays.hud_items?.find(
     (h) => currentTime >= h.start && currentTime <= h.end
   );
-  const activeCamera = cameraMoves?.find(
+  const activeCamera = overlays.camera_moves?.find(
     (c) => currentTime >= c.start && currentTime <= c.end
   );
-  const activeTextLayer = textLayers.find(
+  const activeTextLayer = overlays.text_layers?.find(
     (l) => currentTime >= l.start && currentTime <= l.end
   );
 
@@ -324,7 +491,9 @@ const VideoEditor = () => {
             </div>
             <label className="cursor-pointer bg-blue-600 hover:bg-blue-500 px-8 py-3 rounded-xl font-medium flex items-center gap-2 transition-all mx-auto w-fit shadow-lg shadow-blue-900/20">
               <Upload size={20} />
-              {loading ? "Analyzing Footage..." : "Select Video"}
+              {loading
+                ? `Analyzing Footage...${jobProgress ? ` ${Math.round(jobProgress)}%` : ""}`
+                : "Select Video"}
               <input
                 type="file"
                 onChange={handleUpload}
@@ -334,9 +503,11 @@ const VideoEditor = () => {
             </label>
           </div>
         ) : (
+          <>
           <div className="relative w-full max-w-6xl aspect-video bg-black shadow-2xl overflow-hidden border border-gray-800 rounded-xl group">
             <div className="w-full h-full" style={getCameraStyle()}>
               <ReactPlayer
+                ref={playerRef}
                 url={videoUrl}
                 playing={playing}
                 controls={true}
@@ -351,8 +522,15 @@ const VideoEditor = () => {
                   console.log("⏸️ VIDEO PAUSED");
                   setPlaying(false);
                 }}
+                onReady={() => {
+                  if (pendingSeekRef.current !== null) {
+                    playerRef.current.seekTo(pendingSeekRef.current, "seconds");
+                    pendingSeekRef.current = null;
+                  }
+                }}
                 onEnded={() => setPlaying(false)}
-                onProgress={(p) => setCurrentTime(p.playedSeconds)}
+                onProgress={handleProgress}
+                progressInterval={100}
                 config={{ file: { attributes: { crossOrigin: "anonymous" } } }}
               />
             </div>
@@ -445,6 +623,13 @@ const VideoEditor = () => {
               </div>
             )}
           </div>
+          <Waveform
+            sessionId={sessionId}
+            currentTime={currentTime}
+            revision={skipRanges}
+            onSeek={(t) => playerRef.current && playerRef.current.seekTo(t, "seconds")}
+          />
+          </>
         )}
       </div>
 
@@ -456,6 +641,32 @@ const VideoEditor = () => {
               DIRECTOR AGENT
             </span>
           </div>
+          {(agentStatus || jobProgress !== null) && (
+            <span className="text-xs text-gray-400">
+              {agentStatus || "Working..."}
+              {jobProgress !== null ? ` ${Math.round(jobProgress)}%` : ""}
+            </span>
+          )}
+          {videoUrl && (
+            <div className="flex gap-1">
+              <button
+                onClick={() => handleHistory("undo")}
+                disabled={!canUndo}
+                title="Undo"
+                className="text-xs bg-gray-700 hover:bg-gray-600 disabled:opacity-40 px-2 py-1.5 rounded text-gray-200"
+              >
+                <Undo2 size={14} />
+              </button>
+              <button
+                onClick={() => handleHistory("redo")}
+                disabled={!canRedo}
+                title="Redo"
+                className="text-xs bg-gray-700 hover:bg-gray-600 disabled:opacity-40 px-2 py-1.5 rounded text-gray-200"
+              >
+                <Redo2 size={14} />
+              </button>
+            </div>
+          )}
           {videoUrl && (
             <button
               onClick={handleExport}
@@ -0,0 +1,63 @@
+import React, { useEffect, useRef, useState } from "react";
+import client from "../api/client";
+
+// Audio strip under the player: peaks come precomputed from the backend at the canvas width,
+// so an hour-long video costs a few kilobytes per redraw.
+const Waveform = ({ sessionId, currentTime, onSeek, revision }) => {
+  const canvasRef = useRef(null);
+  const [data, setData] = useState(null);
+
+  useEffect(() => {
+    if (!sessionId || !canvasRef.current) return;
+    const width = canvasRef.current.clientWidth || 1000;
+    client
+      .get(`/waveform/${sessionId}`, { params: { width } })
+      .then(({ data }) => setData(data))
+      .catch((err) => console.error("Waveform fetch failed", err));
+  }, [sessionId, revision]);
+
+  useEffect(() => {
+    const canvas = canvasRef.current;
+    if (!canvas || !data) return;
+    const ctx = canvas.getContext("2d");
+    const { width, height } = canvas;
+    const duration = data.peaks.length * data.seconds_per_peak;
+    const toX = (t) => ((t - data.start) / duration) * width;
+    ctx.clearRect(0, 0, width, height);
+
+    ctx.fillStyle = "rgba(250, 204, 21, 0.15)";
+    data.silences.forEach(([s, e]) => ctx.fillRect(toX(s), 0, toX(e) - toX(s), height));
+    ctx.fillStyle = "rgba(239, 68, 68, 0.35)";
+    data.cuts.forEach(([s, e]) => ctx.fillRect(toX(s), 0, toX(e) - toX(s), height));
+
+    ctx.fillStyle = "#3b82f6";
+    const barWidth = Math.max(1, width / data.peaks.length);
+    data.peaks.forEach(([min, max], i) => {
+      const top = height / 2 - (max / 127) * (height / 2);
+      const bottom = height / 2 - (min / 127) * (height / 2);
+      ctx.fillRect(i * barWidth, top, barWidth, Math.max(1, bottom - top));
+    });
+
+    ctx.fillStyle = "#ffffff";
+    ctx.fillRect(toX(currentTime), 0, 2, height);
+  }, [data, currentTime]);
+
+  const handleClick = (e) => {
+    if (!data || !onSeek) return;
+    const rect = e.currentTarget.getBoundingClientRect();
+    const duration = data.peaks.length * data.seconds_per_peak;
+    onSeek(data.start + ((e.clientX - rect.left) / rect.width) * duration);
+  };
+
+  return (
+    <canvas
+      ref={canvasRef}
+      onClick={handleClick}
+      className="w-full max-w-6xl h-16 mt-3 bg-[#1a1a1a] rounded-lg cursor-pointer"
+      width={1000}
+      height={64}
+    />
+  );
+};
+
+export default Waveform;